@@ -0,0 +1,259 @@
+import asyncio
+import multiprocessing
+import os
+import sys
+import typing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Optional
+
+from json_writer import write_json
+from pdf_parser import PdfDoc, PdfObj, iter_decompress, read_buffer, tokenize
+
+
+class Cancelled(Exception):
+    """ Raised inside a job whose caller was cancelled, to stop the work where it is """
+
+
+# Cancel flags of this worker process, one per slot of the AsyncParser that started it (see init_worker)
+_flags = None
+
+
+def init_worker(flags):
+    global _flags
+    _flags = flags
+
+
+def cancel_check(flags, slot: int) -> typing.Callable[[int, int], None]:
+    """ A parse progress callback that stops the parse once the slot's cancel flag is set """
+    def progress(pos: int, size: int):
+        if flags[slot]:
+            raise Cancelled(f"Cancelled at byte {pos} of {size}")
+    return progress
+
+
+def parse_cancellable(filename, use_mmap: bool, keep_raw: bool, flags, slot: int) -> PdfDoc:
+    """ parse() that checks the slot's cancel flag between top-level objects and every PROGRESS_STEP bytes """
+    pdf = PdfDoc(b"")
+    buffer, use_mmap = read_buffer(filename, use_mmap)
+    for obj in tokenize(buffer, pdf, filename=filename, offsets=use_mmap, progress=cancel_check(flags, slot),
+                        keep_raw=keep_raw):
+        if flags[slot]:
+            raise Cancelled(f"Cancelled after the object at byte {obj.b_start} of {len(buffer)}")
+    return pdf
+
+
+def parse_job(slot: int, filename, use_mmap: bool, keep_raw: bool, flags=None) -> PdfDoc:
+    flags = _flags if flags is None else flags
+    return parse_cancellable(filename, use_mmap, keep_raw, flags, slot)
+
+
+def to_json_job(slot: int, source, output_filename: Optional[Path], compact: bool, keep_raw: bool, flags=None):
+    """ Parse source if it is a file name, then write it to output_filename or return its to_json() """
+    flags = _flags if flags is None else flags
+    if not isinstance(source, PdfObj):
+        source = parse_cancellable(source, False, keep_raw, flags, slot)
+    if flags[slot]:
+        raise Cancelled("Cancelled after parsing")
+    if output_filename is None:
+        return source.to_json()
+    with open(output_filename, "w") as fh:
+        if compact:
+            write_json(source, fh, separators=(",", ":"))
+        else:
+            write_json(source, fh, indent=4)
+    return output_filename
+
+
+def decompress_job(slot: int, pdf: PdfObj, save_dir, jobs: int, store, flags) -> PdfObj:
+    """ decompress() that checks the slot's cancel flag between objects """
+    for _ in iter_decompress(pdf.data, save_dir, jobs, store=store):
+        if flags[slot]:
+            raise Cancelled("Cancelled while writing streams")
+    return pdf
+
+
+class AsyncParser:
+    """
+    Parse, decompress and convert PDFs from asyncio without blocking the event loop.
+    Parsing is CPU bound so it runs in a pool of worker processes (processes=False runs it in threads instead) and
+    the tree is sent back pickled. Writing streams is zlib and file I/O, which release the GIL, so it runs in
+    threads on the tree the caller already holds. At most limit jobs run at once; the others wait for a slot.
+    Cancelling the awaiting task sets the job's cancel flag, which the parser checks between top-level objects (and
+    every PROGRESS_STEP bytes within large ones) and decompression between objects, so the worker stops and its
+    slot is only freed once it has.
+    Use one AsyncParser from one event loop at a time.
+    """
+
+    def __init__(self, workers: Optional[int] = None, limit: Optional[int] = None, processes: bool = True,
+                 mp_context=None):
+        self.workers = workers or os.cpu_count()
+        self.limit = limit or self.workers
+        self.processes = processes
+        if processes:
+            context = mp_context or multiprocessing.get_context()
+            self.flags = context.RawArray("b", self.limit)
+            self.process_executor: Optional[Executor] = ProcessPoolExecutor(
+                self.workers, mp_context=context, initializer=init_worker, initargs=(self.flags,))
+        else:
+            self.flags = bytearray(self.limit)
+            self.process_executor = None
+        self.thread_executor = ThreadPoolExecutor(self.limit)
+        self.free = list(range(self.limit))
+        self.running = 0
+        self.thread_fallbacks = 0  # Jobs run again in a thread because their result was too deep to pickle
+        self._loop = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+    async def aclose(self):
+        """ Wait for running jobs (cancelled ones stop at their next check) and shut the pools down """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.close)
+
+    def close(self):
+        self.thread_executor.shutdown()
+        if self.process_executor is not None:
+            self.process_executor.shutdown()
+
+    def semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            if self.running:
+                raise RuntimeError("AsyncParser is running jobs for another event loop")
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    def release(self, slot: int, semaphore: asyncio.Semaphore):
+        self.flags[slot] = 0
+        self.free.append(slot)
+        self.running -= 1
+        semaphore.release()
+
+    async def run(self, executor: Executor, job: typing.Callable, *args) -> Any:
+        """ Run job(slot, *args) in executor once a slot is free, and stop it if the awaiting task is cancelled """
+        semaphore = self.semaphore()
+        await semaphore.acquire()
+        loop = asyncio.get_running_loop()
+        slot = self.free.pop()
+        self.running += 1
+        try:
+            future: Future = executor.submit(job, slot, *args)
+        except BaseException:
+            self.release(slot, semaphore)
+            raise
+
+        def done(_):
+            # The slot is reused only once the job has really stopped
+            try:
+                loop.call_soon_threadsafe(self.release, slot, semaphore)
+            except RuntimeError:  # The event loop has been closed
+                self.release(slot, semaphore)
+
+        future.add_done_callback(done)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if not future.cancel():
+                self.flags[slot] = 1
+            raise
+
+    async def run_cpu(self, job: typing.Callable, *args) -> Any:
+        """
+        Run a CPU bound job in a worker process, or in a thread without processes. A result nested too deeply to
+        pickle back is produced again in a thread: the work is done twice and the job waits for a second slot, so
+        each fallback is reported on stderr and counted in thread_fallbacks.
+        """
+        if self.process_executor is not None:
+            try:
+                return await self.run(self.process_executor, job, *args)
+            except RecursionError:
+                self.thread_fallbacks += 1
+                print(f"{job.__name__} of {args[0]}: result nested too deeply to pickle from a worker process, "
+                      f"running it again in a thread", file=sys.stderr)
+        return await self.run(self.thread_executor, partial(job, flags=self.flags), *args)
+
+    async def parse(self, filename, use_mmap=False, keep_raw=True) -> PdfDoc:
+        """ parse() in a worker process. Memory mapped trees cannot be sent between processes so use a thread """
+        if use_mmap:
+            return await self.run(self.thread_executor, partial(parse_job, flags=self.flags), filename, True,
+                                  keep_raw)
+        return await self.run_cpu(parse_job, filename, False, keep_raw)
+
+    async def decompress(self, pdf: PdfObj, save_dir, jobs=1, store=None) -> PdfObj:
+        """ decompress() in a thread, writing up to jobs streams at once """
+        return await self.run(self.thread_executor, decompress_job, pdf, save_dir, jobs, store, self.flags)
+
+    async def to_json(self, source: PdfObj | str | Path, output_filename: Optional[Path] = None,
+                      compact: bool = False, keep_raw=True) -> Any:
+        """
+        The to_json() of a tree, or with output_filename, write it there as pdf-to-json.py does and return the path.
+        A file name is parsed and converted in a worker process so only the JSON value comes back; a tree the
+        caller already holds is converted in a thread.
+        """
+        if isinstance(source, PdfObj):
+            return await self.run(self.thread_executor, partial(to_json_job, flags=self.flags), source,
+                                  output_filename, compact, keep_raw)
+        return await self.run_cpu(to_json_job, source, output_filename, compact, keep_raw)
+
+
+_default: Optional[AsyncParser] = None
+
+
+def get_default() -> AsyncParser:
+    """ The AsyncParser used by aparse(), adecompress() and ato_json(), created on first use """
+    global _default
+    if _default is None:
+        _default = AsyncParser()
+    return _default
+
+
+async def aparse(filename, use_mmap=False, keep_raw=True, parser: Optional[AsyncParser] = None) -> PdfDoc:
+    return await (parser or get_default()).parse(filename, use_mmap, keep_raw)
+
+
+async def adecompress(pdf: PdfObj, save_dir, jobs=1, store=None, parser: Optional[AsyncParser] = None) -> PdfObj:
+    return await (parser or get_default()).decompress(pdf, save_dir, jobs, store)
+
+
+async def ato_json(source: PdfObj | str | Path, output_filename: Optional[Path] = None, compact: bool = False,
+                   parser: Optional[AsyncParser] = None) -> Any:
+    return await (parser or get_default()).to_json(source, output_filename, compact)
+
+
+if __name__ == "__main__":
+    import json
+    import time
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Parse PDFs concurrently with the asyncio API and report the latency of each")
+    parser.add_argument("pdf_filenames", nargs="+", type=Path)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--limit", type=int, default=None, help="Jobs running at once (default: --workers)")
+    parser.add_argument("--threads", action="store_true", help="Parse in threads rather than processes")
+    parser.add_argument("--json", action="store_true", help="Convert with ato_json instead of only parsing")
+    args = parser.parse_args()
+
+    async def timed(async_parser: AsyncParser, filename: Path, start: float):
+        if args.json:
+            await async_parser.to_json(filename)
+        else:
+            await async_parser.parse(filename)
+        return filename, time.perf_counter() - start
+
+    async def main():
+        async with AsyncParser(args.workers, args.limit, not args.threads) as async_parser:
+            start = time.perf_counter()
+            for coroutine in asyncio.as_completed([timed(async_parser, filename, start)
+                                                   for filename in args.pdf_filenames]):
+                filename, seconds = await coroutine
+                print(json.dumps({"file": str(filename), "seconds": round(seconds, 3)}))
+
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+import gc
+import os
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from pdf_parser import PdfObj, parse
+
+
+def count_objects(pdf: PdfObj) -> int:
+    count = 0
+    stack = [pdf]
+    while stack:
+        obj = stack.pop()
+        count += 1
+        data = obj.data
+        if isinstance(data, dict):
+            values = [v for kv in data.items() for v in kv]
+        elif isinstance(data, list):
+            values = data
+        else:
+            continue
+        stack.extend(v for v in values if isinstance(v, PdfObj))
+    return count
+
+
+def measure(pdf_filename: Path, **parse_options) -> tuple[int, int]:
+    """ Return the number of objects in the tree and the bytes still allocated for it after parsing """
+    gc.collect()
+    tracemalloc.start()
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        pdf = parse(pdf_filename, **parse_options)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count_objects(pdf), allocated
+
+
+def compare(pdf_filenames: list[Path]):
+    modes = {
+        "default": {},
+        "keep_raw=False": {"keep_raw": False},
+        "use_mmap=True": {"use_mmap": True},
+    }
+    print(f"{'File':<30} {'Mode':<16} {'Objects':>10} {'Tree MB':>9} {'Bytes/object':>13}")
+    for pdf_filename in pdf_filenames:
+        for mode, options in modes.items():
+            objects, allocated = measure(pdf_filename, **options)
+            print(f"{pdf_filename.name:<30} {mode:<16} {objects:>10} {allocated / 1e6:>9.2f} "
+                  f"{allocated / objects:>13.1f}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Measure the memory held by parsed PdfObj trees")
+    parser.add_argument("pdf_filenames", type=Path, nargs="+")
+
+    args = parser.parse_args()
+    compare(args.pdf_filenames)
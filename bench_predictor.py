@@ -0,0 +1,56 @@
+import random
+import time
+from argparse import ArgumentParser
+
+import filters
+
+
+def make_rows(rows: int, row_size: int, predictors: list[int]) -> bytes:
+    """ Random PNG predicted image data: each row is a predictor type byte followed by row_size bytes """
+    rng = random.Random(0)
+    data = bytearray()
+    for _ in range(rows):
+        data.append(rng.choice(predictors))
+        data += rng.randbytes(row_size)
+    return bytes(data)
+
+
+def throughput(data: bytes, row_size: int, bpp: int, repeat: int) -> float:
+    """ MB/s of predicted data decoded by png_unpredict() with whatever implementation is active """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        filters.png_unpredict(data, row_size, bpp, bytes(row_size))
+        best = min(best, time.perf_counter() - start)
+    return len(data) / best / 1e6
+
+
+def compare(rows: int, columns: int, colors: int, repeat: int):
+    row_size = columns * colors
+    mixes = {
+        "Up": [2],
+        "Sub": [1],
+        "None/Sub/Up": [0, 1, 2],
+        "all five": [0, 1, 2, 3, 4],
+    }
+    numpy = filters.numpy
+    print(f"{rows} rows of {columns} pixels x {colors} bytes, {rows * (row_size + 1) / 1e6:.1f} MB per run")
+    print(f"{'Predictors':<14} {'Python MB/s':>12} {'NumPy MB/s':>12}")
+    for name, predictors in mixes.items():
+        data = make_rows(rows, row_size, predictors)
+        filters.numpy = None
+        pure = throughput(data, row_size, colors, repeat)
+        filters.numpy = numpy
+        vectorised = f"{throughput(data, row_size, colors, repeat):>12.1f}" if numpy is not None else f"{'-':>12}"
+        print(f"{name:<14} {pure:>12.1f} {vectorised}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Measure PNG predictor decoding throughput with and without NumPy")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--columns", type=int, default=500)
+    parser.add_argument("--colors", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+
+    args = parser.parse_args()
+    compare(args.rows, args.columns, args.colors, args.repeat)
@@ -0,0 +1,52 @@
+import os
+import time
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from pdf_parser import parse, parse_legacy
+
+
+def time_parse(parse_function, pdf_filename: Path, repeats: int) -> tuple[float, list]:
+    """ Return the best time of several runs and the JSON of the last parse """
+    best = float("inf")
+    pdf = None
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for _ in range(repeats):
+            start = time.perf_counter()
+            pdf = parse_function(pdf_filename)
+            best = min(best, time.perf_counter() - start)
+    return best, pdf.to_json()
+
+
+def compare(pdf_filenames: list[Path], repeats: int = 3):
+    total_bytes = 0
+    total_legacy = 0.0
+    total_dispatch = 0.0
+    print(f"{'File':<40} {'Legacy MB/s':>12} {'Dispatch MB/s':>14} {'Speedup':>8}  Same tree")
+    for pdf_filename in pdf_filenames:
+        size = os.path.getsize(pdf_filename)
+        legacy_time, legacy_json = time_parse(parse_legacy, pdf_filename, repeats)
+        dispatch_time, dispatch_json = time_parse(parse, pdf_filename, repeats)
+        total_bytes += size
+        total_legacy += legacy_time
+        total_dispatch += dispatch_time
+        print(f"{pdf_filename.name:<40} "
+              f"{size / legacy_time / 1e6:>12.2f} "
+              f"{size / dispatch_time / 1e6:>14.2f} "
+              f"{legacy_time / dispatch_time:>7.2f}x  "
+              f"{'yes' if legacy_json == dispatch_json else 'NO'}")
+    if total_bytes:
+        print(f"{'TOTAL':<40} "
+              f"{total_bytes / total_legacy / 1e6:>12.2f} "
+              f"{total_bytes / total_dispatch / 1e6:>14.2f} "
+              f"{total_legacy / total_dispatch:>7.2f}x")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Compare the dispatching tokenizer against the legacy per-context loop")
+    parser.add_argument("pdf_filenames", type=Path, nargs="+")
+    parser.add_argument("--repeats", type=int, default=3)
+
+    args = parser.parse_args()
+    compare(args.pdf_filenames, args.repeats)
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks on synthetic PDFs. Run from the repository root:
+
+    python -m benchmarks.run
+"""
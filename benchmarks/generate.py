@@ -0,0 +1,113 @@
+import random
+import zlib
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Optional
+
+ESCAPES = [rb"\(", rb"\)", rb"\\", rb"\n", rb"\t", rb"\101", rb"\000", b"\\\n"]
+LETTERS = b"abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789 .,;:"
+
+# Named sets of make_pdf() arguments, each stressing one part of the parser
+SHAPES = {
+    "objects": {"objects": 2500, "stream_fraction": 0.05, "stream_size": 200, "depth": 2},
+    "streams": {"objects": 200, "stream_fraction": 0.8, "stream_size": 50_000, "depth": 1},
+    "nested": {"objects": 500, "stream_fraction": 0.0, "depth": 12},
+    "strings": {"objects": 1000, "stream_fraction": 0.0, "depth": 1, "string_length": 400, "escape_density": 0.3},
+    "xref": {"objects": 1000, "stream_fraction": 0.0, "depth": 1, "xref_entries": 50_000},
+}
+
+
+def literal_string(rng: random.Random, length: int, escape_density: float) -> bytes:
+    """ A literal string of about length characters where escape_density of them are escape sequences """
+    parts = [b"("]
+    for _ in range(length):
+        if rng.random() < escape_density:
+            parts.append(rng.choice(ESCAPES))
+        else:
+            parts.append(bytes([rng.choice(LETTERS)]))
+    parts.append(b")")
+    return b"".join(parts)
+
+
+def nested_value(rng: random.Random, depth: int, string: bytes, objects: int) -> bytes:
+    """ Alternate PdfDict and PdfList levels down to depth, with a mix of simple values at each level """
+    if depth <= 0:
+        return string
+    inner = nested_value(rng, depth - 1, string, objects)
+    if depth % 2:
+        return (b"<< /Inner " + inner + b" /Number %d /Real %.2f /Name /N%d /Ref %d 0 R >>"
+                % (rng.randrange(1000), rng.random() * 100, rng.randrange(50), rng.randrange(3, objects + 1)))
+    return b"[" + inner + b" %d /Item true null <%s>]" % (rng.randrange(1000), rng.randbytes(4).hex().encode())
+
+
+def make_pdf(path: Path, objects: int = 1000, stream_fraction: float = 0.2, stream_size: int = 1000,
+             compress: bool = True, depth: int = 3, string_length: int = 40, escape_density: float = 0.1,
+             xref_entries: Optional[int] = None, seed: int = 0) -> int:
+    """
+    Write a PDF of objects indirect objects (besides the catalog and page tree). stream_fraction of them are
+    streams of stream_size bytes, FlateDecode compressed when compress is set; the others are dictionaries nested
+    depth levels deep holding a literal string of string_length characters with escape_density escapes.
+    The cross-reference table has xref_entries entries (at least one per object, the rest free).
+    Returns the size of the file.
+    """
+    rng = random.Random(seed)
+    out = bytearray(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+    offsets = {}
+
+    def add(number: int, body: bytes):
+        offsets[number] = len(out)
+        out.extend(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    add(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    add(2, b"<< /Type /Pages /Kids [] /Count 0 >>")
+    for number in range(3, objects + 3):
+        if rng.random() < stream_fraction:
+            content = b"".join(b"BT /F1 12 Tf %d %d Td (Line %d) Tj ET\n" % (rng.randrange(600), rng.randrange(800), i)
+                               for i in range(stream_size // 36 + 1))[:stream_size]
+            if compress:
+                content = zlib.compress(content)
+                stream_dict = b"<< /Length %d /Filter /FlateDecode >>" % len(content)
+            else:
+                stream_dict = b"<< /Length %d >>" % len(content)
+            add(number, stream_dict + b"\nstream\n" + content + b"\nendstream")
+        else:
+            string = literal_string(rng, string_length, escape_density)
+            add(number, b"<< /Type /Synthetic /Value " + nested_value(rng, depth, string, objects) + b" >>")
+
+    size = max(objects + 3, xref_entries or 0)
+    xref = len(out)
+    out += b"xref\n0 %d\n" % size
+    for number in range(size):
+        if number in offsets:
+            out += b"%010d 00000 n\r\n" % offsets[number]
+        else:
+            out += b"0000000000 65535 f\r\n"
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref)
+    with open(path, "wb") as fh:
+        fh.write(out)
+    return len(out)
+
+
+def make_shape(shape: str, directory: Path, seed: int = 0) -> Path:
+    path = directory / f"{shape}.pdf"
+    make_pdf(path, seed=seed, **SHAPES[shape])
+    return path
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Write a synthetic PDF with a controllable shape")
+    parser.add_argument("output_filename", type=Path)
+    parser.add_argument("--objects", type=int, default=1000)
+    parser.add_argument("--stream-fraction", type=float, default=0.2)
+    parser.add_argument("--stream-size", type=int, default=1000)
+    parser.add_argument("--no-compress", action="store_true", help="Write streams without FlateDecode")
+    parser.add_argument("--depth", type=int, default=3, help="Nesting depth of dictionaries and arrays")
+    parser.add_argument("--string-length", type=int, default=40)
+    parser.add_argument("--escape-density", type=float, default=0.1)
+    parser.add_argument("--xref-entries", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+    size = make_pdf(args.output_filename, args.objects, args.stream_fraction, args.stream_size, not args.no_compress,
+                    args.depth, args.string_length, args.escape_density, args.xref_entries, args.seed)
+    print(f"Wrote {size} bytes to {args.output_filename}")
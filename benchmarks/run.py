@@ -0,0 +1,135 @@
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Callable
+
+from bench_memory import count_objects
+from benchmarks.generate import SHAPES, make_shape
+from chart_content import chart_content
+from pdf_parser import parse, decompress
+
+BASELINE = Path(__file__).parent / "baseline.json"
+THRESHOLD = 0.25  # Fractional slow-down (or growth in peak memory) from the baseline that counts as a regression
+MIN_SECONDS = 0.01  # Runs shorter than this are too noisy to compare against the baseline
+
+
+def measure(setup: Callable, function: Callable, repeats: int) -> tuple[float, int]:
+    """
+    The best time of function(setup()) over repeats runs, and its peak traced memory in a separate run (tracing
+    slows everything down so it is not timed). As in timeit, garbage collection is off while timing.
+    Output printed by the parser is discarded.
+    """
+    best = float("inf")
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for _ in range(repeats):
+            argument = setup()
+            gc.collect()
+            gc.disable()
+            try:
+                start = time.perf_counter()
+                function(argument)
+                best = min(best, time.perf_counter() - start)
+            finally:
+                gc.enable()
+        argument = setup()
+        tracemalloc.start()
+        function(argument)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return best, peak
+
+
+def bench_file(pdf_filename: Path, repeats: int, work_dir: Path, streams: bool) -> dict[str, dict[str, float]]:
+    size = pdf_filename.stat().st_size
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        objects = count_objects(parse(pdf_filename))
+    streams_dir = work_dir / f"{pdf_filename.stem}_streams"
+    streams_dir.mkdir(exist_ok=True)
+
+    def parsed():
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            return parse(pdf_filename)
+
+    benchmarks = {
+        "parse": (lambda: pdf_filename, parse),
+        "to_json": (parsed, lambda pdf: pdf.to_json()),
+        "decompress": (parsed, lambda pdf: decompress(pdf, streams_dir)),
+        "chart_content": (parsed, chart_content),
+    }
+    if not streams:
+        del benchmarks["decompress"]
+    results = {}
+    for name, (setup, function) in benchmarks.items():
+        seconds, peak = measure(setup, function, repeats)
+        results[name] = {
+            "seconds": round(seconds, 6),
+            "mb_per_s": round(size / seconds / 1e6, 3),
+            "objects_per_s": round(objects / seconds),
+            "peak_mb": round(peak / 1e6, 3),
+        }
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """ Print results next to the baseline and return a description of each regression beyond threshold """
+    regressions = []
+    print(f"{'Shape':<10} {'Benchmark':<14} {'MB/s':>9} {'objects/s':>11} {'Peak MB':>9} {'vs baseline':>12}")
+    for shape, benchmarks in results.items():
+        for name, result in benchmarks.items():
+            base = baseline.get(shape, {}).get(name)
+            change = ""
+            if base is not None and min(result["seconds"], base["seconds"]) >= MIN_SECONDS:
+                speed = result["mb_per_s"] / base["mb_per_s"] - 1
+                change = f"{speed:+.1%}"
+                if speed < -threshold:
+                    regressions.append(f"{shape} {name}: {result['mb_per_s']} MB/s is {-speed:.0%} slower than "
+                                       f"{base['mb_per_s']} MB/s")
+                if result["peak_mb"] > base["peak_mb"] * (1 + threshold):
+                    regressions.append(f"{shape} {name}: peak memory {result['peak_mb']} MB is more than "
+                                       f"{threshold:.0%} above {base['peak_mb']} MB")
+            print(f"{shape:<10} {name:<14} {result['mb_per_s']:>9.2f} {result['objects_per_s']:>11} "
+                  f"{result['peak_mb']:>9.2f} {change:>12}")
+    return regressions
+
+
+def run(shapes: list[str], repeats: int, threshold: float, baseline_file: Path, save_baseline: bool,
+        keep_dir: Path | None = None) -> int:
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = keep_dir or Path(temp_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        results = {}
+        for shape in shapes:
+            streams = SHAPES[shape].get("stream_fraction", 0.2) > 0
+            results[shape] = bench_file(make_shape(shape, work_dir), repeats, work_dir, streams)
+
+    baseline = json.loads(baseline_file.read_text()) if baseline_file.exists() else {}
+    regressions = compare(results, baseline, threshold)
+    if save_baseline:
+        baseline.update(results)
+        baseline_file.write_text(json.dumps(baseline, indent=4) + "\n")
+        print(f"Saved baseline to {baseline_file}")
+        return 0
+    for regression in regressions:
+        print(f"❌ REGRESSION: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark the parser on synthetic PDFs and compare against a baseline")
+    parser.add_argument("--shapes", nargs="+", choices=list(SHAPES), default=list(SHAPES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="Fractional slow-down or peak memory growth that fails the run")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--keep", type=Path, default=None, help="Directory to keep the generated PDFs in")
+
+    args = parser.parse_args()
+    sys.exit(run(args.shapes, args.repeats, args.threshold, args.baseline, args.save_baseline, args.keep))
@@ -1,95 +1,320 @@
+import json
+import os
+from array import array
+from argparse import ArgumentParser
+from html import escape
+from pathlib import Path
 from textwrap import fill
+from typing import TextIO
 
+from lazy_pdf import LazyPdfDoc
 from pdf_parser import *
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 DIVISIONS = 70 * 30
 WRAP_LEN = 70
+SVG_CELL = 10  # Pixels per cell in write_svg()
+
+# Category code -> (symbol, label, SVG colour). Cells no object covers (whitespace between objects, or bytes a lazy
+# parse never read) count as Whitespace.
+CATEGORIES = [
+    ("⬜", "Whitespace", "#eeeeee"),
+    ("🟩", "Comment", "#43a047"),
+    ("🟥", "Data Index", "#e53935"),
+    ("🟫", "Compressed", "#795548"),
+    ("🟪", "List", "#8e24aa"),
+    ("🟦", "Primitive", "#1e88e5"),
+    ("🔴", "Catalog", "#b71c1c"),
+    ("🟣", "Document Structure", "#6a1b9a"),
+    ("🔵", "Page", "#0d47a1"),
+    ("🟤", "Font", "#4e342e"),
+    ("🟡", "Other indirect data", "#fdd835"),
+    ("🟠", "Compressed Data", "#fb8c00"),
+    ("⚫", "Stream Data", "#212121"),
+    ("🟢", "Author info", "#2e7d32"),
+    ("🟨", "Unspecified Dict", "#fff176"),
+    ("❔", "Unknown", "#9e9e9e"),
+]
+(WHITESPACE, COMMENT, DATA_INDEX, COMPRESSED, LIST, PRIMITIVE, CATALOG, STRUCTURE, PAGE, FONT, OTHER,
+ COMPRESSED_DATA, STREAM_DATA, AUTHOR, UNSPECIFIED, UNKNOWN) = range(len(CATEGORIES))
+
+TOP_LEVEL_CODES = {
+    PdfHeader: COMMENT, PdfComment: COMMENT, PdfWhitespaces: WHITESPACE,
+    PdfCrossReferenceTable: DATA_INDEX, PdfTrailerDict: DATA_INDEX, PdfCrossRefOffset: DATA_INDEX,
+    PdfEndOfFileMarker: DATA_INDEX,
+}
+OBJECT_CODES = {
+    PdfStream: COMPRESSED, PdfList: LIST, PdfNumber: PRIMITIVE, PdfBool: PRIMITIVE, PdfNull: PRIMITIVE,
+    PdfHexadecimalString: PRIMITIVE, PdfWhitespaces: WHITESPACE,
+}
+DICT_TYPE_CODES = {
+    "Catalog": CATALOG, "Outlines": STRUCTURE, "Pages": STRUCTURE, "Page": PAGE, "Font": FONT, "FontDescriptor": FONT,
+    "XRef": DATA_INDEX,
+}
+
+
+def classify(obj: PdfObj) -> tuple[int, Optional[str]]:
+    """ The category code of a top-level object, and a description of it if it did not fit a known category """
+    code = TOP_LEVEL_CODES.get(type(obj))
+    if code is not None:
+        return code, None
+    if type(obj) is not PdfIndirectObj:
+        return UNKNOWN, f"{type(obj)}"
+    in_obj = obj.data["object"]
+    code = OBJECT_CODES.get(type(in_obj))
+    if code is not None:
+        return code, None
+    if type(in_obj) is not PdfDict:
+        return UNKNOWN, f"{type(in_obj)}"
+    index = in_obj.get_index()
+    if "Type" in index:
+        in_type = index["Type"].data
+        code = DICT_TYPE_CODES.get(in_type) if isinstance(in_type, str) else None
+        return (OTHER, f"Dict->Type:{in_type}") if code is None else (code, None)
+    if "Filter" in index:
+        return COMPRESSED_DATA, None
+    if "Length" in index:
+        return STREAM_DATA, None
+    if "Creator" in index:
+        return AUTHOR, None
+    return UNSPECIFIED, f"🟨 Unspecified Dict with keys: {' '.join('/' + name for name in index)}"
+
+
+class ContentChart:
+    """
+    A map of which kind of content fills each part of a file, as a fixed number of cells of equal byte size.
+    Objects are classified once as they are added, and only their byte range and category are kept, so objects
+    from iter_parse() can be dropped straight away. Each cell shows the category covering most of its bytes, so
+    objects smaller than a cell still show up where they dominate.
+    """
+
+    def __init__(self, b_size: int, divisions: int = DIVISIONS):
+        self.b_size = b_size
+        self.divisions = divisions
+        self.starts = array("q")
+        self.ends = array("q")
+        self.codes = array("B")
+        self.errors: dict[str, int] = {}
+
+    def add(self, obj: PdfObj):
+        code, error = classify(obj)
+        if error is not None:
+            self.errors[error] = self.errors.get(error, 0) + 1
+        self.add_range(obj.b_start, obj.b_start + obj.b_size, code)
+
+    def add_range(self, start: int, end: int, code: int):
+        if end > start:
+            self.starts.append(start)
+            self.ends.append(end)
+            self.codes.append(code)
+
+    def coverage(self) -> list[list[float]]:
+        """ Bytes of each category in each cell, as divisions rows of one column per category """
+        if numpy is not None:
+            return self.coverage_numpy().tolist()
+        cell_size = max(self.b_size, 1) / self.divisions
+        coverage = [[0.0] * len(CATEGORIES) for _ in range(self.divisions)]
+        for start, end, code in zip(self.starts, self.ends, self.codes):
+            first = min(int(start / cell_size), self.divisions - 1)
+            last = min(int(end / cell_size), self.divisions - 1)
+            for cell in range(first, last + 1):
+                overlap = min(end, (cell + 1) * cell_size) - max(start, cell * cell_size)
+                if overlap > 0:
+                    coverage[cell][code] += overlap
+        return coverage
+
+    def coverage_numpy(self):
+        """
+        coverage() without a loop over objects. The bytes of a category before position x are
+        sum(x - start for starts before x) - sum(x - end for ends before x), which sorted starts and ends with their
+        cumulative sums give for every cell boundary at once.
+        """
+        boundaries = numpy.linspace(0, max(self.b_size, 1), self.divisions + 1)
+        starts = numpy.frombuffer(self.starts, dtype=numpy.int64).astype(numpy.float64)
+        ends = numpy.frombuffer(self.ends, dtype=numpy.int64).astype(numpy.float64)
+        codes = numpy.frombuffer(self.codes, dtype=numpy.uint8)
+        coverage = numpy.zeros((self.divisions, len(CATEGORIES)))
+
+        def before(positions):
+            positions = numpy.sort(positions)
+            sums = numpy.concatenate(([0.0], numpy.cumsum(positions)))
+            count = numpy.searchsorted(positions, boundaries)
+            return count * boundaries - sums[count]
 
+        for code in numpy.unique(codes):
+            selected = codes == code
+            covered = before(starts[selected]) - before(ends[selected])
+            coverage[:, code] = numpy.diff(covered)
+        return coverage
 
-def chart_content(pdf: PdfDoc):
-    output = ""
-    key = {}
-    errors = []
-    division_size = pdf.b_size / DIVISIONS
-    for obj in pdf.data:
-        s = int(obj.b_size / division_size)
-        if s == 0:
+    def cells(self) -> list[int]:
+        """ The dominant category code of each cell. Bytes no object covers count as whitespace. """
+        cell_size = max(self.b_size, 1) / self.divisions
+        if numpy is not None:
+            coverage = self.coverage_numpy()
+            coverage[:, WHITESPACE] += numpy.maximum(cell_size - coverage.sum(axis=1), 0)
+            return coverage.argmax(axis=1).tolist()
+        cells = []
+        for row in self.coverage():
+            row[WHITESPACE] += max(cell_size - sum(row), 0)
+            cells.append(max(range(len(row)), key=row.__getitem__))
+        return cells
+
+    def totals(self) -> dict[str, int]:
+        """ Bytes covered by each category over the whole file """
+        totals = [0] * len(CATEGORIES)
+        for start, end, code in zip(self.starts, self.ends, self.codes):
+            totals[code] += end - start
+        totals[WHITESPACE] += max(self.b_size - sum(totals), 0)
+        return {CATEGORIES[code][1]: total for code, total in enumerate(totals) if total}
+
+    def render(self) -> str:
+        """ The emoji map with its key and the objects that did not fit a category """
+        cells = self.cells()
+        lines = [fill("".join(CATEGORIES[code][0] for code in cells), WRAP_LEN), "KEY:"]
+        for code in dict.fromkeys(cells):
+            lines.append(f"  {CATEGORIES[code][0]}\t{CATEGORIES[code][1]}")
+        lines.append("")
+        if self.errors:
+            lines.append("ERRORS:")
+        for error, count in self.errors.items():
+            lines.append(f"? {error}" + (f" (x{count})" if count > 1 else ""))
+        return "\n".join(lines)
+
+    def to_json(self) -> dict:
+        return {
+            "bytes": self.b_size,
+            "divisions": self.divisions,
+            "categories": [label for _, label, _ in CATEGORIES],
+            "cells": self.cells(),
+            "totals": self.totals(),
+            "errors": self.errors,
+        }
+
+    def write_svg(self, fh: TextIO, columns: int = WRAP_LEN, title: str = ""):
+        """ The map as a grid of coloured squares, one per cell, with a legend of the categories used """
+        cells = self.cells()
+        rows = (len(cells) + columns - 1) // columns
+        used = list(dict.fromkeys(cells))
+        width = columns * SVG_CELL
+        height = rows * SVG_CELL + (len(used) + 1) * 2 * SVG_CELL
+        cell_bytes = self.b_size / self.divisions
+        fh.write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+                 f'font-family="sans-serif" font-size="{SVG_CELL * 1.2:g}">\n')
+        if title:
+            fh.write(f"<title>{escape(title)}</title>\n")
+        for i, code in enumerate(cells):
+            x, y = i % columns * SVG_CELL, i // columns * SVG_CELL
+            fh.write(f'<rect x="{x}" y="{y}" width="{SVG_CELL}" height="{SVG_CELL}" fill="{CATEGORIES[code][2]}">'
+                     f'<title>{CATEGORIES[code][1]} at bytes {int(i * cell_bytes)}-{int((i + 1) * cell_bytes)}'
+                     f'</title></rect>\n')
+        for i, code in enumerate(used):
+            y = rows * SVG_CELL + (i + 1) * 2 * SVG_CELL
+            fh.write(f'<rect x="0" y="{y - SVG_CELL}" width="{SVG_CELL}" height="{SVG_CELL}" '
+                     f'fill="{CATEGORIES[code][2]}"/>\n')
+            fh.write(f'<text x="{2 * SVG_CELL}" y="{y}">{escape(CATEGORIES[code][1])}</text>\n')
+        fh.write("</svg>\n")
+
+
+def chart_lazy(doc: LazyPdfDoc, divisions: int = DIVISIONS) -> ContentChart:
+    """
+    Chart a LazyPdfDoc from its header, its cross-reference sections and the objects they list, parsing each
+    object once. Objects inside object streams are part of their stream's bytes. Comments and objects replaced by
+    later updates are never read, so they count as whitespace; otherwise the chart is that of the full parse.
+    """
+    chart = ContentChart(os.path.getsize(doc.filename), divisions)
+    with open(doc.filename, "rb") as fh:
+        header = PdfHeader.Pattern.match(fh.read(16))
+    if header is not None:
+        chart.add_range(0, header.end(), COMMENT)
+    sections = list(doc.sections)
+    if not any(start <= doc.tail[0] < end for start, end in sections):
+        sections.append(doc.tail)
+    for start, end in sections:
+        chart.add_range(start, end, DATA_INDEX)
+    for number, (offset, generation) in sorted(doc.xref.items(), key=lambda item: item[1][0]):
+        # Cross-reference streams list themselves, and are already charted as a section
+        if any(start <= offset < end for start, end in sections):
+            continue
+        try:
+            obj = doc.get((number, generation))
+        except ParseError as e:
+            chart.errors[f"R {number} {generation}: {e}"] = 1
             continue
+        if obj is not None:
+            chart.add(obj)
+    return chart
+
+
+def build_chart(pdf: PdfDoc | LazyPdfDoc | typing.Iterable[PdfObj], b_size: Optional[int] = None,
+                divisions: int = DIVISIONS) -> ContentChart:
+    """
+    Chart a parsed PdfDoc, a LazyPdfDoc, or the top-level objects from iter_parse() (which needs b_size, the file
+    size).
+    """
+    if isinstance(pdf, LazyPdfDoc):
+        return chart_lazy(pdf, divisions)
+    objects = pdf.data if isinstance(pdf, PdfDoc) else pdf
+    chart = ContentChart(pdf.b_size if b_size is None else b_size, divisions)
+    for obj in objects:
+        chart.add(obj)
+    return chart
 
-        if type(obj) in [PdfHeader, PdfComment]:
-            output += "🟩" * s
-            key["🟩"] = "Comment"
-        elif type(obj) in [PdfWhitespaces]:
-            output += "⬜" * s
-            key["⬜"] = "Whitespace"
-        elif type(obj) in [PdfCrossReferenceTable, PdfTrailerDict, PdfCrossRefOffset, PdfEndOfFileMarker]:
-            output += "🟥" * s
-            key["🟥"] = "Data Index"
-        elif type(obj) in [PdfIndirectObj]:
-            in_obj = obj.data["object"]
-            if type(in_obj) in [PdfStream]:
-                output += "🟫" * s
-                key["🟫"] = "Compressed"
-            elif type(in_obj) in [PdfList]:
-                output += "🟪" * s
-                key["🟪"] = "List"
-            elif type(in_obj) in [PdfNumber, PdfBool, PdfNull, PdfHexadecimalString]:
-                output += "🟦" * s
-                key["🟦"] = "Primitive"
-            elif type(in_obj) in [PdfWhitespaces]:
-                output += "⬜" * s
-                key["⬜"] = "Whitespace"
-            elif type(in_obj) in [PdfDict]:
-                for name in in_obj.data:
-                    if name.data == "Type":
-                        in_type = in_obj.data[name].data
-                        if in_type in ["Catalog"]:
-                            output += "🔴" * s
-                            key["🔴"] = "Catalog"
-                        elif in_type in ["Outlines", "Pages"]:
-                            output += "🟣" * s
-                            key["🟣"] = "Document Structure"
-                        elif in_type in ["Page"]:
-                            output += "🔵" * s
-                            key["🔵"] = "Page"
-                        elif in_type in ["Font", "FontDescriptor"]:
-                            output += "🟤" * s
-                            key["🟤"] = "Font"
-                        else:
-                            output += "🟡" * s
-                            key["🟡"] = "Other indirect data"
-                            errors.append(f"Dict->Type:{in_type}")
-                        break
-                    if name.data == "Filter":
-                        output += "🟠" * s
-                        key["🟠"] = "Compressed Data"
-                        break
-                    if name.data == "Length":
-                        output += "⚫" * s
-                        key["⚫"] = "Stream Data"
-                        break
-                    if name.data == "Creator":
-                        output += "🟢" * s
-                        key["🟢"] = "Author info"
-                        break
-                else:
-                    output += "🟨" * s
-                    # key["🟨"] = "Unspecified Dict"
-                    errors.append(f"🟨 Unspecified Dict with content: {in_obj.data}")
-            else:
-                errors.append(f"{type(in_obj)}")
-        else:
-            errors.append(f"{type(obj)}")
-    print(fill(output, WRAP_LEN))
-    print("KEY:")
-    for k, v in key.items():
-        print(f"  {k}\t{v}")
-    print("")
-    if errors:
-        print("ERRORS:")
-    for e in errors:
-        print(f"? {e}")
+
+def chart_content(pdf: PdfDoc | LazyPdfDoc | typing.Iterable[PdfObj], b_size: Optional[int] = None,
+                  divisions: int = DIVISIONS) -> ContentChart:
+    """
+    Print a map of the document's content.
+    pdf is either a parsed PdfDoc, a LazyPdfDoc or the top-level objects from iter_parse(), in which case b_size
+    (the file size) is required.
+    """
+    chart = build_chart(pdf, b_size, divisions)
+    print(chart.render())
+    return chart
 
 
 if __name__ == "__main__":
-    chart_content(parse('test_pdfs/batch_1/sample2.pdf'))
+    parser = ArgumentParser(description="Chart which kind of content fills each part of one or more PDFs")
+    parser.add_argument("pdf_filenames", type=Path, nargs="+")
+    parser.add_argument("--mode", choices=["parse", "stream", "lazy"], default="parse",
+                        help="Parse whole files, stream their top-level objects (iter_parse), or read them "
+                             "through the cross-reference table (LazyPdfDoc)")
+    parser.add_argument("--divisions", type=int, default=DIVISIONS, help="Number of cells in each chart")
+    parser.add_argument("--json", type=Path, default=None,
+                        help="Append one JSON line per file (cells, byte totals and errors) to this file")
+    parser.add_argument("--svg", type=Path, default=None, help="Directory to write an SVG chart per file to")
+    parser.add_argument("--quiet", action="store_true", help="Do not print the charts")
+
+    args = parser.parse_args()
+    if args.svg is not None:
+        args.svg.mkdir(parents=True, exist_ok=True)
+    json_fh = open(args.json, "a") if args.json is not None else None
+    try:
+        for pdf_filename in args.pdf_filenames:
+            try:
+                if args.mode == "lazy":
+                    with LazyPdfDoc(pdf_filename) as doc:
+                        chart = chart_lazy(doc, args.divisions)
+                elif args.mode == "stream":
+                    chart = build_chart(iter_parse(pdf_filename, progress=False), os.path.getsize(pdf_filename),
+                                        args.divisions)
+                else:
+                    chart = build_chart(parse(pdf_filename, progress=False), divisions=args.divisions)
+            except (ParseError, DecodeError, OSError) as e:
+                print(f"❌ {pdf_filename}: {e}")
+                continue
+            if not args.quiet:
+                print(pdf_filename)
+                print(chart.render())
+            if json_fh is not None:
+                json_fh.write(json.dumps({"file": str(pdf_filename), **chart.to_json()}) + "\n")
+            if args.svg is not None:
+                with open(args.svg / pdf_filename.with_suffix(".svg").name, "w") as fh:
+                    chart.write_svg(fh, title=str(pdf_filename))
+    finally:
+        if json_fh is not None:
+            json_fh.close()
@@ -0,0 +1,35 @@
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any
+
+
+def add_pdf_to_json_arguments(parser: ArgumentParser, cache_default: Any):
+    """
+    The arguments of pdf-to-json.py, shared with parse_client.py. This module only imports the standard library so
+    the client starts quickly.
+    """
+    parser.add_argument("pdf_filename", type=Path)
+    parser.add_argument("output_filename", type=Path, nargs="?", default=None)
+    parser.add_argument("--decompress", action="store_true", help="Decompress streams to files before writing JSON")
+    parser.add_argument("--mmap", action="store_true", help="Memory map the PDF instead of copying it into memory")
+    parser.add_argument("--stream", action="store_true",
+                        help="Parse and write one top-level object at a time instead of building the whole tree")
+    parser.add_argument("--compact", action="store_true", help="Write JSON without indentation or spaces")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of streams to decompress in parallel")
+    parser.add_argument("--store", type=Path, default=None,
+                        help="Directory of decompressed streams shared between documents")
+    parser.add_argument("--store-size", type=int, default=None,
+                        help="Maximum size of the --store directory in MB, least recently used streams are removed")
+    parser.add_argument("--profile", type=Path, default=None,
+                        help="Write parse statistics (match counts, time and bytes per type) to this JSON file")
+    parser.add_argument("--flamegraph", type=Path, default=None,
+                        help="Write parse time per nesting of types to this file in collapsed stack format")
+    parser.add_argument("--cache", type=Path, nargs="?", const=cache_default, default=None,
+                        help=f"Load the parsed tree from, or save it to, a cache directory (default: {cache_default})")
+    parser.add_argument("--cache-fast", action="store_true",
+                        help="Identify cached files by path, size and modification time instead of hashing them")
+    parser.add_argument("--cache-size", type=int, default=None, help="Maximum size of the --cache directory in MB")
+
+
+def megabytes(size: int | None) -> int | None:
+    return None if size is None else size * 1_000_000
@@ -0,0 +1,88 @@
+import zlib
+from pathlib import Path
+
+import pytest
+
+PAGE = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>"
+
+
+def xref_stream_pdf(objects: dict[int, bytes]) -> bytes:
+    """
+    A PDF whose objects are all packed in object stream 6 except the catalog 1, listed by cross-reference stream 7
+    """
+    packed = {number: obj for number, obj in objects.items() if number != 1}
+    offsets = []
+    body = b""
+    for obj in packed.values():
+        offsets.append(len(body))
+        body += obj + b"\n"
+    header = b" ".join(b"%d %d" % (number, offset) for number, offset in zip(packed, offsets)) + b"\n"
+    data = zlib.compress(header + body)
+    out = b"%PDF-1.5\n"
+    catalog = len(out)
+    out += b"1 0 obj\n" + objects[1] + b"\nendobj\n"
+    obj_stm = len(out)
+    out += (b"6 0 obj\n<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\nstream\n"
+            % (len(packed), len(header), len(data)) + data + b"\nendstream\nendobj\n")
+    xref = len(out)
+    index = {number: i for i, number in enumerate(packed)}
+    rows = []
+    for number in range(8):
+        if number == 1:
+            rows.append(bytes([1]) + catalog.to_bytes(2, "big") + b"\0")
+        elif number == 6:
+            rows.append(bytes([1]) + obj_stm.to_bytes(2, "big") + b"\0")
+        elif number == 7:
+            rows.append(bytes([1]) + xref.to_bytes(2, "big") + b"\0")
+        elif number in index:
+            rows.append(bytes([2, 0, 6, index[number]]))
+        else:
+            rows.append(bytes([0, 0, 0, 0xff]))
+    data = zlib.compress(b"".join(rows))
+    out += (b"7 0 obj\n<< /Type /XRef /Size 8 /W [1 2 1] /Root 1 0 R /Filter /FlateDecode /Length %d >>\nstream\n"
+            % len(data) + data + b"\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % xref)
+    return out
+
+
+def table_pdf(objects: dict[int, bytes], prev: bytes = b"", freed: tuple = (), root: int = 1) -> bytes:
+    """ A PDF with a cross-reference table, or an incremental update of prev when it is given """
+    out = prev or b"%PDF-1.4\n"
+    offsets = {}
+    for number, obj in objects.items():
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n"
+    entries = sorted([(number, b"%010d 00000 n \n" % offset) for number, offset in offsets.items()]
+                     + [(number, b"0000000000 00001 f \n") for number in freed])
+    if not prev:
+        entries.insert(0, (0, b"0000000000 65535 f \n"))
+    for number, entry in entries:
+        out += b"%d 1\n" % number + entry
+    size = max(number for number, _ in entries) + 1
+    trailer = b"/Size %d /Root %d 0 R" % (size, root)
+    if prev:
+        trailer += b" /Prev %d" % int(prev.rsplit(b"startxref", 1)[1].split()[0])
+    out += b"trailer\n<< " + trailer + b" >>\nstartxref\n%d\n%%%%EOF\n" % xref
+    return out
+
+
+@pytest.fixture
+def xs_pdf(tmp_path) -> Path:
+    """ Three pages whose page tree is packed in an object stream """
+    path = tmp_path / "xs.pdf"
+    path.write_bytes(xref_stream_pdf({1: b"<< /Type /Catalog /Pages 2 0 R >>",
+                                      2: b"<< /Type /Pages /Kids [3 0 R 4 0 R 5 0 R] /Count 3 >>",
+                                      3: PAGE, 4: PAGE, 5: PAGE}))
+    return path
+
+
+@pytest.fixture
+def updated_pdf(tmp_path) -> Path:
+    """ Two pages, then an update that replaces page 4 and frees object 5 """
+    original = table_pdf({1: b"<< /Type /Catalog /Pages 2 0 R >>",
+                          2: b"<< /Type /Pages /Kids [3 0 R 4 0 R] /Count 2 >>",
+                          3: PAGE, 4: PAGE, 5: b"(unused)"})
+    path = tmp_path / "updated.pdf"
+    path.write_bytes(table_pdf({4: PAGE.replace(b"612", b"595")}, prev=original, freed=(5,)))
+    return path
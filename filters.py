@@ -0,0 +1,335 @@
+"""
+Stream filters (7.4). Each filter is a stage that takes an iterable of byte chunks and yields decoded chunks, so a
+/Filter array is decoded as a chain of generators without holding a whole stage's output in memory.
+The predictors (7.4.4.4) use NumPy when it is installed and fall back to pure Python otherwise.
+"""
+import base64
+import zlib
+from typing import Callable, Iterable, Iterator, Optional
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CHUNK_SIZE = 1 << 20
+
+Stage = Callable[[Iterable[bytes], dict], Iterator[bytes]]
+
+
+class DecodeError(Exception):
+    pass
+
+
+FILTERS: dict[str, Stage] = {}
+
+
+def register_filter(stage: Stage, *names: str) -> Stage:
+    """ Make a stage available under the filter names (including abbreviations) it decodes """
+    for name in names:
+        FILTERS[name] = stage
+    return stage
+
+
+def decode_chunks(chunks: Iterable[bytes], filters: list[tuple[str, dict]]) -> Iterator[bytes]:
+    """ Chain the stages for the (name, parameters) pairs of a stream's /Filter and /DecodeParms in order """
+    for name, parms in filters:
+        if name not in FILTERS:
+            raise DecodeError(f"Decompressing with filter {name} is not implemented.")
+        chunks = FILTERS[name](chunks, parms)
+    return iter(chunks)
+
+
+def decode(data: bytes, filters: list[tuple[str, dict]]) -> bytes:
+    return b"".join(decode_chunks(split_chunks(data), filters))
+
+
+def split_chunks(data: bytes, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    view = memoryview(data)
+    for i in range(0, len(view), chunk_size):
+        yield view[i:i + chunk_size]
+
+
+def inflate(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    decompressor = zlib.decompressobj()
+    try:
+        for chunk in chunks:
+            while chunk and not decompressor.eof:
+                output = decompressor.decompress(chunk, CHUNK_SIZE)
+                if output:
+                    yield output
+                chunk = decompressor.unconsumed_tail
+            if decompressor.eof:
+                # Anything after the end of the zlib stream (such as the endstream keyword) is ignored
+                break
+        output = decompressor.flush()
+    except zlib.error as e:
+        raise DecodeError(f"Corrupt FlateDecode stream: {e}") from e
+    if output:
+        yield output
+    if not decompressor.eof:
+        raise DecodeError("Incomplete or truncated FlateDecode stream")
+
+
+def lzw(chunks: Iterable[bytes], early_change: int) -> Iterator[bytes]:
+    """ 7.4.4.2 """
+    table = [bytes([i]) for i in range(256)] + [b"", b""]  # 256 is clear-table and 257 end-of-data
+    code_length = 9
+    bits = 0
+    bit_count = 0
+    previous = None
+    for chunk in chunks:
+        output = bytearray()
+        for byte in bytes(chunk):
+            bits = (bits << 8) | byte
+            bit_count += 8
+            while bit_count >= code_length:
+                bit_count -= code_length
+                code = bits >> bit_count
+                bits &= (1 << bit_count) - 1
+                if code == 256:
+                    del table[258:]
+                    code_length = 9
+                    previous = None
+                    continue
+                if code == 257:
+                    yield bytes(output)
+                    return
+                if previous is None:
+                    entry = table[code]
+                elif code < len(table):
+                    entry = table[code]
+                    table.append(previous + entry[:1])
+                elif code == len(table):
+                    entry = previous + previous[:1]
+                    table.append(entry)
+                else:
+                    raise DecodeError(f"Invalid LZW code {code}")
+                output += entry
+                previous = entry
+                if len(table) + early_change >= 1 << code_length and code_length < 12:
+                    code_length += 1
+        yield bytes(output)
+
+
+def flate_decode(chunks: Iterable[bytes], parms: dict) -> Iterator[bytes]:
+    return unpredict(inflate(chunks), parms)
+
+
+def lzw_decode(chunks: Iterable[bytes], parms: dict) -> Iterator[bytes]:
+    return unpredict(lzw(chunks, parms.get("EarlyChange", 1)), parms)
+
+
+def ascii_hex_decode(chunks: Iterable[bytes], parms: dict) -> Iterator[bytes]:
+    """ 7.4.2 """
+    carry = b""
+    for chunk in chunks:
+        chunk = bytes(chunk)
+        end = chunk.find(b">")
+        digits = carry + b"".join(chunk[:end if end >= 0 else len(chunk)].split())
+        even = len(digits) & ~1
+        try:
+            yield bytes.fromhex(digits[:even].decode("ascii"))
+        except (ValueError, UnicodeDecodeError):
+            raise DecodeError("Invalid character in ASCIIHexDecode stream")
+        carry = digits[even:]
+        if end >= 0:
+            break
+    if carry:
+        # An odd final digit is followed by an implied 0
+        try:
+            yield bytes.fromhex(carry.decode("ascii") + "0")
+        except (ValueError, UnicodeDecodeError):
+            raise DecodeError("Invalid character in ASCIIHexDecode stream")
+
+
+def ascii85_decode(chunks: Iterable[bytes], parms: dict) -> Iterator[bytes]:
+    """ 7.4.3. Only complete 5 character groups are decoded from each chunk, the rest is carried to the next. """
+    carry = b""
+    for chunk in chunks:
+        chunk = bytes(chunk)
+        end = chunk.find(b"~")
+        data = carry + b"".join(chunk[:end if end >= 0 else len(chunk)].split())
+        if end >= 0:
+            carry = data
+            break
+        # z stands for a whole group of zeros so only the part after the last z can be an incomplete group
+        complete = len(data) - len(data.rsplit(b"z", 1)[-1]) % 5
+        carry = data[complete:]
+        try:
+            yield base64.a85decode(data[:complete])
+        except ValueError as e:
+            raise DecodeError(f"Invalid ASCII85Decode stream: {e}")
+    if carry:
+        try:
+            yield base64.a85decode(carry)
+        except ValueError as e:
+            raise DecodeError(f"Invalid ASCII85Decode stream: {e}")
+
+
+def run_length_decode(chunks: Iterable[bytes], parms: dict) -> Iterator[bytes]:
+    """ 7.4.5 """
+    carry = b""
+    for chunk in chunks:
+        data = carry + bytes(chunk)
+        output = bytearray()
+        i = 0
+        while i < len(data):
+            length = data[i]
+            if length == 128:
+                yield bytes(output)
+                return
+            if length < 128:
+                if i + 2 + length > len(data):
+                    break
+                output += data[i + 1:i + 2 + length]
+                i += 2 + length
+            else:
+                if i + 2 > len(data):
+                    break
+                output += data[i + 1:i + 2] * (257 - length)
+                i += 2
+        carry = data[i:]
+        yield bytes(output)
+
+
+register_filter(flate_decode, "FlateDecode", "Fl")
+register_filter(lzw_decode, "LZWDecode", "LZW")
+register_filter(ascii_hex_decode, "ASCIIHexDecode", "AHx")
+register_filter(ascii85_decode, "ASCII85Decode", "A85")
+register_filter(run_length_decode, "RunLengthDecode", "RL")
+
+
+def unpredict(chunks: Iterable[bytes], parms: dict) -> Iterator[bytes]:
+    """ Undo the /Predictor of FlateDecode and LZWDecode, a block of complete rows at a time """
+    predictor = parms.get("Predictor", 1)
+    if predictor == 1:
+        yield from chunks
+        return
+    columns = parms.get("Columns", 1)
+    colors = parms.get("Colors", 1)
+    bits_per_component = parms.get("BitsPerComponent", 8)
+    row_size = (columns * colors * bits_per_component + 7) // 8
+    if predictor == 2:
+        stride = row_size
+
+        def unpredict_rows(rows, _previous):
+            return tiff_unpredict(rows, columns, colors, bits_per_component), b""
+    elif predictor >= 10:
+        # Every row starts with its own PNG predictor type byte
+        stride = row_size + 1
+        bpp = max(1, colors * bits_per_component // 8)
+
+        def unpredict_rows(rows, previous):
+            return png_unpredict(rows, row_size, bpp, previous)
+    else:
+        raise DecodeError(f"Predictor {predictor} is not implemented")
+    previous = bytes(row_size)
+    carry = b""
+    for chunk in chunks:
+        data = carry + bytes(chunk)
+        complete = len(data) - len(data) % stride
+        carry = data[complete:]
+        if complete:
+            output, previous = unpredict_rows(data[:complete], previous)
+            yield output
+    # A trailing incomplete row is dropped
+
+
+def png_unpredict(data: bytes, row_size: int, bpp: int, previous: bytes) -> tuple[bytes, bytes]:
+    """ Decode complete PNG predicted rows. Returns the output and the last decoded row. """
+    if numpy is not None:
+        return png_unpredict_numpy(data, row_size, bpp, previous)
+    output = bytearray()
+    previous = bytearray(previous)
+    for start in range(0, len(data), row_size + 1):
+        row = bytearray(data[start + 1:start + 1 + row_size])
+        png_unpredict_row(data[start], row, previous, bpp)
+        output += row
+        previous = row
+    return bytes(output), bytes(previous)
+
+
+def png_unpredict_row(predictor: int, row: bytearray, previous: bytearray, bpp: int):
+    """ Undo the PNG predictor of one row in place """
+    row_size = len(row)
+    if predictor == 1:  # Sub
+        for i in range(bpp, row_size):
+            row[i] = (row[i] + row[i - bpp]) & 0xff
+    elif predictor == 2:  # Up
+        for i in range(row_size):
+            row[i] = (row[i] + previous[i]) & 0xff
+    elif predictor == 3:  # Average
+        for i in range(row_size):
+            left = row[i - bpp] if i >= bpp else 0
+            row[i] = (row[i] + ((left + previous[i]) >> 1)) & 0xff
+    elif predictor == 4:  # Paeth
+        for i in range(row_size):
+            left = row[i - bpp] if i >= bpp else 0
+            up_left = previous[i - bpp] if i >= bpp else 0
+            estimate = left + previous[i] - up_left
+            p_left, p_up, p_up_left = abs(estimate - left), abs(estimate - previous[i]), abs(estimate - up_left)
+            if p_left <= p_up and p_left <= p_up_left:
+                row[i] = (row[i] + left) & 0xff
+            elif p_up <= p_up_left:
+                row[i] = (row[i] + previous[i]) & 0xff
+            else:
+                row[i] = (row[i] + up_left) & 0xff
+    elif predictor != 0:
+        raise DecodeError(f"Unknown PNG predictor type {predictor}")
+
+
+def png_unpredict_numpy(data: bytes, row_size: int, bpp: int, previous: bytes) -> tuple[bytes, bytes]:
+    """
+    Runs of rows with the same None, Sub or Up predictor are decoded in one vectorised step: Up is a cumulative
+    sum down the rows and Sub a cumulative sum along each row (per byte of a pixel), both wrapping at 256.
+    Average and Paeth depend on the decoded byte to their left so those rows are decoded one at a time.
+    """
+    rows = numpy.frombuffer(data, numpy.uint8).reshape(-1, row_size + 1)
+    types = rows[:, 0]
+    output = rows[:, 1:].copy()
+    last = numpy.frombuffer(previous, numpy.uint8)
+    r = 0
+    while r < len(rows):
+        predictor = types[r]
+        end = r + 1
+        if predictor <= 2:
+            while end < len(rows) and types[end] == predictor:
+                end += 1
+        if predictor == 1:
+            block = output[r:end].reshape(end - r, -1, bpp)
+            output[r:end] = numpy.cumsum(block, axis=1, dtype=numpy.uint8).reshape(end - r, row_size)
+        elif predictor == 2:
+            output[r:end] = numpy.cumsum(numpy.vstack([last, output[r:end]]), axis=0, dtype=numpy.uint8)[1:]
+        elif predictor != 0:
+            row = bytearray(output[r].tobytes())
+            png_unpredict_row(predictor, row, bytearray(last.tobytes()), bpp)
+            output[r] = numpy.frombuffer(row, numpy.uint8)
+        last = output[end - 1]
+        r = end
+    return output.tobytes(), last.tobytes()
+
+
+def tiff_unpredict(data: bytes, columns: int, colors: int, bits_per_component: int) -> bytes:
+    """ Undo TIFF Predictor 2: each component is stored as the difference from the same component to its left """
+    if numpy is not None and bits_per_component in (8, 16):
+        dtype = numpy.uint8 if bits_per_component == 8 else numpy.dtype(">u2")
+        rows = numpy.frombuffer(data, dtype).reshape(-1, columns, colors)
+        # Accumulate in native byte order so the sum wraps at the component size
+        accumulated = numpy.cumsum(rows, axis=1, dtype=numpy.uint8 if bits_per_component == 8 else numpy.uint16)
+        return accumulated.astype(dtype).tobytes()
+    row_size = (columns * colors * bits_per_component + 7) // 8
+    mask = (1 << bits_per_component) - 1
+    output = bytearray()
+    for start in range(0, len(data), row_size):
+        row = int.from_bytes(data[start:start + row_size], "big")
+        padding = row_size * 8 - columns * colors * bits_per_component
+        components = [(row >> (padding + (columns * colors - 1 - i) * bits_per_component)) & mask
+                      for i in range(columns * colors)]
+        for i in range(colors, len(components)):
+            components[i] = (components[i] + components[i - colors]) & mask
+        row = 0
+        for component in components:
+            row = (row << bits_per_component) | component
+        output += (row << padding).to_bytes(row_size, "big")
+    return bytes(output)
@@ -0,0 +1,171 @@
+import json
+import time
+from typing import Optional, TextIO
+
+from pdf_parser import PdfObj, NestablePdfObj
+
+
+class Instrumentation:
+    """
+    Statistics about a parse, collected through the hooks tokenize() calls when it is given an instance
+    (parse(..., instrument=Instrumentation())). Nothing is collected, or costs anything, otherwise.
+
+    For every step of the tokenizer the time since the previous step is charged to the class of the token it
+    produced (self time) and to the chain of contexts it was found in (for collapsed stacks). Nested objects also
+    get the time from their opening to their end (inclusive time). As in cProfile, an object nested in another of
+    the same type adds nothing to the inclusive time of that type, so it is never counted twice. Every byte of the
+    file is counted once, against the type of the token that consumed it. With iter_parse(), time spent by the
+    caller between objects is charged to the next token.
+
+    Before each dispatch the classes of the context are matched one at a time, in the order of Contexts, to count
+    how often each was tried. That is not timed.
+    """
+
+    def __init__(self):
+        self.hits: dict[tuple[str, str], int] = {}  # (context class, token class) -> tokens matched
+        self.tries: dict[tuple[str, str], int] = {}  # (context class, token class) -> times its Pattern was tried
+        self.end_hits: dict[str, int] = {}  # Context class -> times its ending was matched
+        self.self_time: dict[str, float] = {}
+        self.inclusive_time: dict[str, float] = {}
+        self.bytes: dict[str, int] = {}
+        self.counts: dict[str, int] = {}
+        self.stacks: dict[str, float] = {}  # "PdfDoc;PdfIndirectObj;PdfDict;PdfName" -> seconds
+        self.contexts: dict[str, type] = {}
+        self.seconds = 0.0
+        self.buffer_size = 0
+        # id() of each open nested object -> (its stack, when it opened)
+        self._open: dict[int, tuple[str, float]] = {}
+        self._open_types: dict[str, int] = {}  # Class -> how many objects of it are open
+        self._last = 0.0
+        self._start = 0.0
+
+    def start(self, root: NestablePdfObj, buffer_size: int):
+        self.buffer_size += buffer_size
+        self._start = self._last = time.perf_counter()
+        self._open[id(root)] = (type(root).__name__, self._start)
+        self._open_types[type(root).__name__] = self._open_types.get(type(root).__name__, 0) + 1
+        self.contexts[type(root).__name__] = type(root)
+
+    def stop(self):
+        self.seconds += time.perf_counter() - self._start
+        self._open.clear()
+        self._open_types.clear()
+
+    def dispatch(self, context: NestablePdfObj, buffer: bytes, pos: int):
+        """ The token at pos is about to be matched in context: count the classes tried until one matches """
+        start = time.perf_counter()
+        context_name = type(context).__name__
+        _, classes = context.get_dispatch()
+        for name, cls in classes.items():
+            key = (context_name, name)
+            self.tries[key] = self.tries.get(key, 0) + 1
+            match = cls.Pattern.match(buffer, pos)
+            if match is not None and match.end() > pos:
+                break
+        # Leave the counting out of every time measured
+        spent = time.perf_counter() - start
+        self._last += spent
+        self._start += spent
+        for obj_id, (stack, opened) in self._open.items():
+            self._open[obj_id] = (stack, opened + spent)
+
+    def token(self, context: NestablePdfObj, child: PdfObj, length: int):
+        """ child was matched in context, consuming length bytes """
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        context_name = type(context).__name__
+        name = type(child).__name__
+        key = (context_name, name)
+        self.hits[key] = self.hits.get(key, 0) + 1
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self.self_time[name] = self.self_time.get(name, 0.0) + elapsed
+        self.bytes[name] = self.bytes.get(name, 0) + length
+        stack = self._open[id(context)][0] + ";" + name
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed
+        if isinstance(child, NestablePdfObj):
+            self._open[id(child)] = (stack, now)
+            self._open_types[name] = self._open_types.get(name, 0) + 1
+            self.contexts[name] = type(child)
+        self.opened(child, stack)
+
+    def finish(self, obj: NestablePdfObj, length: int):
+        """ The end of obj was matched, consuming length bytes (for streams skipped by /Length, the whole body) """
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        name = type(obj).__name__
+        stack, opened = self._open.pop(id(obj))
+        self.end_hits[name] = self.end_hits.get(name, 0) + 1
+        self.self_time[name] = self.self_time.get(name, 0.0) + elapsed
+        self._open_types[name] -= 1
+        if not self._open_types[name]:
+            self.inclusive_time[name] = self.inclusive_time.get(name, 0.0) + now - opened
+        self.bytes[name] = self.bytes.get(name, 0) + length
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + elapsed
+        self.finished(obj, stack)
+
+    def opened(self, obj: PdfObj, stack: str):
+        """ Called for every token after it is counted, for subclasses such as Tracer """
+
+    def finished(self, obj: NestablePdfObj, stack: str):
+        """ Called for every nested object after its end is counted """
+
+    def attempts(self, context_name: str) -> dict[str, int]:
+        """ How often each class of a context was tried, counted by dispatch() """
+        _, classes = self.contexts[context_name].get_dispatch()
+        return {name: self.tries.get((context_name, name), 0) for name in classes}
+
+    def to_json(self) -> dict:
+        contexts = {}
+        for context_name in self.contexts:
+            attempts = self.attempts(context_name)
+            contexts[context_name] = {
+                "end_matches": self.end_hits.get(context_name, 0),
+                "classes": {name: {"attempts": attempts[name], "hits": self.hits.get((context_name, name), 0)}
+                            for name in attempts if attempts[name]},
+            }
+        types = {}
+        for name in sorted(set(self.counts) | set(self.end_hits), key=lambda n: -self.self_time.get(n, 0.0)):
+            types[name] = {
+                "count": self.counts.get(name, 0),
+                "self_seconds": round(self.self_time.get(name, 0.0), 6),
+                "inclusive_seconds": round(self.inclusive_time.get(name, self.self_time.get(name, 0.0)), 6),
+                "bytes": self.bytes.get(name, 0),
+            }
+        return {
+            "seconds": round(self.seconds, 6),
+            "bytes": self.buffer_size,
+            "mb_per_s": round(self.buffer_size / self.seconds / 1e6, 3) if self.seconds else None,
+            "types": types,
+            "contexts": contexts,
+        }
+
+    def write_json(self, fh: TextIO):
+        json.dump(self.to_json(), fh, indent=4)
+
+    def write_collapsed(self, fh: TextIO):
+        """ One "frame;frame;frame microseconds" line per stack, the input format of flamegraph.pl and speedscope """
+        for stack, seconds in sorted(self.stacks.items()):
+            microseconds = round(seconds * 1e6)
+            if microseconds:
+                fh.write(f"{stack} {microseconds}\n")
+
+
+class Tracer(Instrumentation):
+    """ Print every non-trivial node as it is parsed, indented by its depth (what VERBOSE used to do) """
+
+    def __init__(self, out: Optional[TextIO] = None):
+        super().__init__()
+        self.out = out
+
+    def opened(self, obj: PdfObj, stack: str):
+        if not obj.Trivial:
+            detail = "..." if isinstance(obj, NestablePdfObj) else repr(obj)
+            print(f"{' ' * stack.count(';')}{obj.b_start:>08x} {type(obj).__name__ + '()':<25} {detail}",
+                  file=self.out)
+
+    def finished(self, obj: NestablePdfObj, stack: str):
+        if not obj.Trivial:
+            print(f"{' ' * stack.count(';')}{obj.b_start:>08x} {type(obj).__name__ + '()':<25} {obj!r}",
+                  file=self.out)
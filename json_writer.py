@@ -0,0 +1,128 @@
+import base64
+import typing
+from json.encoder import encode_basestring_ascii, encode_basestring
+from typing import Any, Optional, TextIO
+
+from pdf_parser import PdfObj, PdfStream
+
+BASE64_CHUNK = 3 * 64 * 1024  # A multiple of 3 so the chunks encode without padding in between
+
+
+class JsonWriter:
+    """
+    Write a PdfObj tree (or the result of to_json()) straight to a file handle.
+    The output is the same as json.dump(obj.to_json(), fh, indent=indent, separators=separators,
+    ensure_ascii=ensure_ascii), but the tree is walked with an explicit stack instead of being copied into Python
+    objects first, and bytes are base64 encoded in chunks.
+    Any iterator (such as iter_parse()) is written as a JSON list as it is consumed.
+    """
+
+    def __init__(self, fh: TextIO, indent: Optional[int | str] = None,
+                 separators: Optional[tuple[str, str]] = None, ensure_ascii: bool = True,
+                 chunk_size: int = BASE64_CHUNK):
+        self.fh = fh
+        if isinstance(indent, int):
+            indent = " " * indent
+        self.indent = indent
+        if separators is None:
+            separators = (",", ": ") if indent is not None else (", ", ": ")
+        self.item_separator, self.key_separator = separators
+        self.encode_str = encode_basestring_ascii if ensure_ascii else encode_basestring
+        self.chunk_size = chunk_size
+
+    def write(self, value: Any):
+        write = self.fh.write
+        # Each frame is [iterator of children, nesting level, is a dict, no child written yet]
+        stack: list[list] = []
+        self.open(value, 0, stack)
+        while stack:
+            frame = stack[-1]
+            iterator, level, is_dict, first = frame
+            item = next(iterator, StopIteration)
+            if item is StopIteration:
+                stack.pop()
+                if not first and self.indent is not None:
+                    write("\n" + self.indent * level)
+                write("}" if is_dict else "]")
+                continue
+            if not first:
+                write(self.item_separator)
+            frame[3] = False
+            if self.indent is not None:
+                write("\n" + self.indent * (level + 1))
+            if is_dict:
+                key, item = item
+                write(self.encode_key(key))
+                write(self.key_separator)
+            self.open(item, level + 1, stack)
+
+    def open(self, value: Any, level: int, stack: list[list]):
+        """ Write a scalar value, or write the opening bracket of a container and push it onto the stack """
+        while isinstance(value, PdfObj):
+            if isinstance(value, PdfStream):
+                self.write_bytes(value.iter_data(self.chunk_size))
+                return
+            value = value.data
+        if isinstance(value, dict):
+            self.fh.write("{")
+            stack.append([iter(self.convert_keys(value)), level, True, True])
+        elif isinstance(value, (list, tuple)) or isinstance(value, typing.Iterator):
+            self.fh.write("[")
+            stack.append([iter(value), level, False, True])
+        elif isinstance(value, bytes):
+            view = memoryview(value)
+            self.write_bytes(view[i:i + self.chunk_size] for i in range(0, len(view), self.chunk_size))
+        else:
+            self.fh.write(self.encode_scalar(value))
+
+    def write_bytes(self, chunks: typing.Iterable[bytes]):
+        write = self.fh.write
+        write('"')
+        for chunk in chunks:
+            write(base64.b64encode(chunk).decode('utf-8'))
+        write('"')
+
+    def encode_scalar(self, value: Any) -> str:
+        if isinstance(value, str):
+            return self.encode_str(value)
+        elif value is None:
+            return "null"
+        elif value is True:
+            return "true"
+        elif value is False:
+            return "false"
+        elif isinstance(value, int):
+            return int.__repr__(value)
+        elif isinstance(value, float):
+            if value != value:
+                return "NaN"
+            elif value in (float("inf"), float("-inf")):
+                return "Infinity" if value > 0 else "-Infinity"
+            return float.__repr__(value)
+        raise TypeError(f"Object of type {value.__class__.__name__} is not JSON serializable")
+
+    def encode_key(self, key: Any) -> str:
+        if isinstance(key, str):
+            return self.encode_str(key)
+        elif isinstance(key, (int, float)) or key is None:
+            return '"' + self.encode_scalar(key).strip('"') + '"'
+        raise TypeError(f"keys must be str, int, float, bool or None, not {key.__class__.__name__}")
+
+    @staticmethod
+    def convert_key(key: Any) -> Any:
+        """ Dict keys are converted the way to_json() converts them """
+        while isinstance(key, PdfObj):
+            key = key.data
+        if isinstance(key, bytes):
+            return base64.b64encode(key).decode('utf-8')
+        return key
+
+    def convert_keys(self, value: dict) -> list[tuple[Any, Any]]:
+        # Building a dict keeps to_json()'s handling of keys that convert to the same value: the first position
+        # with the last value
+        return list(dict((self.convert_key(k), v) for k, v in value.items()).items())
+
+
+def write_json(value: Any, fh: TextIO, indent: Optional[int | str] = None,
+               separators: Optional[tuple[str, str]] = None, ensure_ascii: bool = True):
+    JsonWriter(fh, indent, separators, ensure_ascii).write(value)
@@ -0,0 +1,201 @@
+import mmap
+import os
+import re
+from collections import OrderedDict
+from typing import Optional
+
+from pdf_parser import (PdfObj, PdfDict, PdfIndirectObj, PdfCrossReferenceTable,
+                        PdfCrossReferenceTableSpec, PdfCrossReferenceTableEntry, PdfTrailerDict, ParseError,
+                        CrossReferences, PageTree, parse_at, dict_get, iter_xref_stream, parse_reference,
+                        read_object_stream, parse_compressed)
+
+TAIL_SIZE = 1024  # startxref must be within the last 1024 bytes, see 7.5.5
+STARTXREF = re.compile(rb'startxref[ \r\n\t\x0c\x00]+(\d+)')
+END_OF_FILE = re.compile(rb'[ \r\n\t\x0c\x00]*%%EOF(\r\n|[\r\n])?')
+OBJECT_STREAM_CACHE_SIZE = 16
+
+
+class LazyPdfDoc(PageTree):
+    """
+    Random access to a PDF through its cross-reference table.
+    Only the trailer and xref sections are read when opening; each PdfIndirectObj is parsed when it is first
+    requested and kept in a bounded LRU cache.
+    Cross-reference streams (7.5.8) are decoded into the same index, and objects compressed in object streams
+    (7.5.7) are unpacked from their stream when requested. Each object stream is decompressed at most once
+    while it stays in its own LRU cache.
+    """
+
+    def __init__(self, filename, cache_size: int = 256):
+        self.filename = filename
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple[int, int], PdfIndirectObj] = OrderedDict()
+        # Object stream number -> (decoded data, offset of the first object, object number -> offset)
+        self._object_streams: OrderedDict[int, tuple[bytes, int, dict[int, int]]] = OrderedDict()
+        self.references = CrossReferences()
+        # Object number -> (byte offset, generation number) of the latest in-use entry
+        self.xref: dict[int, tuple[int, int]] = self.references.in_use
+        # Object number -> (object stream number, index within the stream) for compressed objects
+        self.compressed: dict[int, tuple[int, int]] = self.references.compressed
+        # Object numbers whose latest entry is free: older in-use entries for them are deleted objects
+        self.freed: set[int] = self.references.freed
+        self.trailer: Optional[PdfDict] = None
+        # Byte ranges of the xref sections with their trailers, and of xref streams
+        self.sections: list[tuple[int, int]] = []
+        # Byte range of the last startxref and the %%EOF after it
+        self.tail: tuple[int, int] = (0, 0)
+        # /Pages nodes of the page tree, see PageTree
+        self._page_nodes = {}
+        with open(filename, "rb") as fh:
+            # An empty file cannot be mapped
+            if os.fstat(fh.fileno()).st_size == 0:
+                raise ParseError(f"{filename} is empty")
+            self._buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._read_xref_chain(self.find_startxref())
+
+    def close(self):
+        self._cache.clear()
+        self._buffer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def find_startxref(self) -> int:
+        tail_start = max(0, len(self._buffer) - TAIL_SIZE)
+        pos = self._buffer.rfind(b"startxref", tail_start)
+        match = STARTXREF.match(self._buffer, pos) if pos >= 0 else None
+        if match is None:
+            raise ParseError(f"No startxref found in the last {TAIL_SIZE} bytes of {self.filename}")
+        eof = END_OF_FILE.match(self._buffer, match.end())
+        self.tail = (pos, match.end() if eof is None else eof.end())
+        return int(match.group(1))
+
+    def _read_xref_chain(self, offset: Optional[int]):
+        """ Read xref sections from the newest to the oldest following /Prev. Newer entries take precedence. """
+        seen = set()
+        while offset is not None and offset not in seen:
+            seen.add(offset)
+            if PdfCrossReferenceTable.Pattern.match(self._buffer, offset):
+                trailer, in_use, freed = self._read_xref_section(offset)
+                compressed = {}
+                # Hybrid-reference files also list objects in a cross-reference stream (7.5.8.4); the table's own
+                # entries come first
+                xref_stream = trailer.get_int("XRefStm")
+                if xref_stream is not None:
+                    _, stream_in_use, compressed, stream_freed = self._read_xref_stream(xref_stream)
+                    in_use = stream_in_use | in_use
+                    freed |= stream_freed
+            else:
+                trailer, in_use, compressed, freed = self._read_xref_stream(offset)
+            self.references.add_section(in_use, compressed, freed)
+            if self.trailer is None:
+                self.trailer = trailer
+            offset = trailer.get_int("Prev")
+
+    def _read_xref_section(self, offset: int) -> tuple[PdfDict, dict[int, tuple[int, int]], set[int]]:
+        """
+        Read a cross-reference table with the patterns of PdfCrossReferenceTable's contexts but without creating
+        an object per entry, so opening large files stays fast. Returns the trailer dictionary that follows it,
+        the in-use entries as (offset, generation) by object number and the free object numbers.
+        """
+        match = PdfCrossReferenceTable.Pattern.match(self._buffer, offset)
+        if match is None:
+            raise ParseError(f"startxref offset {offset:x} does not point at a cross-reference table in "
+                             f"{self.filename}")
+        in_use = {}
+        freed = set()
+        pos = match.end()
+        while spec := PdfCrossReferenceTableSpec.Pattern.match(self._buffer, pos):
+            pos = spec.end()
+            number = int(spec.group(1))
+            for number in range(number, number + int(spec.group(2))):
+                entry = PdfCrossReferenceTableEntry.Pattern.match(self._buffer, pos)
+                if entry is None:
+                    raise ParseError(f"Bad cross-reference entry for object {number} at {pos:x} in "
+                                     f"{self.filename}")
+                pos = entry.end()
+                if entry.group(3) == b"n":
+                    in_use[number] = (int(entry.group(1)), int(entry.group(2)))
+                else:
+                    freed.add(number)
+        trailer = parse_at(self._buffer, pos, filename=self.filename)
+        if not isinstance(trailer, PdfTrailerDict):
+            raise ParseError(f"No trailer after the cross-reference table at {offset:x} in {self.filename}")
+        self.sections.append((offset, trailer.b_start + trailer.b_size))
+        for obj in trailer.data:
+            if isinstance(obj, PdfDict):
+                return obj, in_use, freed
+        raise ParseError(f"Trailer at {trailer.b_start:x} has no dictionary in {self.filename}")
+
+    def _read_xref_stream(self, offset: int) \
+            -> tuple[PdfDict, dict[int, tuple[int, int]], dict[int, tuple[int, int]], set[int]]:
+        """
+        Read a cross-reference stream (7.5.8). Its dictionary also serves as the trailer. Returns it with the
+        in-use, compressed and free entries.
+        """
+        xref = parse_at(self._buffer, offset, filename=self.filename, offsets=True)
+        stream_dict = xref.data["object"] if isinstance(xref, PdfIndirectObj) else None
+        if not isinstance(stream_dict, PdfDict) or stream_dict.get_name("Type") != "XRef" \
+                or "data stream" not in xref.data:
+            raise ParseError(f"startxref offset {offset:x} does not point at a cross-reference table or stream "
+                             f"in {self.filename}")
+        self.sections.append((xref.b_start, xref.b_start + xref.b_size))
+        data = xref.data["data stream"].decode(self.resolve)
+        in_use = {}
+        compressed = {}
+        freed = set()
+        for number, entry_type, field, index in iter_xref_stream(stream_dict, data):
+            if entry_type == 1:
+                in_use[number] = (field, index)
+            elif entry_type == 2:
+                compressed[number] = (field, index)
+            elif entry_type == 0:
+                freed.add(number)
+        return stream_dict, in_use, compressed, freed
+
+    def _get_object_stream(self, number: int) -> tuple[bytes, int, dict[int, int]]:
+        """ Decode an object stream once and keep it with its table of object offsets """
+        if number in self._object_streams:
+            self._object_streams.move_to_end(number)
+            return self._object_streams[number]
+        obj_stm = self.get((number, 0))
+        if obj_stm is None or "data stream" not in obj_stm.data:
+            raise ParseError(f"Object stream R {number} 0 is missing from {self.filename}")
+        self._object_streams[number] = read_object_stream(obj_stm, self.resolve)
+        if len(self._object_streams) > OBJECT_STREAM_CACHE_SIZE:
+            self._object_streams.popitem(last=False)
+        return self._object_streams[number]
+
+    def _get_compressed(self, number: int) -> PdfIndirectObj:
+        """ Parse one object out of its object stream, wrapped in a PdfIndirectObj like uncompressed objects """
+        stream_number = self.compressed[number][0]
+        return parse_compressed(self._get_object_stream(stream_number), number, stream_number, self.filename)
+
+    def get(self, reference: str | tuple[int, int] | int) -> Optional[PdfIndirectObj]:
+        """ Return the indirect object for a reference, parsing it on first access """
+        number, generation = parse_reference(reference)
+        key = (number, generation)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if number in self.xref and self.xref[number][1] == generation:
+            obj = parse_at(self._buffer, self.xref[number][0], filename=self.filename, offsets=True)
+            if not isinstance(obj, PdfIndirectObj) or obj.data["reference"] != f"R {number} {generation}":
+                raise ParseError(f"xref entry for R {number} {generation} points at {self.xref[number][0]:x} "
+                                 f"which is not that object in {self.filename}")
+        elif number in self.compressed and generation == 0:
+            obj = self._get_compressed(number)
+        else:
+            return None
+        self._cache[key] = obj
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return obj
+
+    def catalog(self) -> Optional[PdfDict]:
+        return self.resolve(dict_get(self.trailer, "Root"))
+
+    def get_page_nodes(self) -> dict:
+        return self._page_nodes
@@ -0,0 +1,218 @@
+import hashlib
+import os
+import pickle
+import stat
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Optional
+
+import filters
+import json_writer
+import lazy_pdf
+import pdf_parser
+import revisions
+from pdf_parser import PdfDoc, parse
+from revisions import parse_update, prefix_digest
+from stream_store import StreamStore
+
+DEFAULT_DIR = Path(os.environ.get("PDF_PARSE_CACHE", Path.home() / ".cache" / "pdf-analysis" / "parses"))
+SUFFIX = ".pickle"
+POINTER_SUFFIX = ".latest"
+HASH_CHUNK = 1 << 20
+# Modules whose classes end up in a pickled tree or whose code builds, updates or reads it
+PARSER_MODULES = (pdf_parser, filters, revisions, lazy_pdf, json_writer)
+
+
+def parser_version() -> str:
+    """ A hash of the source of PARSER_MODULES, so trees parsed by an older parser are never loaded """
+    digest = hashlib.sha256()
+    for module in PARSER_MODULES:
+        with open(module.__file__, "rb") as fh:
+            digest.update(fh.read())
+    return digest.hexdigest()[:16]
+
+
+def trusted(path: Path) -> bool:
+    """
+    Loading a pickle can run arbitrary code, so only files owned by the current user and not writable by everyone
+    are loaded (on systems with file ownership).
+    """
+    if not hasattr(os, "getuid"):
+        return True
+    info = path.stat()
+    if info.st_uid != os.getuid() or info.st_mode & stat.S_IWOTH:
+        print(f"Not loading {path}: it is not owned by the current user or is writable by everyone")
+        return False
+    return True
+
+
+class ParseCache(StreamStore):
+    """
+    Parsed PdfDoc trees pickled to disk, keyed by the file's content (or its path, size and modification time in
+    fast mode), the parser version and the parse options. Shares StreamStore's layout, size cap and least recently
+    used eviction. Each file holds a small header (source file, size, digest, version, time) followed by the tree.
+    A file that has grown by incremental updates since it was cached is brought up to date from its previous tree
+    by parsing only the appended bytes (see revisions.parse_update).
+    Cached trees are pickles, so the cache directory must only be writable by users you trust; files that fail
+    trusted() are ignored.
+    """
+
+    def __init__(self, root=DEFAULT_DIR, max_bytes: Optional[int] = None, fast: bool = False):
+        super().__init__(root, max_bytes)
+        self.fast = fast
+        self.version = parser_version()
+
+    def file_key(self, filename, keep_raw: bool = True) -> str:
+        digest = hashlib.sha256(f"{self.version}\0{keep_raw}\0".encode())
+        if self.fast:
+            stat = os.stat(filename)
+            digest.update(f"{Path(filename).resolve()}\0{stat.st_size}\0{stat.st_mtime_ns}".encode())
+        else:
+            with open(filename, "rb") as fh:
+                while chunk := fh.read(HASH_CHUNK):
+                    digest.update(chunk)
+        return digest.hexdigest() + SUFFIX
+
+    def pointer_key(self, filename, keep_raw: bool = True) -> str:
+        """ The key of the pointer to the tree last saved for filename's path """
+        digest = hashlib.sha256(f"{self.version}\0{keep_raw}\0{Path(filename).resolve()}".encode())
+        return digest.hexdigest() + POINTER_SUFFIX
+
+    def load(self, filename, keep_raw: bool = True) -> Optional[PdfDoc]:
+        path = self.lookup(self.file_key(filename, keep_raw))
+        if path is None or not trusted(path):
+            return None
+        with open(path, "rb") as fh:
+            pickle.load(fh)  # Header
+            return pickle.load(fh)
+
+    def save(self, filename, pdf: PdfDoc, keep_raw: bool = True) -> Optional[Path]:
+        """ Store a tree parsed from filename. Trees nested too deeply to pickle are not cached. """
+        key = self.file_key(filename, keep_raw)
+        header = {"file": str(filename), "path": str(Path(filename).resolve()), "bytes": pdf.b_size,
+                  "sha256": prefix_digest(filename, pdf.b_size), "version": self.version, "keep_raw": keep_raw,
+                  "created": time.time()}
+        temp = self.temp_path(key)
+        try:
+            with open(temp, "wb") as fh:
+                pickle.dump(header, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                pickle.dump(pdf, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            temp.unlink(missing_ok=True)
+            print(f"{filename} is nested too deeply to cache")
+            return None
+        path = self.commit(temp, key)
+        pointer = self.pointer_key(filename, keep_raw)
+        temp = self.temp_path(pointer)
+        temp.write_text(key)
+        self.commit(temp, pointer)
+        return path
+
+    def parse(self, filename, keep_raw: bool = True, **parse_options) -> PdfDoc:
+        """
+        parse() through the cache. Trees are always parsed into memory because objects backed by an mmap cannot be
+        pickled, so use_mmap=True is refused. With an instrument the file is always parsed (and the cache updated),
+        since a tree loaded from the cache has no parse to profile.
+        """
+        if parse_options.get("use_mmap"):
+            raise ValueError("Trees parsed with use_mmap=True cannot be cached")
+        profiling = parse_options.get("instrument") is not None
+        pdf = None if profiling else self.load(filename, keep_raw)
+        if pdf is None:
+            pdf = None if profiling else self.load_previous(filename, keep_raw)
+            if pdf is None:
+                pdf = parse(filename, keep_raw=keep_raw, **parse_options)
+            else:
+                pdf = parse_update(filename, pdf, keep_raw=keep_raw, **parse_options)
+            self.save(filename, pdf, keep_raw)
+        return pdf
+
+    def load_previous(self, filename, keep_raw: bool = True) -> Optional[PdfDoc]:
+        """
+        The tree last cached for the same path if the file still starts with the bytes it was parsed from, i.e. the
+        file has only had bytes appended (incremental updates) since.
+        """
+        pointer = self.lookup(self.pointer_key(filename, keep_raw))
+        if pointer is None:
+            return None
+        try:
+            entry = self.lookup(pointer.read_text())
+        except OSError:
+            return None
+        if entry is None or not trusted(entry):
+            return None
+        with open(entry, "rb") as fh:
+            header = pickle.load(fh)
+            if header["bytes"] >= os.path.getsize(filename):
+                return None
+            if prefix_digest(filename, header["bytes"]) != header["sha256"]:
+                return None
+            return pickle.load(fh)
+
+    def entries(self) -> list[tuple[Path, dict]]:
+        """ The header of every cached tree, least recently used first """
+        entries = []
+        for key in self._index:
+            if not key.endswith(SUFFIX):
+                continue
+            path = self.path(key)
+            try:
+                if not trusted(path):
+                    continue
+                with open(path, "rb") as fh:
+                    entries.append((path, pickle.load(fh)))
+            except (OSError, pickle.UnpicklingError, EOFError):
+                continue
+        return entries
+
+    def remove_stale(self) -> int:
+        """ Remove trees written by other parser versions, which can never be loaded again """
+        removed = 0
+        for path, header in self.entries():
+            if header["version"] != self.version:
+                path.unlink(missing_ok=True)
+                self.size -= self._index.pop(path.name)
+                removed += 1
+        for key in [key for key in self._index if key.endswith(POINTER_SUFFIX)]:
+            try:
+                tree = self.path(key).read_text()
+            except OSError:
+                tree = None
+            if tree not in self._index:
+                self.path(key).unlink(missing_ok=True)
+                self.size -= self._index.pop(key)
+        return removed
+
+    def clear(self):
+        for key in list(self._index):
+            self.path(key).unlink(missing_ok=True)
+        self._index.clear()
+        self.size = 0
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Inspect or clear the cache of parsed PDFs")
+    parser.add_argument("--dir", type=Path, default=DEFAULT_DIR, help=f"Cache directory (default: {DEFAULT_DIR})")
+    parser.add_argument("command", choices=["info", "list", "clear", "evict"])
+    parser.add_argument("--max-size", type=int, default=None,
+                        help="With evict: size in MB to shrink the cache to, least recently used first")
+
+    args = parser.parse_args()
+    cache = ParseCache(args.dir, None if args.max_size is None else args.max_size * 1_000_000)
+    if args.command == "info":
+        trees = sum(key.endswith(SUFFIX) for key in cache._index)
+        print(f"{cache.root}: {trees} trees, {cache.size / 1e6:.1f} MB, parser version {cache.version}")
+    elif args.command == "list":
+        for path, header in cache.entries():
+            current = "" if header["version"] == cache.version else " (old parser)"
+            print(f"{path.stat().st_size / 1e6:>9.2f} MB  {time.ctime(path.stat().st_mtime)}  {header['file']}"
+                  f"{current}")
+    elif args.command == "clear":
+        cache.clear()
+        print(f"Cleared {cache.root}")
+    elif args.command == "evict":
+        print(f"Removed {cache.remove_stale()} trees from old parser versions")
+        cache.evict()
+        trees = sum(key.endswith(SUFFIX) for key in cache._index)
+        print(f"{cache.root}: {trees} trees, {cache.size / 1e6:.1f} MB")
@@ -0,0 +1,95 @@
+import json
+import os
+import socket
+import sys
+import tempfile
+from argparse import ArgumentParser
+from pathlib import Path
+from typing import Any, Optional
+
+from cli_args import add_pdf_to_json_arguments, megabytes
+
+# Same default as parse_daemon.DEFAULT_SOCKET, without importing the parser
+DEFAULT_SOCKET = Path(os.environ.get("PDF_PARSE_SOCKET", Path(tempfile.gettempdir()) / "pdf-analysis.sock"))
+
+
+class DaemonClient:
+    """ A connection to parse_daemon.py. Requests are sent one at a time and wait for their response. """
+
+    def __init__(self, socket_path: Path = DEFAULT_SOCKET):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.connect(str(socket_path))
+        self.reader = self.socket.makefile("r", encoding="utf-8")
+        self.next_id = 0
+
+    def close(self):
+        self.reader.close()
+        self.socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def request(self, op: str, args: Optional[dict] = None, timeout: Optional[float] = None) -> dict:
+        """ Send a request and return the daemon's response: {"id", "ok", "result" or "error", ...} """
+        self.next_id += 1
+        request = {"id": self.next_id, "op": op, "args": args or {}}
+        if timeout is not None:
+            request["timeout"] = timeout
+        self.socket.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("The daemon closed the connection")
+        return json.loads(line)
+
+
+def absolute(path: Optional[Path]) -> Optional[str]:
+    """ Paths are resolved here because the daemon runs in its own working directory """
+    return None if path is None else str(path.absolute())
+
+
+def to_json_args(args: Any) -> dict:
+    """ The parse_to_json() parameters for pdf-to-json.py arguments """
+    return {
+        "pdf_filename": absolute(args.pdf_filename),
+        "output_filename": absolute(args.output_filename),
+        "decompress": args.decompress,
+        "mmap": args.mmap,
+        "stream": args.stream,
+        "compact": args.compact,
+        "jobs": args.jobs,
+        "store": absolute(args.store),
+        "store_size": megabytes(args.store_size),
+        "profile": absolute(args.profile),
+        "flamegraph": absolute(args.flamegraph),
+        "cache": args.cache if args.cache is True else absolute(args.cache),
+        "cache_fast": args.cache_fast,
+        "cache_size": megabytes(args.cache_size),
+    }
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="pdf-to-json.py through a running parse_daemon.py")
+    # --cache without a directory uses the daemon's default cache directory
+    add_pdf_to_json_arguments(parser, True)
+    parser.add_argument("--socket", type=Path, default=DEFAULT_SOCKET,
+                        help=f"The daemon's socket (default: {DEFAULT_SOCKET}, or $PDF_PARSE_SOCKET)")
+    parser.add_argument("--timeout", type=float, default=None,
+                        help="Seconds the daemon may spend on this file (default: the daemon's)")
+
+    args = parser.parse_args()
+    try:
+        client = DaemonClient(args.socket)
+    except OSError as e:
+        print(f"Cannot connect to the daemon at {args.socket} ({e}). Start it with: python parse_daemon.py",
+              file=sys.stderr)
+        sys.exit(2)
+    with client:
+        response = client.request("to_json", to_json_args(args), args.timeout)
+    if not response["ok"]:
+        print(f"{response.get('type')}: {response['error']}", file=sys.stderr)
+        for note in response.get("notes", []):
+            print(note, file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,348 @@
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+import pdf_parser
+from chart_content import DIVISIONS, build_chart, chart_lazy
+from lazy_pdf import LazyPdfDoc
+from parse_cache import DEFAULT_DIR, ParseCache
+from pdf_parser import NestablePdfObj, PdfIndirectObj, PdfStream, parse, iter_parse, decompress
+from stream_store import StreamStore
+
+pdf_to_json = importlib.import_module("pdf-to-json")
+
+DEFAULT_SOCKET = Path(os.environ.get("PDF_PARSE_SOCKET", Path(tempfile.gettempdir()) / "pdf-analysis.sock"))
+DEFAULT_TIMEOUT = 300.0  # Seconds a request may run before its worker is killed
+QUEUE_TIMEOUT = 30.0  # Seconds a request may wait for a free slot before it is refused as busy
+PRELOAD = ["pdf_parser", "filters", "json_writer", "chart_content", "lazy_pdf", "parse_cache", "stream_store"]
+
+
+def warm_up():
+    """ Build the combined dispatch pattern of every context class now rather than on the first request """
+    for obj in vars(pdf_parser).values():
+        if isinstance(obj, type) and issubclass(obj, NestablePdfObj) and obj.Contexts:
+            obj.get_dispatch()
+
+
+# Each worker keeps its caches open between requests, keyed by their options
+_caches: dict[tuple, ParseCache] = {}
+_stores: dict[tuple, StreamStore] = {}
+
+
+def get_cache(args: dict) -> Optional[ParseCache]:
+    if not args.get("cache"):
+        return None
+    # The client sends True for --cache without a directory
+    key = (DEFAULT_DIR if args["cache"] is True else args["cache"], args.get("cache_size"), args.get("cache_fast"))
+    if key not in _caches:
+        _caches[key] = ParseCache(key[0], key[1], bool(key[2]))
+    return _caches[key]
+
+
+def get_store(args: dict) -> Optional[StreamStore]:
+    if not args.get("store"):
+        return None
+    key = (args["store"], args.get("store_size"))
+    if key not in _stores:
+        _stores[key] = StreamStore(*key)
+    return _stores[key]
+
+
+def optional_path(value: Optional[str]) -> Optional[Path]:
+    return None if value is None else Path(value)
+
+
+def op_to_json(args: dict) -> dict:
+    """ pdf-to-json.py: args are the parameters of its parse_to_json(), with sizes in bytes """
+    pdf_filename = Path(args["pdf_filename"])
+    output_filename = optional_path(args.get("output_filename")) or pdf_filename.with_suffix(".json")
+    pdf_to_json.parse_to_json(pdf_filename, output_filename, args.get("decompress", False), args.get("mmap", False),
+                              args.get("stream", False), args.get("compact", False), args.get("jobs", 1),
+                              None, None, optional_path(args.get("profile")), optional_path(args.get("flamegraph")),
+                              get_cache(args), get_store(args))
+    return {"output_filename": str(output_filename)}
+
+
+def op_parse(args: dict) -> dict:
+    """ Parse a file (through the cache if one is given) and describe the tree """
+    cache = get_cache(args)
+    if cache is not None:
+        pdf = cache.parse(args["pdf_filename"], progress=False)
+    else:
+        pdf = parse(args["pdf_filename"], use_mmap=args.get("mmap", False), progress=False)
+    return {"bytes": pdf.b_size, "objects": sum(isinstance(obj, PdfIndirectObj) for obj in pdf.data),
+            "top_level": len(pdf.data)}
+
+
+def op_decompress(args: dict) -> dict:
+    """ Write the streams of a file to output_dir """
+    output_dir = Path(args["output_dir"])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    pdf = decompress(parse(args["pdf_filename"], progress=False), output_dir, args.get("jobs", 1),
+                     store=get_store(args))
+    written = [obj.data["data stream"] for obj in pdf.data
+               if isinstance(obj, PdfIndirectObj) and isinstance(obj.data.get("data stream"), str)]
+    unwritten = sum(isinstance(obj, PdfIndirectObj) and isinstance(obj.data.get("data stream"), PdfStream)
+                    for obj in pdf.data)
+    return {"written": written, "skipped": unwritten}
+
+
+def op_chart(args: dict) -> dict:
+    """ chart_content.py: mode is parse, stream or lazy """
+    filename = args["pdf_filename"]
+    mode = args.get("mode", "parse")
+    divisions = args.get("divisions", DIVISIONS)
+    if mode == "lazy":
+        with LazyPdfDoc(filename) as doc:
+            return chart_lazy(doc, divisions).to_json()
+    if mode == "stream":
+        return build_chart(iter_parse(filename, progress=False), os.path.getsize(filename), divisions).to_json()
+    return build_chart(parse(filename, progress=False), divisions=divisions).to_json()
+
+
+OPERATIONS: dict[str, Callable[[dict], Any]] = {
+    "to_json": op_to_json,
+    "parse": op_parse,
+    "decompress": op_decompress,
+    "chart": op_chart,
+}
+
+
+def run_request(request: dict) -> dict:
+    """ Run one request in a worker. Exceptions become error responses with the exception's notes. """
+    start = time.perf_counter()
+    try:
+        response = {"ok": True, "result": OPERATIONS[request["op"]](request.get("args") or {})}
+    except Exception as e:
+        response = {"ok": False, "error": str(e), "type": type(e).__name__,
+                    "notes": list(getattr(e, "__notes__", []))}
+    response["seconds"] = round(time.perf_counter() - start, 4)
+    return response
+
+
+def worker_main(conn):
+    """ Worker process: run requests from the daemon one at a time until the connection closes """
+    warm_up()
+    # stdout may be the daemon's protocol channel, and the parser prints progress
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        while True:
+            try:
+                request = conn.recv()
+            except (EOFError, OSError):
+                return
+            conn.send(run_request(request))
+
+
+class Worker:
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def stop(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    Warm worker processes that each run one request at a time.
+    At most workers + max_pending requests are accepted at once; a client whose request finds no free slot waits
+    up to queue_timeout seconds (it is not read from meanwhile, which holds it back) and is then refused as busy.
+    A worker that runs longer than the request's timeout is killed and replaced, as is one that crashes.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 timeout: float = DEFAULT_TIMEOUT, queue_timeout: float = QUEUE_TIMEOUT):
+        methods = multiprocessing.get_all_start_methods()
+        self.context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if "forkserver" in methods:
+            # Workers are forked from a server that has already imported the parser
+            self.context.set_forkserver_preload(PRELOAD)
+        self.workers = workers or os.cpu_count()
+        self.max_pending = self.workers if max_pending is None else max_pending
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self.slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+        self.idle: queue.Queue[Worker] = queue.Queue()
+        for _ in range(self.workers):
+            self.idle.put(Worker(self.context))
+        self.stats = {"served": 0, "failed": 0, "timeouts": 0, "crashes": 0, "busy": 0, "active": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, change: int = 1):
+        with self._lock:
+            self.stats[name] += change
+
+    def acquire(self) -> bool:
+        """ Wait for a free slot. Every True must be followed by exactly one run(). """
+        if self.slots.acquire(timeout=self.queue_timeout):
+            return True
+        self.count("busy")
+        return False
+
+    def run(self, request: dict) -> dict:
+        """ Run a request on the next idle worker and release its slot """
+        timeout = request.get("timeout") or self.timeout
+        try:
+            worker = self.idle.get()
+            self.count("active")
+            try:
+                worker.conn.send(request)
+                if worker.conn.poll(timeout):
+                    response = worker.conn.recv()
+                else:
+                    worker.stop()
+                    worker = Worker(self.context)
+                    self.count("timeouts")
+                    response = {"ok": False, "error": f"Killed after {timeout} seconds", "type": "timeout"}
+            except (EOFError, OSError):
+                exitcode = worker.process.exitcode
+                worker.stop()
+                worker = Worker(self.context)
+                self.count("crashes")
+                response = {"ok": False, "error": f"Worker exited with code {exitcode}", "type": "crash"}
+            finally:
+                self.count("active", -1)
+                self.idle.put(worker)
+        finally:
+            self.slots.release()
+        self.count("served" if response["ok"] else "failed")
+        return response
+
+    def close(self):
+        for _ in range(self.workers):
+            self.idle.get().stop()
+
+
+def handle_lines(lines: Iterable[str], write: Callable[[dict], None], pool: WorkerPool,
+                 executor: ThreadPoolExecutor):
+    """
+    Serve one client's JSON lines requests. A request is only read once the previous one has a slot, so a client
+    sending faster than the workers finish is held back. Responses are written as they finish, with the request's
+    id, so they can arrive in a different order from the requests.
+    """
+    def respond(request: dict, response: dict):
+        write({"id": request.get("id"), **response})
+
+    futures = []
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError("a request must be a JSON object")
+        except ValueError as e:
+            write({"id": None, "ok": False, "error": f"Bad request: {e}", "type": "bad_request"})
+            continue
+        op = request.get("op")
+        if op == "ping":
+            respond(request, {"ok": True, "result": "pong"})
+        elif op == "stats":
+            respond(request, {"ok": True, "result": {**pool.stats, "workers": pool.workers,
+                                                     "max_pending": pool.max_pending}})
+        elif op not in OPERATIONS:
+            respond(request, {"ok": False, "error": f"Unknown op {op!r}, expected one of {list(OPERATIONS)}",
+                              "type": "bad_request"})
+        elif not pool.acquire():
+            respond(request, {"ok": False, "error": "All workers are busy", "type": "busy"})
+        else:
+            futures.append(executor.submit(lambda r: respond(r, pool.run(r)), request))
+            futures = [future for future in futures if not future.done()]
+    wait(futures)
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        lock = threading.Lock()
+
+        def write(response: dict):
+            with lock:
+                try:
+                    self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                except OSError:
+                    pass  # The client has gone
+
+        handle_lines((line.decode("utf-8") for line in self.rfile), write, self.server.pool, self.server.executor)
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, pool: WorkerPool):
+        self.pool = pool
+        self.executor = ThreadPoolExecutor(pool.workers + pool.max_pending)
+        super().__init__(str(socket_path), RequestHandler)
+
+
+def serve_socket(socket_path: Path, pool: WorkerPool):
+    if socket_path.exists():
+        # Left behind by a daemon that did not shut down cleanly
+        socket_path.unlink()
+    # Stop on SIGTERM as on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    with DaemonServer(socket_path, pool) as server:
+        print(f"Listening on {socket_path} with {pool.workers} workers", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.executor.shutdown(cancel_futures=True)
+            socket_path.unlink(missing_ok=True)
+
+
+def serve_stdio(pool: WorkerPool):
+    """ The same protocol over stdin and stdout, for a parent process that starts the daemon itself """
+    lock = threading.Lock()
+
+    def write(response: dict):
+        with lock:
+            sys.stdout.write(json.dumps(response) + "\n")
+            sys.stdout.flush()
+
+    with ThreadPoolExecutor(pool.workers + pool.max_pending) as executor:
+        handle_lines(sys.stdin, write, pool, executor)
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Serve parse requests from warm worker processes as JSON lines")
+    parser.add_argument("--socket", type=Path, default=DEFAULT_SOCKET,
+                        help=f"Unix socket to listen on (default: {DEFAULT_SOCKET}, or $PDF_PARSE_SOCKET)")
+    parser.add_argument("--stdio", action="store_true", help="Read requests from stdin and answer on stdout")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--max-pending", type=int, default=None,
+                        help="Requests accepted beyond those running before clients are held back "
+                             "(default: one per worker)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Seconds a request may run before its worker is killed, unless the request sets one")
+    parser.add_argument("--queue-timeout", type=float, default=QUEUE_TIMEOUT,
+                        help="Seconds a request may wait for a free slot before it is refused as busy")
+
+    args = parser.parse_args()
+    worker_pool = WorkerPool(args.workers, args.max_pending, args.timeout, args.queue_timeout)
+    try:
+        if args.stdio:
+            serve_stdio(worker_pool)
+        else:
+            serve_socket(args.socket, worker_pool)
+    finally:
+        worker_pool.close()
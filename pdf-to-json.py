@@ -1,26 +1,57 @@
-import json
 from pathlib import Path
-from pdf_parser import parse, decompress
+from pdf_parser import parse, iter_parse, decompress, iter_decompress
+from json_writer import write_json
+from stream_store import StreamStore
+from instrumentation import Instrumentation
+from parse_cache import ParseCache, DEFAULT_DIR
 from argparse import ArgumentParser
+from cli_args import add_pdf_to_json_arguments, megabytes
 
-def parse_to_json(pdf_filename: Path, output_filename: Path | None = None, do_decompress: bool = False):
+
+def parse_to_json(pdf_filename: Path, output_filename: Path | None = None, do_decompress: bool = False,
+                  use_mmap: bool = False, stream: bool = False, compact: bool = False, jobs: int = 1,
+                  store_dir: Path | None = None, store_size: int | None = None, profile: Path | None = None,
+                  flamegraph: Path | None = None, cache: ParseCache | None = None, store: StreamStore | None = None):
+    """ store is an open StreamStore to use instead of opening one on store_dir (which scans the directory) """
     if output_filename is None:
         output_filename = pdf_filename.with_suffix(".json")
-    pdf = parse(pdf_filename)
+    streams_dir = output_filename.parent / f"{output_filename.stem}_streams"
     if do_decompress:
-        streams_dir = output_filename.parent / f"{output_filename.stem}_streams"
         streams_dir.mkdir(parents=True, exist_ok=True)
-        pdf = decompress(pdf, streams_dir)
-    json_pdf = pdf.to_json()
+        if store is None and store_dir is not None:
+            store = StreamStore(store_dir, store_size)
+    instrument = Instrumentation() if profile or flamegraph else None
+    if stream:
+        pdf = iter_parse(pdf_filename, instrument=instrument)
+        if do_decompress:
+            pdf = iter_decompress(pdf, streams_dir, jobs, store=store)
+    else:
+        if cache is not None:
+            pdf = cache.parse(pdf_filename, instrument=instrument)
+        else:
+            pdf = parse(pdf_filename, use_mmap=use_mmap, instrument=instrument)
+        if do_decompress:
+            pdf = decompress(pdf, streams_dir, jobs, store=store)
     with open(output_filename, "w") as fh:
-        json.dump(json_pdf, fh, indent=4)    
+        if compact:
+            write_json(pdf, fh, separators=(",", ":"))
+        else:
+            write_json(pdf, fh, indent=4)
+    if profile:
+        with open(profile, "w") as fh:
+            instrument.write_json(fh)
+    if flamegraph:
+        with open(flamegraph, "w") as fh:
+            instrument.write_collapsed(fh)
 
 
 if __name__ == "__main__":
     parser = ArgumentParser()
-    parser.add_argument("pdf_filename", type=Path)
-    parser.add_argument("output_filename", type=Path, nargs="?", default=None)
-    parser.add_argument("--decompress", action="store_true", help="Decompress streams to files before writing JSON")
-    
+    add_pdf_to_json_arguments(parser, DEFAULT_DIR)
+
     args = parser.parse_args()
-    parse_to_json(args.pdf_filename, args.output_filename, args.decompress)
+    cache = None
+    if args.cache is not None:
+        cache = ParseCache(args.cache, megabytes(args.cache_size), args.cache_fast)
+    parse_to_json(args.pdf_filename, args.output_filename, args.decompress, args.mmap, args.stream, args.compact,
+                  args.jobs, args.store, megabytes(args.store_size), args.profile, args.flamegraph, cache)
@@ -1,7 +1,11 @@
 import base64
+import mmap
+from bisect import bisect_left, bisect_right
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
 import os.path
 import re
-import zlib
 from pathlib import Path
 
 import sys
@@ -9,14 +13,16 @@ import typing
 from typing import Optional, Type, Any
 from io import BufferedReader
 
+from filters import DecodeError, FILTERS, decode, decode_chunks
 
-VERBOSE = False
 
 test_file = "test_pdfs/batch_1/dummy.pdf"
 
 WHITESPACE = b"[ \r\n\t\x0c\x00]"
 LINEBREAK = b'(\r\n|[\r\n])'
 py_native_types = int | float | bool | str | bytes | list | set | dict | tuple | None
+UNCONVERTED = object()  # Marks offset-backed data that has not been decoded from the source buffer yet
+PENDING = object()  # Marks a PdfDict key that has not received its value yet
 
 
 def list_bytes(b: bytes) -> list[bytes]:
@@ -34,42 +40,275 @@ def decode_int(numeric_bytes):
     return int(numeric_bytes.decode('utf-8'))
 
 
+def dict_get(pdf_dict: 'PdfObj', name: str) -> Optional['PdfObj']:
+    """ Value for the name in a PdfDict, or None if it is missing (or pdf_dict is not a PdfDict) """
+    if not isinstance(pdf_dict, PdfDict):
+        return None
+    return pdf_dict.get(name)
+
+
+class TreeVisitor:
+    """
+    Depth-first walk over a PdfObj tree and the dicts, lists and tuples in each object's data, with an explicit
+    stack instead of recursion so trees of any depth can be walked.
+    enter() is called on each value before its children (pre-order) and leave() after them (post-order) with the
+    results leave() returned for the children, so subclasses can either emit output as they go (TypesTreeVisitor)
+    or fold the tree from the bottom up (JsonVisitor). The depth of each value (0 for the root) is kept with it on
+    the stack and passed to both hooks.
+    """
+
+    def walk(self, root: Any) -> Any:
+        """ Walk the tree from root and return what leave() returned for root """
+        enter, leave, get_children = self.enter, self.leave, self.children
+        children = get_children(root) if enter(root, 0) else ()
+        # Each frame is (value, depth, iterator of its children, results of the children left so far)
+        stack = [(root, 0, iter(children), [])]
+        while True:
+            value, depth, pending, results = stack[-1]
+            for child in pending:
+                children = get_children(child) if enter(child, depth + 1) else ()
+                if children:
+                    stack.append((child, depth + 1, iter(children), []))
+                    break
+                results.append(leave(child, depth + 1, []))
+            else:
+                stack.pop()
+                result = leave(value, depth, results)
+                if not stack:
+                    return result
+                stack[-1][3].append(result)
+
+    def children(self, value: Any) -> typing.Sequence:
+        """ A PdfObj's child is its data, a dict's are its keys and values in turn, a list's are its items """
+        if isinstance(value, PdfObj):
+            return (value.data,)
+        elif isinstance(value, dict):
+            return [item for pair in value.items() for item in pair]
+        elif isinstance(value, (list, tuple)):
+            return value
+        return ()
+
+    def enter(self, value: Any, depth: int) -> bool:
+        """ Called before the children of value. Return False to skip them. """
+        return True
+
+    def leave(self, value: Any, depth: int, results: list) -> Any:
+        """ Called after the children of value with what leave() returned for each of them """
+        return None
+
+
+class JsonVisitor(TreeVisitor):
+    """ Builds the result of PdfObj.to_json(): PdfObjs are replaced by their data and bytes are base64 encoded """
+
+    def leave(self, value: Any, depth: int, results: list) -> Any:
+        if isinstance(value, PdfObj):
+            return results[0]
+        elif isinstance(value, dict):
+            keys = results[0::2]
+            for key in keys:
+                if not isinstance(key, typing.Hashable):
+                    print(f"Cannot hash the dict key: {key}")
+            return dict(zip(keys, results[1::2]))
+        elif isinstance(value, list):
+            return results
+        elif isinstance(value, tuple):
+            return tuple(results)
+        elif isinstance(value, bytes):
+            return base64.b64encode(value).decode('utf-8')
+        return value
+
+
+class TypesTreeVisitor(TreeVisitor):
+    """
+    Builds the result of PdfObj.types_tree() as a list of strings joined once at the end.
+    Values inside a container are indented one step from the container; the data of a PdfObj is indented two steps
+    from the PdfObj the object itself was found in.
+    """
+
+    def __init__(self, ttabs: int = 0):
+        self.parts: list[str] = []
+        # Each frame is [indent of the value, indent base of its PdfObj, iterator of dict keys, children started]
+        self.frames: list[list] = [[0, ttabs - 1, None, 0]]
+
+    def children(self, value: Any) -> typing.Sequence:
+        if isinstance(value, PdfObj):
+            return (value.data,)
+        elif isinstance(value, dict):
+            return list(value.values())
+        elif isinstance(value, (list, tuple)):
+            return value
+        return ()
+
+    def enter(self, value: Any, depth: int) -> bool:
+        parts = self.parts
+        parent = self.frames[-1]
+        if depth == 0:
+            tabs, base = parent[0], parent[1]
+        elif isinstance(parent[2], bool):
+            # parent is a PdfObj and value is its data
+            tabs, base = parent[1] + 2, parent[1] + 1
+        else:
+            tabs, base = parent[0] + 1, parent[1]
+            if parent[3]:
+                parts.append("\n")
+            parent[3] += 1
+            if parent[2] is not None:
+                parts.append(("  " * tabs) + f"{next(parent[2])}: ")
+        if isinstance(value, PdfObj):
+            if depth > 0:
+                parts.append(("  " * tabs) + type(value).__name__)
+            self.frames.append([tabs, base, True, 0])
+        elif isinstance(value, dict):
+            parts.append("\n")
+            self.frames.append([tabs, base, iter(value.keys()), 0])
+        elif isinstance(value, (list, tuple)):
+            parts.append("\n")
+            self.frames.append([tabs, base, None, 0])
+        elif isinstance(value, bytes):
+            parts.append(("  " * tabs) + "bytes")
+        else:
+            parts.append(f" {value}")
+        return True
+
+    def leave(self, value: Any, depth: int, results: list) -> Any:
+        # Only containers pushed a frame
+        if isinstance(value, (PdfObj, dict, list, tuple)):
+            self.frames.pop()
+        return None
+
+
+class IntervalIndex(TreeVisitor):
+    """
+    The byte range of every PdfObj below a root in sorted arrays, so the objects at an offset are found by
+    bisection instead of a walk over the tree. Nodes are recorded in pre-order with the index of their parent;
+    nested ranges in file order are then already sorted by start, and the innermost node covering an offset is
+    the last node starting at or before it or one of that node's ancestors.
+    """
+
+    def __init__(self, root: 'PdfObj'):
+        self.b_size = root.b_size
+        self.starts: list[int] = []
+        self.ends: list[int] = []
+        self.parents: list[int] = []  # Index of each node's parent node, -1 for children of the root
+        self.depths: list[int] = []  # 1 for children of the root
+        self.nodes: list[PdfObj] = []
+        self._open: list[int] = []
+        self._root = root
+        self.walk(root)
+        del self._root
+        if any(self.starts[i] < self.starts[i - 1] for i in range(1, len(self.starts))):
+            self._sort()
+
+    def enter(self, value: Any, depth: int) -> bool:
+        if isinstance(value, PdfObj) and value is not self._root:
+            self._open.append(len(self.nodes))
+            self.parents.append(self._open[-2] if len(self._open) > 1 else -1)
+            self.depths.append(len(self._open))
+            self.starts.append(value.b_start)
+            self.ends.append(value.b_start + value.b_size)
+            self.nodes.append(value)
+        return True
+
+    def leave(self, value: Any, depth: int, results: list) -> Any:
+        if isinstance(value, PdfObj) and value is not self._root:
+            self._open.pop()
+        return None
+
+    def _sort(self):
+        """ Objects built out of order (e.g. from object streams) are sorted by start, outer ranges first """
+        order = sorted(range(len(self.nodes)), key=lambda i: (self.starts[i], -self.ends[i], i))
+        rank = {old: new for new, old in enumerate(order)}
+        rank[-1] = -1
+        self.starts = [self.starts[i] for i in order]
+        self.ends = [self.ends[i] for i in order]
+        self.parents = [rank[self.parents[i]] for i in order]
+        self.depths = [self.depths[i] for i in order]
+        self.nodes = [self.nodes[i] for i in order]
+
+    def innermost(self, offset: int) -> int:
+        """ Index of the innermost node covering offset, or -1 """
+        i = bisect_right(self.starts, offset) - 1
+        while i >= 0 and self.ends[i] <= offset:
+            i = self.parents[i]
+        return i
+
+    def path(self, i: int) -> list[int]:
+        """ Indices of node i and its ancestors, outermost first """
+        path = []
+        while i >= 0:
+            path.append(i)
+            i = self.parents[i]
+        return path[::-1]
+
+    def object_at(self, offset: int) -> list['PdfObj']:
+        return [self.nodes[i] for i in self.path(self.innermost(offset))]
+
+    def range(self, start: int, end: int, max_depth: Optional[int] = None) -> list['PdfObj']:
+        found = [i for i in self.path(self.innermost(start)) if self.starts[i] < start]
+        found.extend(range(bisect_left(self.starts, start), bisect_left(self.starts, end)))
+        return [self.nodes[i] for i in found if max_depth is None or self.depths[i] <= max_depth]
+
+
 class PdfObj:
+    __slots__ = ("_raw", "_source", "b_start", "parent", "_data", "b_size")
     Pattern: Optional[re.Pattern] = None
     Trivial = False
 
     def __init__(self, raw_data: bytes, b_start: int = 0, parent: Optional['PdfObj'] = None):
-        self.raw = raw_data
+        self._raw = raw_data
+        self._source = None
         self.b_start = b_start
         self.parent = parent
-        self.data: Any = None
+        self._data: Any = None
         self.b_size = len(raw_data)
         self.convert()
-        self.report()
+
+    @classmethod
+    def from_source(cls, source, b_start: int, b_size: int, parent: Optional['PdfObj'] = None) -> 'PdfObj':
+        """
+        Create an object that only records its offsets into source (e.g. an mmap of the file).
+        The raw bytes are sliced, and data converted, when they are first accessed.
+        """
+        obj = cls.__new__(cls)
+        obj._raw = None
+        obj._source = source
+        obj.b_start = b_start
+        obj.parent = parent
+        obj._data = UNCONVERTED
+        obj.b_size = b_size
+        return obj
+
+    @property
+    def raw(self) -> Optional[bytes]:
+        """ The matched bytes, or None if they were dropped after convert() (see parse's keep_raw) """
+        if self._raw is None and self._source is not None:
+            return self._source[self.b_start:self.b_start + self.b_size]
+        return self._raw
+
+    @raw.setter
+    def raw(self, value: bytes):
+        self._raw = value
+
+    @property
+    def data(self) -> Any:
+        if self._data is UNCONVERTED:
+            self._data = None
+            self.convert()
+        return self._data
+
+    @data.setter
+    def data(self, value: Any):
+        self._data = value
+
+    def ancestors(self) -> typing.Iterator['PdfObj']:
+        """ The parent, its parent and so on up to the root """
+        parent = self.parent
+        while parent is not None:
+            yield parent
+            parent = parent.parent
 
     def count_parents(self) -> int:
-        if self.parent is None:
-            return 0
-        else:
-            return self.parent.count_parents() + 1
-
-    def report(self, finished=False):
-        if VERBOSE:
-            if not self.Trivial:  # isinstance(self, (PdfWhitespaces, PdfLiteralStringOther)):
-                if isinstance(self, NestablePdfObj) and not finished:
-                    print(
-                        " " * self.count_parents()
-                        + f"{self.b_start:>08x} "
-                        + f"{self.__class__.__name__ + '()':<25} "
-                        + "..."
-                    )
-                else:
-                    print(
-                        " " * self.count_parents()
-                        + f"{self.b_start:>08x} "
-                        + f"{self.__class__.__name__ + '()':<25} "
-                        + f"{self.__repr__()}"
-                    )
+        return sum(1 for _ in self.ancestors())
 
     @classmethod
     def match(cls, next_bytes: bytes) -> tuple[bool, int]:
@@ -90,61 +329,57 @@ class PdfObj:
         pass
 
     def get_structure_location(self, get_full=True):
-        if get_full and self.parent is not None:
-            return self.parent.get_structure_location() + "." + self.__class__.__name__
-        else:
-            return self.__class__.__name__
+        names = [self.__class__.__name__]
+        if get_full:
+            names.extend(ancestor.__class__.__name__ for ancestor in self.ancestors())
+        return ".".join(reversed(names))
 
     def to_json(self) -> py_native_types:
         """
         Convert data to a JSON encodable python object
         """
-        def convert_to_python_type(in_data):
-            if isinstance(in_data, PdfObj):
-                return convert_to_python_type(in_data.to_json())
-            elif isinstance(in_data, dict):
-                for k, v in in_data.items():
-                    if not isinstance(convert_to_python_type(k), typing.Hashable):
-                        print(f"Cannot hash the dict key: {convert_to_python_type(k)}")
-                return dict((convert_to_python_type(k), convert_to_python_type(v)) for k, v in in_data.items())
-            elif isinstance(in_data, list):
-                return list(convert_to_python_type(k) for k in in_data)
-            elif isinstance(in_data, tuple):
-                return tuple(convert_to_python_type(k) for k in in_data)
-            elif isinstance(in_data, bytes):
-                return base64.b64encode(in_data).decode('utf-8')
-            else:
-                return in_data
-
-        return convert_to_python_type(self.data)
+        return JsonVisitor().walk(self)
 
     def types_tree(self, ttabs=0) -> py_native_types:
         """
         Convert data to a JSON encodable python object
         """
-        def get_type_str(in_data, tabs=0):
-            if isinstance(in_data, PdfObj):
-                return ("  " * tabs) + f"{type(in_data).__name__}" + in_data.types_tree(ttabs+1)
-            elif isinstance(in_data, dict):
-                return "\n" + "\n".join(("  " * (tabs+1)) + f"{k}: {get_type_str(v, tabs+1)}" for k, v in in_data.items())
-            elif isinstance(in_data, list) or isinstance(in_data, tuple):
-                return "\n" + "\n".join(get_type_str(k, tabs+1) for k in in_data)
-            elif isinstance(in_data, bytes):
-                return ("  " * tabs) + "bytes"
-            
-            else:
-                return f" {in_data}"
-
-        return get_type_str(self.data, ttabs+1)
+        visitor = TypesTreeVisitor(ttabs)
+        visitor.walk(self)
+        return "".join(visitor.parts)
 
 
 class NestablePdfObj(PdfObj):
+    __slots__ = ()
     Contexts: list[Type[PdfObj]] = []
     EndingPattern: Optional[re.Pattern] = None
 
     def get_contexts(self):
         return [cls(c) for c in self.Contexts]
 
+    @classmethod
+    def get_dispatch(cls) -> tuple[re.Pattern, dict[str, Type[PdfObj]]]:
+        """ Combine the Patterns of all Contexts into one ordered alternation of named groups.
+        Alternatives are tried in the order of Contexts, so the first class that matches wins exactly as in the
+        original per-class loop. Built once per class and cached.
+        """
+        dispatch = cls.__dict__.get("_dispatch")
+        if dispatch is None:
+            classes = {}
+            alternatives = []
+            for context in cls.Contexts:
+                context = globals()[context] if isinstance(context, str) else context
+                flags = "".join(f for flag, f in ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"))
+                                if context.Pattern.flags & flag)
+                pattern = context.Pattern.pattern
+                if flags:
+                    pattern = f"(?{flags}:".encode() + pattern + b")"
+                classes[context.__name__] = context
+                alternatives.append(b"(?P<" + context.__name__.encode() + b">" + pattern + b")")
+            dispatch = re.compile(b"|".join(alternatives)), classes
+            cls._dispatch = dispatch
+        return dispatch
+
     # def __init_subclass__(cls, **kwargs):
     #     print(f"Creating subclass for: {cls.__name__}")
     #     for i, c in enumerate(cls.get_contexts()):
@@ -154,6 +389,13 @@ class NestablePdfObj(PdfObj):
     #             else:
     #                 cls.get_contexts()[i] = getattr(sys.modules[__name__], c)
 
+    @classmethod
+    def from_source(cls, source, b_start: int, b_size: int, parent: Optional['PdfObj'] = None) -> 'PdfObj':
+        """ Opening tokens are short so they are copied, but the source is kept for the contents (see PdfStream) """
+        obj = cls(source[b_start:b_start + b_size], b_start, parent)
+        obj._source = source
+        return obj
+
     def match_end(self, next_bytes: bytes) -> tuple[bool, int]:
         assert self.EndingPattern is not None, f"{self.__class__.__name__} is missing an EndingPattern"
         match = self.EndingPattern.match(next_bytes)
@@ -180,21 +422,30 @@ class NestablePdfObj(PdfObj):
             return self
 
     def finish(self, next_bytes: bytes, pos: int):
-        self.report(finished=True)
         self.b_size = pos + len(next_bytes) - self.b_start
         return self.parent
 
+    def fast_finish(self, buffer: bytes, pos: int) -> int:
+        """
+        Called by tokenize() when the object is opened at pos.
+        Return the end position if the whole content could be consumed without tokenizing it, or -1 to tokenize.
+        """
+        return -1
+
 
 class PdfName(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb'/[^/ \r\n\t\x0c\x00\[\]<>()]+')
 
     def convert(self):
         # print(self.raw)
-        self.data = self.raw[1:].decode('utf-8')  # TODO: Replace slash characters
+        # Names repeat throughout a document so share one string per distinct name
+        self.data = sys.intern(self.raw[1:].decode('utf-8'))  # TODO: Replace slash characters
 
 
 class PdfHexadecimalString(PdfObj):
     """ See 7.3.4.3 """
+    __slots__ = ()
     Pattern = re.compile(rb'<([0-9a-fA-F]*)>')
 
     def convert(self):
@@ -202,13 +453,15 @@ class PdfHexadecimalString(PdfObj):
 
 
 class PdfNumber(PdfObj):
-    Pattern = re.compile(rb'[+-]?\d*\.?\d')
+    __slots__ = ()
+    Pattern = re.compile(rb'[+-]?(?:\d+\.?\d*|\.\d+)')
 
     def convert(self):
         self.data = self.raw.decode('utf-8')
 
 
 class PdfHeader(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb"%PDF-([12]\.\d)")
 
     def convert(self):
@@ -217,6 +470,7 @@ class PdfHeader(PdfObj):
 
 
 class PdfComment(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb"%(?!PDF|%EOF)(.*)" + LINEBREAK)
 
     def convert(self):
@@ -235,6 +489,7 @@ class PdfComment(PdfObj):
 
 
 class PdfWhitespaces(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb"[ \r\n\t\x0c\x00]+")
     Trivial = True
 
@@ -252,11 +507,13 @@ class PdfWhitespaces(PdfObj):
 
 
 class PdfLinebreak(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb"([\r\n]|\r\n)+")
     Trivial = True
 
 
 class PdfBool(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb"true|false")
 
     def convert(self):
@@ -268,6 +525,7 @@ class PdfBool(PdfObj):
 
 
 class PdfStramData(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb'.*', re.DOTALL)
     Trivial = True
 
@@ -276,29 +534,142 @@ class PdfStramData(PdfObj):
 
 
 class PdfStream(NestablePdfObj):
+    __slots__ = ()
     # Pattern = re.compile(rb"stream" + LINEBREAK + b"(.*?)" + b"endstream" + LINEBREAK, re.DOTALL)
     Pattern = re.compile(rb"stream" + LINEBREAK)
     Contexts = [PdfStramData]
     EndingPattern = re.compile(rb"(.*?)endstream" + LINEBREAK, re.DOTALL)
+    LengthEndingPattern = re.compile(WHITESPACE + rb"*endstream" + LINEBREAK)
+    BodyEndingPattern = re.compile(LINEBREAK + rb"?endstream" + LINEBREAK + rb"$")
 
     def add(self, child_obj: PdfObj) -> PdfObj:
-        self.data += child_obj.data
+        if self._source is None:
+            self.data += child_obj.data
         return self
 
+    def get_length(self) -> Optional[int]:
+        """ The /Length of the stream if it is a direct integer in the dictionary of the enclosing object """
+        if not isinstance(self.parent, PdfIndirectObj) or not isinstance(self.parent.data["object"], PdfDict):
+            return None
+        length = self.parent.data["object"].get("Length")
+        if isinstance(length, PdfNumber) and length.data.isdigit():
+            return int(length.data)
+        return None
+
+    def get_body_size(self) -> int:
+        """ The number of stream bytes before the endstream keyword and EOLs that data also holds """
+        if self._source is not None:
+            data_size = self.b_size - len(self._raw)
+        else:
+            data_size = len(self._data)
+        length = self.get_length()
+        if length is not None and length <= data_size:
+            # Only where endstream follows, as in fast_finish: a /Length that is too short would cut the body
+            if self._source is not None:
+                ending = self.LengthEndingPattern.match(self._source, self.b_start + len(self._raw) + length)
+            else:
+                ending = self.LengthEndingPattern.match(self._data, length)
+            if ending is not None:
+                return length
+        match = self.BodyEndingPattern.search(self.data)
+        return data_size if match is None else match.start()
+
+    def get_body(self) -> bytes:
+        """ The stream bytes without the endstream keyword and EOLs that data also holds """
+        return self.data[:self.get_body_size()]
+
+    def get_filters(self, resolve: Optional[typing.Callable[[PdfObj], PdfObj]] = None) -> list[tuple[str, dict]]:
+        """
+        The /Filter names of the stream dictionary in the order they are applied, each with its /DecodeParms as a
+        plain dict (so it can be sent to another process). resolve is used to follow indirect references when
+        they can be looked up, as in LazyPdfDoc.
+        """
+        resolve = resolve or (lambda value: value)
+        stream_dict = self.parent.data["object"] if isinstance(self.parent, PdfIndirectObj) else None
+        filters = resolve(dict_get(stream_dict, "Filter"))
+        parms = resolve(dict_get(stream_dict, "DecodeParms"))
+        if filters is None:
+            return []
+        if isinstance(filters, PdfName):
+            filters, parms = [filters], [parms]
+        elif isinstance(filters, PdfList):
+            filters = [resolve(f) for f in filters.data]
+            parms = [resolve(p) for p in parms.data] if isinstance(parms, PdfList) else [parms] * len(filters)
+        else:
+            raise DecodeError(f"Unexpected /Filter value: {filters}")
+        decoded = []
+        for name, parm in zip(filters, parms):
+            if not isinstance(name, PdfName):
+                raise DecodeError(f"Unexpected /Filter value: {name}")
+            values = {}
+            if isinstance(parm, PdfDict):
+                for key in parm:
+                    value = resolve(parm[key])
+                    if isinstance(value, PdfNumber):
+                        values[key] = float(value.data) if "." in value.data else int(value.data)
+                    elif isinstance(value, (PdfBool, PdfName)):
+                        values[key] = value.data
+            decoded.append((name.data, values))
+        return decoded
+
+    def decode(self, resolve: Optional[typing.Callable[[PdfObj], PdfObj]] = None) -> bytes:
+        """ The stream body with every filter applied """
+        return decode(self.get_body(), self.get_filters(resolve))
+
+    def fast_finish(self, buffer: bytes, pos: int) -> int:
+        """ Jump over the stream body using /Length instead of scanning it for the endstream keyword """
+        length = self.get_length()
+        if length is None:
+            return -1
+        match = self.LengthEndingPattern.match(buffer, pos + length)
+        if match is None:
+            return -1
+        if self._source is None:
+            # Same bytes as the EndingPattern would consume: the body up to and including "endstream" and the EOL
+            self.data = buffer[pos:match.end()]
+        self.b_size = match.end() - self.b_start
+        return match.end()
+
     def finish(self, next_bytes: bytes, pos: int):
-        self.data += self.EndingPattern.match(next_bytes).group(0)
+        if self._source is None:
+            self.data += self.EndingPattern.match(next_bytes).group(0)
         self.b_size = pos + len(next_bytes) - self.b_start
-        self.report()
         return self.parent
 
     def convert(self):
         self.data = b""
 
+    @property
+    def data(self) -> Any:
+        if self._source is not None:
+            # Offset-backed: everything after the "stream" keyword up to the end of the object
+            return self._source[self.b_start + len(self._raw):self.b_start + self.b_size]
+        return self._data
+
+    @data.setter
+    def data(self, value: Any):
+        self._data = value
+
+    def iter_data(self, chunk_size: int, body_only: bool = False) -> typing.Iterator[bytes]:
+        """
+        data (or with body_only, get_body()) in chunks of chunk_size bytes, sliced straight from the source buffer
+        when offset-backed
+        """
+        if self._source is not None:
+            source, start, end = self._source, self.b_start + len(self._raw), self.b_start + self.b_size
+        else:
+            source, start, end = memoryview(self._data), 0, len(self._data)
+        if body_only:
+            end = start + self.get_body_size()
+        for pos in range(start, end, chunk_size):
+            yield source[pos:min(pos + chunk_size, end)]
+
     def __repr__(self):
         return f"{len(self.data)} bytes of stream data: {self.data[:10]} ... {self.data[-10:]}"
 
 
 class PdfReference(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb'(\d+) (\d+) R')
 
     def convert(self):
@@ -311,10 +682,12 @@ class PdfReference(PdfObj):
 
 
 class PdfNull(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb"null")
 
 
 class PdfLiteralStringParenthesis(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb'[)(]')
     Trivial = True
 
@@ -323,41 +696,40 @@ class PdfLiteralStringParenthesis(PdfObj):
 
 
 class PdfLiteralStringEscape(PdfObj):
-    """ See 7.3.4.2 - Table 3
+    """ See 7.3.4.2 - Table 3. A backslash before any other character is ignored, and a backslash at the end of a
+    line continues the string on the next line without adding the line break.
     """
-    Pattern = re.compile(rb'(\\[nrtbf)(\\])|(\\\d{1,3})')
+    __slots__ = ()
+    Pattern = re.compile(rb'\\(?:([nrtbf()\\])|([0-7]{1,3})|(\r\n|[\r\n])|(.))', re.DOTALL)
     Trivial = True
+    Conversion = {
+        b"n": b"\n",
+        b"r": b"\r",
+        b"t": b"\t",
+        b"b": b'\x08',  # BACKSPACE
+        b"f": b"\f",
+        b"(": b"(",
+        b")": b")",
+        b"\\": b"\\",
+    }
 
-    #
-    # @classmethod
-    # def match(cls, next_bytes: bytes) -> (bool, int):
-    #     """ Return the number of characters that match the class' Pattern (or 0 if no match) """
-    #     print(f"Matching {next_bytes}\n against {cls.Pattern}")
-    #     match = cls.Pattern.match(next_bytes)
-    #     print(match)
-    #     return super().match(next_bytes)
+    @classmethod
+    def decode(cls, escape: re.Match) -> bytes:
+        """ The bytes an escape sequence matched by Pattern stands for """
+        if escape.group(1):
+            return cls.Conversion[escape.group(1)]
+        if escape.group(2):
+            return chr(int(escape.group(2), 8)).encode("utf-8")
+        if escape.group(3):
+            return b""
+        return escape.group(4)
 
     def convert(self):
-        # print(self.raw)
-        code = self.Pattern.match(self.raw).group()  # .decode('utf-8')
-        code = code[1:]
-        if code.decode('utf-8').isnumeric():
-            self.data = chr(int(code, 8)).encode("utf-8")
-        else:
-            conversion = {
-                b"n": b"\n",
-                b"r": b"\r",
-                b"t": b"\t",
-                b"b": b'\x08',  # BACKSPACE
-                b"f": b"\f",
-                b"(": b"(",
-                b")": b")",
-                b"\\": b"\\",
-            }
-            self.data = conversion[code]
+        self.data = self.decode(self.Pattern.match(self.raw))
 
 
 class PdfLiteralStringOther(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb'.', re.DOTALL)
     Trivial = True
 
@@ -369,9 +741,11 @@ class PdfLiteralStringOther(PdfObj):
 # TODO Stings
 class PdfLiteralString(NestablePdfObj):
     """ See 7.3.4.2 """
+    __slots__ = ("_unpaired_parenthesis",)
     Pattern = re.compile(rb"\(")
     EndingPattern = re.compile(rb"\)")
     Contexts = [PdfLiteralStringParenthesis, PdfLiteralStringEscape, PdfLiteralStringOther]
+    SpecialPattern = re.compile(rb'[()\\]')
 
     def __init__(self, *args):
         super().__init__(*args)
@@ -398,16 +772,59 @@ class PdfLiteralString(NestablePdfObj):
                 assert False, "Unrecognised character"
         return self.get_next(child_obj)
 
-    def finish(self, next_bytes: bytes, pos: int):
+    def decode_data(self):
         try:
             self.data = self.data.decode('utf-8')
         except UnicodeDecodeError:
             # Encrypted string so leave as bytes
             pass
+
+    def finish(self, next_bytes: bytes, pos: int):
+        self.decode_data()
         return super().finish(next_bytes, pos)
 
+    def fast_finish(self, buffer: bytes, pos: int) -> int:
+        """
+        Scan the whole string in one call instead of creating a child object per character.
+        Jumps between parentheses and backslashes, copying the runs in between into a bytearray.
+        Returns -1 (fall back to the child contexts) if the string is not terminated.
+        """
+        data = bytearray()
+        depth = 0
+        search_special = self.SpecialPattern.search
+        match_escape = PdfLiteralStringEscape.Pattern.match
+        decode_escape = PdfLiteralStringEscape.decode
+        while True:
+            special = search_special(buffer, pos)
+            if special is None:
+                return -1
+            start = special.start()
+            data += buffer[pos:start]
+            char = buffer[start]
+            if char == 0x28:  # (
+                depth += 1
+                data.append(char)
+                pos = start + 1
+            elif char == 0x29:  # )
+                if depth == 0:
+                    break
+                depth -= 1
+                data.append(char)
+                pos = start + 1
+            else:
+                escape = match_escape(buffer, start)
+                if escape is None:
+                    return -1
+                data += decode_escape(escape)
+                pos = escape.end()
+        self.data = bytes(data)
+        self.decode_data()
+        self.b_size = start + 1 - self.b_start
+        return start + 1
+
 
 class PdfList(NestablePdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb"\[")
     EndingPattern = re.compile(rb"]")
     Contexts = [PdfLiteralString, PdfBool, PdfWhitespaces, PdfName, PdfReference, PdfNumber, PdfHexadecimalString,
@@ -415,6 +832,11 @@ class PdfList(NestablePdfObj):
 
 
 class PdfDict(NestablePdfObj):
+    """
+    data is keyed by the PdfName objects as parsed, so to_json() keeps every key.
+    Lookups by name go through an index from name string to value, built on the first lookup.
+    """
+    __slots__ = ("_index",)
     Pattern = re.compile(rb"<<")  # + LINEBREAK + b"*")
     EndingPattern = re.compile(rb">>")  # + LINEBREAK + b"*")
     Contexts = [PdfLiteralString, PdfBool, PdfWhitespaces, PdfName, PdfReference, PdfNumber, PdfHexadecimalString,
@@ -422,22 +844,71 @@ class PdfDict(NestablePdfObj):
 
     def __init__(self, *args):
         super().__init__(*args)
-        self._unpaired_key: Optional[PdfObj] = None
+        self._index: Optional[dict[str, PdfObj]] = None
         self.data = {}
 
     def add(self, child_obj: PdfObj):
         if isinstance(child_obj, PdfWhitespaces):
             return self
-        if self._unpaired_key is None:
-            self._unpaired_key = child_obj
+        self._index = None
+        # A key waiting for its value is held in data with the PENDING placeholder, rather than in an attribute
+        if self.data and next(reversed(self.data.values())) is PENDING:
+            self.data[next(reversed(self.data))] = child_obj
         else:
-            self.data[self._unpaired_key] = child_obj
-            self._unpaired_key = None
+            self.data[child_obj] = PENDING
         return self.get_next(child_obj)
 
+    def finish(self, next_bytes: bytes, pos: int):
+        if self.data and next(reversed(self.data.values())) is PENDING:
+            # Drop a key without a value
+            self.data.popitem()
+        return super().finish(next_bytes, pos)
+
+    def get_index(self) -> dict[str, PdfObj]:
+        if self._index is None:
+            # The first occurrence of a repeated key wins, as it did for a linear scan
+            self._index = {}
+            for pdf_key, pdf_value in self.data.items():
+                if isinstance(pdf_key, PdfName) and pdf_value is not PENDING:
+                    self._index.setdefault(pdf_key.data, pdf_value)
+        return self._index
+
+    def get(self, name: str, default: Any = None) -> Optional[PdfObj]:
+        return self.get_index().get(name, default)
+
+    def __getitem__(self, name: str) -> PdfObj:
+        return self.get_index()[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.get_index()
+
+    def __iter__(self) -> typing.Iterator[str]:
+        return iter(self.get_index())
+
+    def get_int(self, name: str, default: Optional[int] = None) -> Optional[int]:
+        """ Value of a direct PdfNumber as an int, or default """
+        value = self.get(name)
+        if not isinstance(value, PdfNumber):
+            return default
+        try:
+            return int(value.data)
+        except ValueError:
+            return int(float(value.data))
+
+    def get_name(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """ Value of a PdfName as a str, or default """
+        value = self.get(name)
+        return value.data if isinstance(value, PdfName) else default
+
+    def get_reference(self, name: str, default: Optional[str] = None) -> Optional[str]:
+        """ Value of a PdfReference as its "R n g" str, or default """
+        value = self.get(name)
+        return value.data if isinstance(value, PdfReference) else default
+
 
 class PdfIndirectObj(NestablePdfObj):
     """ See: 7.3.10 """
+    __slots__ = ()
     Contexts = [PdfBool, PdfDict, PdfStream, PdfList, PdfWhitespaces, PdfNumber, PdfNull, PdfHexadecimalString,
                 PdfName, PdfLiteralString]
     Pattern = re.compile(rb'(\d+)' + WHITESPACE + rb'(\d+) obj')
@@ -466,6 +937,7 @@ class PdfIndirectObj(NestablePdfObj):
 
 
 class PdfCrossReferenceTableSpec(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb"(\d+) (\d+) *" + LINEBREAK)
     Trivial = True
 
@@ -478,6 +950,7 @@ class PdfCrossReferenceTableSpec(PdfObj):
 
 
 class PdfCrossReferenceTableEntry(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb"(\d{10}) (\d{5}) ([nf])" + WHITESPACE + b'*' + LINEBREAK)
     Trivial = True
 
@@ -492,6 +965,7 @@ class PdfCrossReferenceTableEntry(PdfObj):
 
 class PdfCrossReferenceTable(NestablePdfObj):
     """ See 7.5.4 """
+    __slots__ = ()
     Contexts = [PdfCrossReferenceTableSpec, PdfCrossReferenceTableEntry]
     Pattern = re.compile(rb'xref' + LINEBREAK)
     EndingPattern = re.compile(rb'trailer')
@@ -502,6 +976,7 @@ class PdfCrossReferenceTable(NestablePdfObj):
 
 class PdfCrossRefOffset(PdfObj):
     """ See 7.5.5 """
+    __slots__ = ()
     Pattern = re.compile(rb'startxref' + LINEBREAK + rb'(\d+?)' + WHITESPACE + b'*' + LINEBREAK)
 
     def convert(self):
@@ -509,6 +984,7 @@ class PdfCrossRefOffset(PdfObj):
 
 
 class PdfEndOfFileMarker(PdfObj):
+    __slots__ = ()
     Pattern = re.compile(rb'%%EOF' + LINEBREAK)
 
     def convert(self):
@@ -517,6 +993,7 @@ class PdfEndOfFileMarker(PdfObj):
 
 class PdfTrailerDict(NestablePdfObj):
     """ See 7.5.5 """
+    __slots__ = ()
     Pattern = re.compile(rb'trailer' + LINEBREAK)
     EndingPattern = re.compile(rb'%%EOF')
     Contexts = [PdfDict, PdfCrossRefOffset, PdfWhitespaces]
@@ -526,13 +1003,472 @@ class PdfTrailerDict(NestablePdfObj):
         return super().finish(next_bytes, pos)
 
 
-class PdfDoc(NestablePdfObj):
+# Page attributes a page takes from its nearest ancestor that has them, see 7.7.3.4
+INHERITABLE = ("Resources", "MediaBox", "CropBox", "Rotate")
+
+
+class PageNode:
+    """ A /Pages node of the page tree: its kids, the running total of pages under them and its own inheritables """
+    __slots__ = ("kids", "ends", "attributes")
+
+    def __init__(self, kids: list[PdfObj], ends: list[int], attributes: dict[str, PdfObj]):
+        self.kids = kids
+        # ends[i] is the number of pages under kids[0..i], so the kid holding page n is bisect_right(ends, n)
+        self.ends = ends
+        self.attributes = attributes
+
+    @property
+    def count(self) -> int:
+        return self.ends[-1] if self.ends else 0
+
+
+class Page:
+    """ A page (7.7.3.3) with the attributes it inherits from the /Pages nodes above it """
+
+    def __init__(self, doc: 'PageTree', index: int, reference: Optional[str], page_dict: PdfDict,
+                 inherited: dict[str, PdfObj]):
+        self.doc = doc
+        self.index = index
+        self.reference = reference
+        self.dict = page_dict
+        self.inherited = inherited
+
+    def get(self, name: str) -> Optional[PdfObj]:
+        """ The page's own value for name, or the inherited one for INHERITABLE names, with references followed """
+        value = self.dict.get(name)
+        if value is None:
+            value = self.inherited.get(name)
+        return self.doc.resolve(value)
+
+    @property
+    def resources(self) -> Optional[PdfDict]:
+        resources = self.get("Resources")
+        return resources if isinstance(resources, PdfDict) else None
+
+    @property
+    def media_box(self) -> Optional[list[float]]:
+        """ The four coordinates of the /MediaBox rectangle (7.9.5), or None if it is missing or not a rectangle """
+        box = self.get("MediaBox")
+        if not isinstance(box, PdfList):
+            return None
+        values = [self.doc.resolve(value) for value in box.data if not isinstance(value, PdfWhitespaces)]
+        if len(values) != 4 or not all(isinstance(value, PdfNumber) for value in values):
+            return None
+        return [float(value.data) for value in values]
+
+    def content_streams(self) -> list[PdfIndirectObj]:
+        """ The indirect objects of the page's content streams, in order """
+        contents = self.dict.get("Contents")
+        if isinstance(contents, PdfReference):
+            obj = self.doc.get(contents.data)
+            if obj is None:
+                return []
+            if "data stream" in obj.data:
+                return [obj]
+            # An indirect array of streams
+            contents = obj.data["object"]
+        if not isinstance(contents, PdfList):
+            return []
+        streams = []
+        for reference in contents.data:
+            obj = self.doc.get(reference.data) if isinstance(reference, PdfReference) else None
+            if obj is not None and "data stream" in obj.data:
+                streams.append(obj)
+        return streams
+
+    def contents(self) -> bytes:
+        """ The decoded content streams of the page, joined as one (7.8.2) """
+        parts = []
+        for obj in self.content_streams():
+            stream = obj.data["data stream"]
+            if not isinstance(stream, PdfStream):
+                raise DecodeError(f"The stream of {obj.data['reference']} has been written to {stream} by decompress()")
+            parts.append(stream.decode(self.doc.resolve))
+        return b"\n".join(parts)
+
+    def __repr__(self):
+        return f"Page({self.index}, {self.reference})"
+
+
+class PageTree:
+    """
+    Pages by number through the page tree (7.7.3), for a document with get(), catalog() and get_page_nodes(), its
+    cache of /Pages nodes by reference ("R n g"), or by id() for a direct dictionary.
+    Only the /Pages nodes on the way down and the kids of those nodes are resolved. Each node is kept with the
+    running page counts of its kids (from their /Count), so later lookups go down the tree by bisection without
+    resolving anything but the page itself.
+    """
+    __slots__ = ()
+
+    def resolve(self, value: Optional[PdfObj]) -> Optional[PdfObj]:
+        """ Follow a PdfReference to the object it points at. Other values are returned unchanged. """
+        return resolve_reference(value, self.get)
+
+    def page_tree_root(self) -> Optional[PdfObj]:
+        return dict_get(self.catalog(), "Pages")
+
+    def page_node(self, value: PdfObj, ancestors: tuple = ()) -> PageNode:
+        """ The node for a /Pages dictionary, built on first use. ancestors are the keys of the nodes above it. """
+        key = page_node_key(value)
+        nodes = self.get_page_nodes()
+        if key in nodes:
+            return nodes[key]
+        if key in ancestors:
+            raise ParseError(f"The page tree loops back to {key}")
+        node_dict = self.resolve(value)
+        if not isinstance(node_dict, PdfDict):
+            raise ParseError(f"Page tree node {key} is not a dictionary")
+        kids = self.resolve(node_dict.get("Kids"))
+        kids = kids.data if isinstance(kids, PdfList) else []
+        ends = []
+        total = 0
+        for kid in kids:
+            total += self.kid_page_count(kid, ancestors + (key,))
+            ends.append(total)
+        node = PageNode(kids, ends, {name: node_dict[name] for name in INHERITABLE if name in node_dict})
+        nodes[key] = node
+        return node
+
+    def kid_page_count(self, kid: PdfObj, ancestors: tuple) -> int:
+        """ 1 for a page, /Count for a /Pages node (or its pages counted, if it has no usable /Count) """
+        kid_dict = self.resolve(kid)
+        if not isinstance(kid_dict, PdfDict):
+            return 0
+        if not is_pages_node(kid_dict):
+            return 1
+        count = self.resolve(kid_dict.get("Count"))
+        if isinstance(count, PdfNumber) and count.data.isdigit():
+            return int(count.data)
+        return self.page_node(kid, ancestors).count
+
+    def page_count(self) -> int:
+        root = self.page_tree_root()
+        return 0 if root is None else self.page_node(root).count
+
+    def page(self, index: int) -> Page:
+        """ Page number index (from 0, negative from the end) with its inherited attributes """
+        value = self.page_tree_root()
+        if value is None:
+            raise IndexError("The document has no page tree")
+        node = self.page_node(value)
+        if index < 0:
+            index += node.count
+        if not 0 <= index < node.count:
+            raise IndexError(f"Page {index} is out of range for a document of {node.count} pages")
+        inherited = dict(node.attributes)
+        ancestors = (page_node_key(value),)
+        remaining = index
+        while True:
+            position = bisect_right(node.ends, remaining)
+            if position:
+                remaining -= node.ends[position - 1]
+            value = node.kids[position]
+            kid_dict = self.resolve(value)
+            if not is_pages_node(kid_dict):
+                reference = value.data if isinstance(value, PdfReference) else None
+                return Page(self, index, reference, kid_dict, inherited)
+            key = page_node_key(value)
+            if key in ancestors:
+                raise ParseError(f"The page tree loops back to {key}")
+            node = self.page_node(value, ancestors)
+            ancestors += (key,)
+            if remaining >= node.count:
+                raise ParseError(f"/Count of page tree node {key} is more than the pages under it ({node.count})")
+            inherited.update(node.attributes)
+
+
+def resolve_reference(value: Optional[PdfObj], get: typing.Callable[[str], Optional[PdfIndirectObj]]) \
+        -> Optional[PdfObj]:
+    """ Follow a PdfReference through get(reference) to the object it points at. Other values are returned as is """
+    seen = set()
+    while isinstance(value, PdfReference) and value.data not in seen:
+        seen.add(value.data)
+        indirect = get(value.data)
+        value = None if indirect is None else indirect.data["object"]
+    return value
+
+
+def page_node_key(value: PdfObj):
+    return value.data if isinstance(value, PdfReference) else id(value)
+
+
+def is_pages_node(value: PdfObj) -> bool:
+    return isinstance(value, PdfDict) and (value.get_name("Type") == "Pages" or "Kids" in value)
+
+
+REFERENCE = re.compile(r'R (\d+) (\d+)')
+
+
+def parse_reference(reference: str | tuple[int, int] | int) -> tuple[int, int]:
+    """ Accept "R n g" strings (as in PdfReference.data), (n, g) tuples or a bare object number """
+    if isinstance(reference, int):
+        return reference, 0
+    if isinstance(reference, tuple):
+        return reference
+    match = REFERENCE.fullmatch(reference)
+    if match is None:
+        raise ValueError(f"Not a reference: {reference!r}")
+    return int(match.group(1)), int(match.group(2))
+
+
+class CrossReferences:
+    """
+    The entries of a chain of cross-reference sections (7.5.4, 7.5.8), added from the newest section to the oldest.
+    Each object number takes its entry from the newest section that lists it: an in-use or compressed entry hides
+    older versions of the object, and a free entry deletes them. in_use holds whatever the document finds objects
+    with, (byte offset, generation number) for LazyPdfDoc and the parsed PdfIndirectObj for a parsed tree.
+    """
+
+    def __init__(self):
+        self.in_use: dict[int, Any] = {}
+        # Object number -> (object stream number, index within the stream) for objects packed in object streams
+        self.compressed: dict[int, tuple[int, int]] = {}
+        # Object numbers whose newest entry is free
+        self.freed: set[int] = set()
+
+    def __contains__(self, number: int) -> bool:
+        return number in self.in_use or number in self.compressed or number in self.freed
+
+    def add_section(self, in_use: dict[int, Any], compressed: Optional[dict[int, tuple[int, int]]] = None,
+                    freed: typing.Iterable[int] = ()):
+        """ Add the entries of the next older section. Numbers a newer section has decided are left alone. """
+        for number, entry in in_use.items():
+            if number not in self:
+                self.in_use[number] = entry
+        for number, entry in (compressed or {}).items():
+            if number not in self:
+                self.compressed[number] = entry
+        # Free entries for numbers the section also lists are ignored: hybrid-reference files mark the objects of
+        # their cross-reference stream free in the table (7.5.8.4)
+        self.freed.update(number for number in freed if number not in self)
+
+
+class Revision:
+    """
+    One revision of a PDF (7.5.6): the objects, cross-reference section and trailer up to and including an %%EOF.
+    The first revision starts at the header, each incremental update starts after the previous %%EOF.
+    """
+
+    def __init__(self, index: int, start: int):
+        self.index = index
+        self.start = start
+        self.end = start
+        # (object number, generation number) -> object, later definitions in the same revision win
+        self.objects: dict[tuple[int, int], PdfIndirectObj] = {}
+        # Object numbers marked free by this revision's cross-reference section
+        self.freed: set[int] = set()
+        # Object number -> (object stream number, index) for the objects its cross-reference stream packs (7.5.7)
+        self.compressed: dict[int, tuple[int, int]] = {}
+        self.xref: Optional[PdfObj] = None  # PdfCrossReferenceTable, or the PdfIndirectObj of an xref stream
+        self.trailer: Optional[PdfDict] = None  # The trailer dictionary, or the xref stream dictionary
+        self.startxref: Optional[int] = None
+
+    @property
+    def prev(self) -> Optional[int]:
+        """ The startxref of the revision this one updates, from /Prev in the trailer """
+        return None if self.trailer is None else self.trailer.get_int("Prev")
+
+    def __repr__(self):
+        return (f"Revision({self.index}, bytes {self.start}-{self.end}, {len(self.objects)} objects, "
+                f"{len(self.freed)} freed, startxref {self.startxref}, prev {self.prev})")
+
+
+def split_revisions(pdf: 'PdfDoc', unfinished: bool = False) -> list[Revision]:
+    """
+    Split the top-level objects of a parsed PDF at each %%EOF. Anything after the last %%EOF (an update that is
+    still being written) is not a revision, unless unfinished is set. The entries of each revision's
+    cross-reference sections are read too: objects it frees, and objects packed in object streams, which are
+    parsed out of their stream into its objects.
+    """
+    revisions = []
+    revision = Revision(0, 0)
+    for obj in pdf.data:
+        if isinstance(obj, PdfIndirectObj):
+            number, generation = parse_reference(obj.data["reference"])
+            revision.objects[(number, generation)] = obj
+            if is_xref_stream(obj):
+                revision.xref = obj
+                revision.trailer = obj.data["object"]
+        elif isinstance(obj, PdfCrossReferenceTable):
+            revision.xref = obj
+        elif isinstance(obj, PdfCrossRefOffset):
+            revision.startxref = obj.data
+        elif isinstance(obj, PdfTrailerDict):
+            for child in obj.data:
+                if isinstance(child, PdfDict):
+                    revision.trailer = child
+                elif isinstance(child, PdfCrossRefOffset):
+                    revision.startxref = child.data
+        if isinstance(obj, (PdfTrailerDict, PdfEndOfFileMarker)):
+            revision.end = obj.b_start + obj.b_size
+            revisions.append(revision)
+            revision = Revision(len(revisions), revision.end)
+    if unfinished and revision.objects:
+        revision.end = pdf.b_start + pdf.b_size
+        revisions.append(revision)
+    # Objects by reference in file order, later definitions winning, to find object streams and /Length values
+    defined: dict[str, PdfIndirectObj] = {}
+    resolve = partial(resolve_reference, get=defined.get)
+    for revision in revisions:
+        defined.update((f"R {number} {generation}", obj) for (number, generation), obj in revision.objects.items())
+        read_xref_entries(revision, resolve)
+        read_compressed(revision, defined.get, resolve)
+        defined.update((f"R {number} 0", revision.objects[(number, 0)]) for number in revision.compressed
+                       if (number, 0) in revision.objects)
+    return revisions
+
+
+def is_xref_stream(obj: PdfObj) -> bool:
+    stream_dict = obj.data["object"] if isinstance(obj, PdfIndirectObj) else None
+    return isinstance(stream_dict, PdfDict) and stream_dict.get_name("Type") == "XRef"
+
+
+def read_xref_entries(revision: Revision, resolve: typing.Callable[[Optional[PdfObj]], Optional[PdfObj]]):
+    """
+    Fill in the objects freed or packed in object streams by a revision's cross-reference table and streams
+    (a hybrid-reference file has both)
+    """
+    if isinstance(revision.xref, PdfCrossReferenceTable):
+        number = 0
+        for child in revision.xref.data:
+            if isinstance(child, PdfCrossReferenceTableSpec):
+                number = child.data["object number of first entry"]
+            elif isinstance(child, PdfCrossReferenceTableEntry):
+                if not child.data["in-use"] and number:
+                    revision.freed.add(number)
+                number += 1
+    for xref in [obj for obj in revision.objects.values() if is_xref_stream(obj) and "data stream" in obj.data]:
+        try:
+            data = xref.data["data stream"].decode(resolve)
+            entries = list(iter_xref_stream(xref.data["object"], data))
+        except (DecodeError, KeyError, ValueError, AttributeError) as e:
+            print(f"Could not read the cross-reference stream {xref.data['reference']} of revision "
+                  f"{revision.index}: {e}")
+            continue
+        for number, entry_type, field2, field3 in entries:
+            if entry_type == 0 and number:
+                revision.freed.add(number)
+            elif entry_type == 2:
+                revision.compressed[number] = (field2, field3)
+
+
+def read_compressed(revision: Revision, get: typing.Callable[[str], Optional[PdfIndirectObj]],
+                    resolve: typing.Callable[[Optional[PdfObj]], Optional[PdfObj]]):
+    """ Parse the objects a revision packs in object streams into its objects, as LazyPdfDoc does on request """
+    object_streams = {}
+    for number, (stream_number, _) in revision.compressed.items():
+        try:
+            if stream_number not in object_streams:
+                obj_stm = get(f"R {stream_number} 0")
+                if obj_stm is None or "data stream" not in obj_stm.data:
+                    raise ParseError(f"Object stream R {stream_number} 0 is missing")
+                object_streams[stream_number] = read_object_stream(obj_stm, resolve)
+            revision.objects[(number, 0)] = parse_compressed(object_streams[stream_number], number, stream_number)
+        except (ParseError, DecodeError) as e:
+            print(f"Could not read object {number} of revision {revision.index}: {e}")
+
+
+def revision_chain(revisions: list[Revision]) -> list[Revision]:
+    """ Revisions from the newest to the oldest by /Prev, then any the chain missed from the last to first """
+    by_startxref = {revision.startxref: revision for revision in revisions if revision.startxref is not None}
+    chain = []
+    seen = set()
+    revision = revisions[-1] if revisions else None
+    while revision is not None and revision.index not in seen:
+        seen.add(revision.index)
+        chain.append(revision)
+        revision = by_startxref.get(revision.prev)
+    chain.extend(revision for revision in reversed(revisions) if revision.index not in seen)
+    return chain
+
+
+def tree_references(revisions: typing.Iterable[Revision]) -> CrossReferences:
+    """ The objects visible after revisions of a parsed tree, given from the newest to the oldest """
+    references = CrossReferences()
+    for revision in revisions:
+        references.add_section({number: obj for (number, _), obj in revision.objects.items()}, revision.compressed,
+                               revision.freed)
+    return references
+
+
+class PdfDoc(PageTree, NestablePdfObj):
+    __slots__ = ("_interval_index", "_objects", "_objects_size", "_page_nodes")
     Contexts = [PdfHeader, PdfComment, PdfIndirectObj, PdfWhitespaces, PdfCrossReferenceTable, PdfTrailerDict,
                 PdfCrossRefOffset, PdfEndOfFileMarker]
 
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._interval_index: Optional[IntervalIndex] = None
+        self._objects: Optional[dict[str, PdfIndirectObj]] = None
+        self._objects_size = 0
+        self._page_nodes: dict[Any, PageNode] = {}
+
     def match_end(self, next_bytes: bytes):
         return len(next_bytes) == 0, 0
 
+    def get_interval_index(self) -> IntervalIndex:
+        """ Built on the first query, and again if the document has grown since (see revisions.parse_update) """
+        if self._interval_index is None or self._interval_index.b_size != self.b_size:
+            self._interval_index = IntervalIndex(self)
+        return self._interval_index
+
+    def object_at(self, offset: int) -> list[PdfObj]:
+        """
+        The objects covering a byte offset, from the top-level object down to the innermost token.
+        Empty if the offset is between top-level objects (whitespace) or outside the file.
+        """
+        return self.get_interval_index().object_at(offset)
+
+    def range(self, start: int, end: int, max_depth: Optional[int] = None) -> list[PdfObj]:
+        """
+        The objects overlapping the bytes from start up to end in file order, outer objects before the objects
+        they contain. With max_depth, only objects nested at most that deep (1 for top-level objects).
+        """
+        return self.get_interval_index().range(start, end, max_depth)
+
+    def get_objects(self) -> dict[str, PdfIndirectObj]:
+        """
+        The indirect objects of the newest revision by reference ("R n g"), including those packed in object streams
+        and leaving out those freed by an update (see split_revisions and CrossReferences). Objects after the last
+        %%EOF count as the newest revision. Built on first use, and again if the document has grown since, as is
+        the page tree cache.
+        """
+        if self._objects is None or self._objects_size != self.b_size:
+            references = tree_references(revision_chain(split_revisions(self, unfinished=True)))
+            self._objects = {obj.data["reference"]: obj for obj in references.in_use.values()}
+            self._objects_size = self.b_size
+            self._page_nodes = {}
+        return self._objects
+
+    def get(self, reference: str) -> Optional[PdfIndirectObj]:
+        return self.get_objects().get(reference)
+
+    def get_trailer(self) -> Optional[PdfDict]:
+        """ The last trailer dictionary, or the dictionary of the last cross-reference stream """
+        for obj in reversed(self.data):
+            if isinstance(obj, PdfTrailerDict):
+                for child in obj.data:
+                    if isinstance(child, PdfDict):
+                        return child
+            elif is_xref_stream(obj):
+                return obj.data["object"]
+        return None
+
+    def catalog(self) -> Optional[PdfDict]:
+        return self.resolve(dict_get(self.get_trailer(), "Root"))
+
+    def get_page_nodes(self) -> dict[Any, PageNode]:
+        self.get_objects()
+        return self._page_nodes
+
+
+class PdfDocStream(PdfDoc):
+    """ Root used by iter_parse(): top-level objects are handed to the caller instead of being kept """
+    __slots__ = ()
+
+    def add(self, child_obj: PdfObj) -> PdfObj:
+        return self.get_next(child_obj)
+
 
 
 def test_regex(pdf_obj: PdfObj, sample_text):
@@ -550,7 +1486,208 @@ class ParseError(Exception):
     pass
 
 
-def parse(filename) -> PdfDoc:
+PROGRESS_STEP = 1 << 20
+
+
+def parse_error(message: str, current: NestablePdfObj, buffer: bytes, pos: int) -> ParseError:
+    e = ParseError(message)
+    e.add_note(f"Byte position:   {pos:x} ({pos})")
+    e.add_note(f"Current context: {current.get_structure_location()}")
+    e.add_note("Open objects:    " + " > ".join(f"{type(obj).__name__}@{obj.b_start:x}"
+                                                for obj in [*reversed(list(current.ancestors())), current]))
+    e.add_note(f"Current data: {current.data}")
+    e.add_note(f"{'Buffer':<25} {buffer[pos:pos + 20]}")
+    e.add_note(f"Possible matches:")
+    for next_class in current.get_contexts():
+        e.add_note(f"{next_class.__name__:<25} {next_class.Pattern.pattern}")
+    return e
+
+
+def print_progress(pos: int, size: int):
+    print(f"{pos}/{size}\t", end="\r")
+
+
+def tokenize(buffer: bytes | mmap.mmap, root: NestablePdfObj, pos: int = 0, filename=None,
+             offsets=False, progress: bool | typing.Callable[[int, int], None] = False, keep_raw=True,
+             instrument=None) -> typing.Iterator[PdfObj]:
+    """
+    Single pass tokenizer. Each token is matched with the combined dispatch pattern of the current context
+    (see NestablePdfObj.get_dispatch) instead of trying each context class in turn.
+    Yields every completed child of root as soon as it is finished.
+    With offsets=True, objects are created with from_source() and only keep their position in buffer.
+    With keep_raw=False, objects drop their raw bytes once they have been converted.
+    progress is called with the position and buffer size at most once per PROGRESS_STEP bytes (True prints it).
+    instrument (see instrumentation.Instrumentation) is told about every token; it is never touched when None.
+    """
+    view = memoryview(buffer)
+    buffer_size = len(buffer)
+    if progress is True:
+        progress = print_progress
+    next_report = pos if progress else buffer_size + 1
+    if instrument is not None:
+        instrument.start(root, buffer_size)
+    current = root
+    while current is not None:
+        if pos >= next_report:
+            progress(pos, buffer_size)
+            next_report = pos + PROGRESS_STEP
+
+        matched_end, read_length = current.match_end(view[pos:])
+        if matched_end:
+            finished = current
+            current = current.finish(buffer[pos:pos + read_length], pos)
+            pos += read_length
+            if instrument is not None:
+                instrument.finish(finished, read_length)
+            if current is root:
+                yield finished
+            continue
+
+        dispatch, classes = current.get_dispatch()
+        if instrument is not None:
+            instrument.dispatch(current, buffer, pos)
+        match = dispatch.match(buffer, pos)
+        if match is None or match.end() == pos:
+            raise parse_error(f"Could not parse symbols at byte position {pos:x} for file {filename}",
+                              current, buffer, pos)
+        next_pos = match.end()
+        if offsets:
+            child = classes[match.lastgroup].from_source(buffer, pos, next_pos - pos, current)
+        else:
+            child = classes[match.lastgroup](buffer[pos:next_pos], pos, current)
+            if not keep_raw:
+                child.raw = None
+        if instrument is not None:
+            instrument.token(current, child, next_pos - pos)
+        current = current.add(child)
+        pos = next_pos
+        if current is child:
+            end = child.fast_finish(buffer, pos)
+            if end >= 0:
+                if instrument is not None:
+                    instrument.finish(child, end - pos)
+                pos = end
+                current = child.parent
+        if current is root and not isinstance(child, PdfWhitespaces):
+            yield child
+    if instrument is not None:
+        instrument.stop()
+
+
+def parse(filename, use_mmap=False, keep_raw=True, progress: bool | typing.Callable[[int, int], None] = True,
+          instrument=None) -> PdfDoc:
+    """
+    Parse a whole PDF file.
+    With use_mmap=True the file is memory mapped rather than read, and objects keep offsets into the mapping
+    instead of copies of their bytes. The mapping stays open for as long as the returned tree is alive.
+    With keep_raw=False the raw bytes of each object are dropped once its data has been converted.
+    """
+    pdf = PdfDoc(b"")
+    buffer, use_mmap = read_buffer(filename, use_mmap)
+    for _ in tokenize(buffer, pdf, filename=filename, offsets=use_mmap, progress=progress, keep_raw=keep_raw,
+                      instrument=instrument):
+        pass
+    return pdf
+
+
+def iter_parse(filename, use_mmap=True, keep_raw=True, progress: bool | typing.Callable[[int, int], None] = True,
+               instrument=None) -> typing.Iterator[PdfObj]:
+    """
+    Yield each top-level object (indirect object, xref table, trailer, comment...) as soon as it is finished.
+    Nothing keeps a reference to an object once it has been yielded, so memory use is bounded by the largest
+    object rather than the whole tree. The file is memory mapped by default so it is not copied into memory
+    either.
+    """
+    buffer, use_mmap = read_buffer(filename, use_mmap)
+    yield from tokenize(buffer, PdfDocStream(b""), filename=filename, offsets=use_mmap, progress=progress,
+                        keep_raw=keep_raw, instrument=instrument)
+
+
+def read_buffer(filename, use_mmap=False) -> tuple[bytes | mmap.mmap, bool]:
+    """ Read or memory map a file. Returns the buffer and whether it was mapped (empty files cannot be). """
+    with open(filename, "rb") as fh:
+        if use_mmap and os.fstat(fh.fileno()).st_size > 0:
+            return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ), True
+        return fh.read(), False
+
+
+def parse_at(buffer: bytes | mmap.mmap, pos: int, context: Type[NestablePdfObj] = None, filename=None,
+             offsets=False) -> PdfObj:
+    """
+    Parse the single object that starts at pos (after any whitespace), as it would be found in the context class
+    (PdfDoc by default). Used for random access to objects through the cross-reference table.
+    """
+    context = PdfDoc if context is None else context
+    whitespace = PdfWhitespaces.Pattern.match(buffer, pos)
+    if whitespace is not None:
+        pos = whitespace.end()
+    dispatch, classes = context.get_dispatch()
+    match = dispatch.match(buffer, pos)
+    if match is None or match.end() == pos:
+        raise parse_error(f"Could not parse an object at byte position {pos:x} for file {filename}",
+                          context(b""), buffer, pos)
+    if offsets:
+        obj = classes[match.lastgroup].from_source(buffer, pos, match.end() - pos)
+    else:
+        obj = classes[match.lastgroup](buffer[pos:match.end()], pos)
+    if isinstance(obj, NestablePdfObj) and obj.fast_finish(buffer, match.end()) < 0:
+        for _ in tokenize(buffer, obj, match.end(), filename=filename, offsets=offsets):
+            pass
+    return obj
+
+
+def iter_xref_stream(stream_dict: PdfDict, data: bytes) -> typing.Iterator[tuple[int, int, int, int]]:
+    """
+    The entries of a decoded cross-reference stream (7.5.8) as (object number, type, field 2, field 3).
+    Type 0 is free, 1 is an offset and generation number, 2 an object stream number and index within it.
+    Without /Index and /Size (which is required, but not always there) the entries are as many as data holds.
+    """
+    widths = [int(w.data) for w in stream_dict["W"].data]
+    index = stream_dict.get("Index")
+    if isinstance(index, PdfList):
+        index = [int(i.data) for i in index.data]
+    else:
+        size = stream_dict.get_int("Size")
+        index = [0, len(data) // max(sum(widths), 1) if size is None else size]
+    pos = 0
+    for first, count in zip(index[0::2], index[1::2]):
+        for number in range(first, first + count):
+            fields = []
+            for width in widths:
+                fields.append(int.from_bytes(data[pos:pos + width], "big"))
+                pos += width
+            entry_type = fields[0] if widths[0] else 1
+            yield number, entry_type, fields[1], fields[2] if len(fields) > 2 else 0
+
+
+def read_object_stream(obj_stm: PdfIndirectObj, resolve: typing.Callable[[Optional[PdfObj]], Optional[PdfObj]]) \
+        -> tuple[bytes, int, dict[int, int]]:
+    """ Decode an object stream (7.5.7): its data, the offset of the first object and each object's offset by number """
+    stream_dict = obj_stm.data["object"]
+    data = obj_stm.data["data stream"].decode(resolve)
+    first = int(resolve(dict_get(stream_dict, "First")).data)
+    header = data[:first].split()
+    offsets = {int(header[i]): int(header[i + 1]) for i in range(0, len(header) - 1, 2)}
+    return data, first, offsets
+
+
+def parse_compressed(object_stream: tuple[bytes, int, dict[int, int]], number: int, stream_number: int,
+                     filename=None) -> PdfIndirectObj:
+    """ Parse one object out of an object stream read by read_object_stream(), wrapped in a PdfIndirectObj """
+    data, first, offsets = object_stream
+    if number not in offsets:
+        raise ParseError(f"Object {number} is not in object stream R {stream_number} 0 of {filename}")
+    value = parse_at(data, first + offsets[number], context=PdfList, filename=filename)
+    obj = PdfIndirectObj(f"{number} 0 obj".encode())
+    value.parent = obj
+    obj.add(value)
+    return obj
+
+
+def parse_legacy(filename) -> PdfDoc:
+    """ The original tokenizer: tries every context class in turn for each token. Kept as a reference for
+    bench_tokenizer.py.
+    """
     file_size = os.path.getsize(filename)
     pdf = PdfDoc(b"")
     current = pdf
@@ -598,40 +1735,157 @@ def parse(filename) -> PdfDoc:
             )
     return pdf
 
-def decompress(pdf: PdfObj, save_dir):
-    for p in pdf.data:
-        if isinstance(p, PdfIndirectObj):
-            if "data stream" in p.data:
-                out_fn = save_dir / Path(f"{p.data['reference']}.bin")
+DECOMPRESS_CHUNK = 1 << 20
 
-                filter = None
-                for pdf_key, pdf_value in p.data["object"].data.items():
-                    if pdf_key.data == "Filter":
-                        filter = pdf_value.data
-                        break
-                
-                if filter == "FlateDecode":
-                    
-                    print(f"Decoding with FlateDecode to {out_fn}")
-                    with open(out_fn, "wb") as fh:
-                        fh.write(zlib.decompress(p.data["data stream"].data))
-                    p.data["data stream"] = out_fn.as_posix()
-                # elif filter == b"ASCIIHexDecode":
-                #     p.data["data stream decompressed"] = ascii_hex_decode(p.data["data stream"].data)
-                # elif filter == b"ASCII85Decode":
-                #     p.data["data stream decompressed"] = ascii85_decode(p.data["data stream"].data)
-                # elif filter == b"LZWDecode":
-                #     p.data["data stream decompressed"] = lzw_decode(p.data["data stream"].data) 
-                elif filter is None:
-                    print("Decoding without filter")
-                    out_fn = out_fn.with_suffix(".txt")
-                    with open(out_fn, "wb") as fh:
-                        fh.write(p.data["data stream"].data)
-                    p.data["data stream"] = out_fn.as_posix()
-                else:
-                    print(f"Decompressing with filter {filter} is not implemented.")
+
+def decompress(pdf: PdfObj, save_dir, jobs=1, processes=False, store=None):
+    for _ in iter_decompress(pdf.data, save_dir, jobs, processes, store):
+        pass
     return pdf
 
+
+def iter_decompress(objects: typing.Iterable[PdfObj], save_dir, jobs=1, processes=False,
+                    store=None) -> typing.Iterator[PdfObj]:
+    """
+    decompress_object() for each object, writing up to jobs streams at once in a thread pool (zlib releases the
+    GIL) or, with processes=True, a process pool. Objects are yielded in their original order once their stream
+    has been written, and only a few streams are in flight at a time so objects can come from iter_parse().
+    Process workers are sent a copy of each stream, so threads are better for streams that do not fit in memory.
+    With a stream_store.StreamStore, streams already in the store are linked instead of decoded again.
+    """
+    if jobs <= 1:
+        for p in objects:
+            yield decompress_object(p, save_dir, store)
+        return
+
+    def submit(stream, body_only, out_fn, filters):
+        if processes:
+            data = stream.get_body() if body_only else stream.data
+        else:
+            data = stream.iter_data(DECOMPRESS_CHUNK, body_only)
+        return pool.submit(write_stream, data, out_fn, filters)
+
+    pending = deque()
+    # Store key -> future, so identical streams in flight together are only decoded once
+    in_flight = {}
+    pool_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with pool_class(jobs) as pool:
+        for p in objects:
+            out_fn, future, key = None, None, None
+            plan = plan_stream(p, save_dir)
+            if plan is not None:
+                out_fn, filters = plan
+                future, key = start_stream(p, out_fn, filters, submit, store, in_flight)
+            pending.append((p, out_fn, future, key))
+            while pending and (len(pending) > 2 * jobs or pending[0][2] is None or pending[0][2].done()):
+                p, out_fn, future, key = pending.popleft()
+                in_flight.pop(key, None)
+                yield finish_stream(p, out_fn, future, key, store)
+        while pending:
+            p, out_fn, future, key = pending.popleft()
+            yield finish_stream(p, out_fn, future, key, store)
+
+
+def decompress_object(p: PdfObj, save_dir, store=None):
+    """ Write the stream of one indirect object to a file in save_dir and replace it with the file name """
+    def submit(stream, body_only, out_fn, filters):
+        future = Future()
+        try:
+            future.set_result(write_stream(stream.iter_data(DECOMPRESS_CHUNK, body_only), out_fn, filters))
+        except DecodeError as e:
+            future.set_exception(e)
+        return future
+
+    plan = plan_stream(p, save_dir)
+    if plan is not None:
+        out_fn, filters = plan
+        future, key = start_stream(p, out_fn, filters, submit, store)
+        finish_stream(p, out_fn, future, key, store)
+    return p
+
+
+def start_stream(p: PdfObj, out_fn: Path, filters: list[tuple[str, dict]], submit: typing.Callable, store=None,
+                 in_flight: Optional[dict] = None) -> tuple[Future, Optional[str]]:
+    """
+    Submit the stream of p to be written to out_fn, or with a store, to a temporary file in the store unless it is
+    already there. Returns a future for the written path and the store key.
+    """
+    stream = p.data["data stream"]
+    # Filters are applied to the body only, unfiltered streams are written with the endstream keyword as before
+    body_only = bool(filters)
+    if store is None:
+        return submit(stream, body_only, out_fn, filters), None
+    key = store.key(stream.iter_data(DECOMPRESS_CHUNK, body_only), filters, out_fn.suffix)
+    if in_flight is not None and key in in_flight:
+        return in_flight[key], key
+    path = store.lookup(key)
+    if path is None:
+        future = submit(stream, body_only, store.temp_path(key), filters)
+    else:
+        future = Future()
+        future.set_result(path)
+    if in_flight is not None:
+        in_flight[key] = future
+    return future, key
+
+
+def finish_stream(p: PdfObj, out_fn: Optional[Path], future: Optional[Future], key: Optional[str], store=None):
+    """ Wait for the stream of p to be written, move it into the store and link it, and point p at the file """
+    if future is not None:
+        try:
+            written = future.result()
+        except DecodeError as e:
+            # Left as a PdfStream, like a stream with an unsupported filter
+            print(f"Could not decode {p.data['reference']}: {e}")
+            return p
+        if store is not None:
+            written = store.link(store.commit(written, key), out_fn)
+        p.data["data stream"] = written.as_posix()
+    return p
+
+
+def plan_stream(p: PdfObj, save_dir) -> Optional[tuple[Path, list[tuple[str, dict]]]]:
+    """ The output file and filters for the stream of an indirect object, or None if there is nothing to write """
+    if isinstance(p, PdfIndirectObj):
+        stream = p.data.get("data stream")
+        if isinstance(stream, PdfStream):
+            out_fn = save_dir / Path(f"{p.data['reference']}.bin")
+            try:
+                filters = stream.get_filters()
+            except DecodeError as e:
+                print(e)
+                return None
+            names = [name for name, _ in filters]
+            unsupported = [name for name in names if name not in FILTERS]
+            if unsupported:
+                print(f"Decompressing with filter {'/'.join(unsupported)} is not implemented.")
+            elif filters:
+                print(f"Decoding with {'/'.join(names)} to {out_fn}")
+                return out_fn, filters
+            else:
+                print("Decoding without filter")
+                return out_fn.with_suffix(".txt"), filters
+    return None
+
+
+def write_stream(data: bytes | typing.Iterable[bytes], out_fn: Path, filters: list[tuple[str, dict]]) -> Path:
+    """
+    Write stream data (bytes or an iterable of chunks) to out_fn through the chain of filters.
+    Every filter decodes incrementally so neither the input nor the output needs to fit in memory.
+    """
+    if isinstance(data, bytes):
+        view = memoryview(data)
+        data = (view[i:i + DECOMPRESS_CHUNK] for i in range(0, len(view), DECOMPRESS_CHUNK))
+    try:
+        with open(out_fn, "wb") as fh:
+            for chunk in decode_chunks(data, filters):
+                fh.write(chunk)
+    except DecodeError:
+        out_fn.unlink(missing_ok=True)
+        raise
+    return out_fn
+
+
 if __name__ == "__main__":
     
     test_file = "test_pdfs/test01.pdf"
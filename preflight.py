@@ -0,0 +1,305 @@
+import json
+import mmap
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from lazy_pdf import TAIL_SIZE, STARTXREF
+from pdf_parser import (PdfDict, PdfList, PdfIndirectObj, PdfReference, PdfHeader, PdfWhitespaces,
+                        PdfCrossReferenceTable, PdfCrossReferenceTableSpec, PdfCrossReferenceTableEntry,
+                        PdfTrailerDict, iter_xref_stream, parse_at)
+
+HEAD_SIZE = 1024  # Readers accept a header anywhere in the first 1024 bytes
+EOF_MARKER = re.compile(rb'%%EOF')
+OBJECT_HEADER = re.compile(rb'\d+\s+\d+\s+obj')
+
+OK = "ok"
+SUSPICIOUS = "suspicious"
+BROKEN = "broken"
+
+
+class Verdict:
+    """
+    The result of preflight(): status is OK, SUSPICIOUS (readable, but something a full parse or other readers may
+    trip over) or BROKEN (the structure a reader starts from is missing). problems explain a BROKEN status,
+    warnings a SUSPICIOUS one, and stats hold what was learned on the way.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.problems: list[str] = []
+        self.warnings: list[str] = []
+        self.stats: dict[str, Any] = {}
+        # Byte ranges of the file that were examined
+        self.ranges: list[tuple[int, int]] = []
+
+    @property
+    def status(self) -> str:
+        if self.problems:
+            return BROKEN
+        return SUSPICIOUS if self.warnings else OK
+
+    def to_json(self) -> dict:
+        return {"file": str(self.filename), "status": self.status, "problems": self.problems,
+                "warnings": self.warnings, "stats": self.stats}
+
+    def __repr__(self):
+        return f"Verdict({self.status}, {self.filename}, {len(self.problems)} problems, {len(self.warnings)} warnings)"
+
+
+def check_header(buffer: mmap.mmap, verdict: Verdict) -> int:
+    """ Check the %PDF-x.y header and return its position """
+    head_end = min(len(buffer), HEAD_SIZE)
+    verdict.ranges.append((0, head_end))
+    pos = buffer.find(b"%PDF-", 0, head_end)
+    match = PdfHeader.Pattern.match(buffer, pos) if pos >= 0 else None
+    if match is None:
+        verdict.problems.append(f"No %PDF-x.y header in the first {HEAD_SIZE} bytes")
+        return 0
+    verdict.stats["version"] = match.group(1).decode()
+    if pos > 0:
+        verdict.warnings.append(f"{pos} bytes before the %PDF header")
+    return pos
+
+
+def check_tail(buffer: mmap.mmap, verdict: Verdict) -> Optional[int]:
+    """ Check for %%EOF and return the startxref offset """
+    tail_start = max(0, len(buffer) - TAIL_SIZE)
+    verdict.ranges.append((tail_start, len(buffer)))
+    eof = None
+    for eof in EOF_MARKER.finditer(buffer, tail_start):
+        pass
+    if eof is None:
+        verdict.warnings.append(f"No %%EOF in the last {TAIL_SIZE} bytes")
+    elif buffer[eof.end():].strip(b"\r\n\t\x0c\x00 "):
+        verdict.warnings.append(f"{len(buffer) - eof.end()} bytes after the last %%EOF")
+    pos = buffer.rfind(b"startxref", tail_start)
+    match = STARTXREF.match(buffer, pos) if pos >= 0 else None
+    if match is None:
+        verdict.problems.append(f"No startxref in the last {TAIL_SIZE} bytes")
+        return None
+    startxref = int(match.group(1))
+    verdict.stats["startxref"] = startxref
+    if startxref >= len(buffer):
+        verdict.problems.append(f"startxref {startxref} is beyond the end of the file")
+        return None
+    return startxref
+
+
+def check_entries(verdict: Verdict, numbers: list[tuple[int, int]], size: Optional[int], first_section: bool):
+    """ Compare the subsections (first object number, count) of a cross-reference section with /Size """
+    entries = sum(count for _, count in numbers)
+    verdict.stats["entries"] = entries
+    if size is None:
+        verdict.problems.append("The trailer has no /Size")
+        return
+    highest = max((first + count - 1 for first, count in numbers if count), default=-1)
+    if highest >= size:
+        verdict.warnings.append(f"Cross-reference entries go up to object {highest} but /Size is {size}")
+    elif first_section and entries != size:
+        verdict.warnings.append(f"{entries} cross-reference entries but /Size is {size}")
+
+
+def check_offset(buffer: mmap.mmap, verdict: Verdict, offset: int, what: str) -> bool:
+    """ Whether offset is in the file, reading only the few bytes there """
+    if offset >= len(buffer):
+        verdict.warnings.append(f"{what} {offset} is beyond the end of the file")
+        return False
+    verdict.ranges.append((offset, min(len(buffer), offset + 32)))
+    return True
+
+
+def check_xref_table(buffer: mmap.mmap, verdict: Verdict, offset: int) -> Optional[PdfDict]:
+    """
+    Read a cross-reference table with the patterns of PdfCrossReferenceTable's contexts, counting entries without
+    creating objects, then parse the trailer that follows it
+    """
+    pos = PdfCrossReferenceTable.Pattern.match(buffer, offset).end()
+    numbers = []
+    in_use = free = beyond = 0
+    while spec := PdfCrossReferenceTableSpec.Pattern.match(buffer, pos):
+        pos = spec.end()
+        first, count = int(spec.group(1)), int(spec.group(2))
+        numbers.append((first, count))
+        for number in range(first, first + count):
+            entry = PdfCrossReferenceTableEntry.Pattern.match(buffer, pos)
+            if entry is None:
+                verdict.ranges.append((offset, pos))
+                verdict.problems.append(f"Bad cross-reference entry for object {number} at byte {pos}")
+                return None
+            pos = entry.end()
+            if entry.group(3) == b"n":
+                in_use += 1
+                beyond += int(entry.group(1)) >= len(buffer)
+            else:
+                free += 1
+    verdict.stats.update(xref="table", in_use=in_use, free=free)
+    if beyond:
+        verdict.warnings.append(f"{beyond} cross-reference entries point beyond the end of the file")
+    verdict.ranges.append((offset, pos))
+    whitespace = PdfWhitespaces.Pattern.match(buffer, pos)
+    keyword = PdfTrailerDict.Pattern.match(buffer, pos if whitespace is None else whitespace.end())
+    if keyword is None:
+        verdict.problems.append(f"No trailer after the cross-reference table at byte {offset}")
+        return None
+    # Only the dictionary: a missing %%EOF is reported by check_tail and does not stop the trailer being read
+    try:
+        trailer_dict = parse_at(buffer, keyword.end(), context=PdfList, filename=verdict.filename)
+    except Exception as e:  # Damaged files also trip the parser's own assertions and conversions
+        verdict.problems.append(f"The trailer does not parse: {e}")
+        return None
+    verdict.ranges.append((pos, trailer_dict.b_start + trailer_dict.b_size))
+    if not isinstance(trailer_dict, PdfDict):
+        verdict.problems.append(f"No trailer dictionary after the cross-reference table at byte {offset}")
+        return None
+    check_entries(verdict, numbers, trailer_dict.get_int("Size"), trailer_dict.get_int("Prev") is None)
+    return trailer_dict
+
+
+def check_xref_stream(buffer: mmap.mmap, verdict: Verdict, offset: int) -> Optional[PdfDict]:
+    """ Parse and decode a cross-reference stream (7.5.8), whose dictionary is also the trailer """
+    try:
+        xref = parse_at(buffer, offset, filename=verdict.filename, offsets=True)
+    except Exception as e:  # Damaged files also trip the parser's own assertions and conversions
+        verdict.problems.append(f"startxref {offset} does not point at a cross-reference table or stream: {e}")
+        return None
+    verdict.ranges.append((xref.b_start, xref.b_start + xref.b_size))
+    stream_dict = xref.data["object"] if isinstance(xref, PdfIndirectObj) else None
+    if not isinstance(stream_dict, PdfDict) or stream_dict.get_name("Type") != "XRef" \
+            or "data stream" not in xref.data:
+        verdict.problems.append(f"startxref {offset} does not point at a cross-reference table or stream")
+        return None
+    verdict.stats["xref"] = "stream"
+    try:
+        # Only direct values can be followed without reading more of the file
+        data = xref.data["data stream"].decode()
+        entries = list(iter_xref_stream(stream_dict, data))
+        widths = [int(w.data) for w in stream_dict["W"].data]
+    except Exception as e:
+        verdict.problems.append(f"The cross-reference stream does not decode: {type(e).__name__}: {e}")
+        return None
+    if len(data) != sum(widths) * len(entries):
+        verdict.warnings.append(f"The cross-reference stream holds {len(data)} bytes for {len(entries)} entries "
+                                f"of {sum(widths)} bytes")
+    types = [entry[1] for entry in entries]
+    verdict.stats.update(in_use=types.count(1), free=types.count(0), compressed=types.count(2))
+    beyond = sum(entry_type == 1 and field >= len(buffer) for _, entry_type, field, _ in entries)
+    if beyond:
+        verdict.warnings.append(f"{beyond} cross-reference entries point beyond the end of the file")
+    numbers = [(number, 1) for number, _, _, _ in entries]
+    check_entries(verdict, numbers, stream_dict.get_int("Size"), stream_dict.get_int("Prev") is None)
+    return stream_dict
+
+
+def check_trailer(buffer: mmap.mmap, verdict: Verdict, trailer: PdfDict):
+    verdict.stats["size"] = trailer.get_int("Size")
+    root = trailer.get("Root")
+    if not isinstance(root, PdfReference):
+        verdict.problems.append("The trailer has no /Root reference")
+    verdict.stats["encrypted"] = "Encrypt" in trailer
+    if "Encrypt" in trailer:
+        verdict.warnings.append("The file is encrypted")
+    prev = trailer.get_int("Prev")
+    if prev is not None:
+        verdict.stats["prev"] = prev
+        if check_offset(buffer, verdict, prev, "/Prev") and not starts_xref(buffer, prev):
+            verdict.warnings.append(f"/Prev {prev} does not point at a cross-reference table or stream")
+
+
+def starts_xref(buffer: mmap.mmap, offset: int) -> bool:
+    """ Whether a cross-reference table or an object (which may be an xref stream) starts at offset """
+    return bool(PdfCrossReferenceTable.Pattern.match(buffer, offset) or OBJECT_HEADER.match(buffer, offset))
+
+
+def check_buffer(buffer: mmap.mmap, verdict: Verdict):
+    header = check_header(buffer, verdict)
+    startxref = check_tail(buffer, verdict)
+    if startxref is None:
+        return
+    if header and not starts_xref(buffer, startxref) and starts_xref(buffer, startxref + header):
+        # Readers also accept offsets counted from the header rather than the start of the file
+        verdict.warnings.append("Offsets are counted from the %PDF header, not the start of the file")
+        startxref += header
+    if PdfCrossReferenceTable.Pattern.match(buffer, startxref):
+        trailer = check_xref_table(buffer, verdict, startxref)
+    else:
+        trailer = check_xref_stream(buffer, verdict, startxref)
+    if trailer is not None:
+        check_trailer(buffer, verdict, trailer)
+
+
+def preflight(filename) -> Verdict:
+    """
+    Classify a file without parsing it: check the header, %%EOF, startxref, the newest cross-reference section and
+    its trailer, reading only the head, the tail and that section. Older sections (/Prev) are only checked to
+    start at a cross-reference table or object.
+    """
+    start = time.perf_counter()
+    verdict = Verdict(filename)
+    try:
+        fh = open(filename, "rb")
+    except OSError as e:
+        verdict.problems.append(f"Cannot open the file: {e}")
+        return verdict
+    with fh:
+        size = os.fstat(fh.fileno()).st_size
+        verdict.stats["bytes"] = size
+        if size == 0:
+            verdict.problems.append("The file is empty")
+            return verdict
+        buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            check_buffer(buffer, verdict)
+        except Exception as e:
+            verdict.problems.append(f"Preflight failed: {type(e).__name__}: {e}")
+        finally:
+            try:
+                buffer.close()
+            except BufferError:
+                # A view of the mapping is still held (by a traceback or an object cycle); it is unmapped once freed
+                pass
+    verdict.stats["bytes_read"] = bytes_covered(verdict.ranges)
+    verdict.stats["seconds"] = round(time.perf_counter() - start, 6)
+    return verdict
+
+
+def bytes_covered(ranges: list[tuple[int, int]]) -> int:
+    """ The number of bytes in a union of ranges """
+    covered = 0
+    end = 0
+    for range_start, range_end in sorted(ranges):
+        range_start = max(range_start, end)
+        if range_end > range_start:
+            covered += range_end - range_start
+            end = range_end
+    return covered
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Classify PDFs as ok, suspicious or broken without parsing them")
+    parser.add_argument("paths", nargs="+", type=Path, help="PDF files, or directories to search for *.pdf")
+    parser.add_argument("--json", action="store_true", help="Print one JSON verdict per line")
+    args = parser.parse_args()
+
+    filenames = []
+    for path in args.paths:
+        filenames.extend(sorted(path.rglob("*.pdf")) if path.is_dir() else [path])
+    counts = {OK: 0, SUSPICIOUS: 0, BROKEN: 0}
+    start = time.perf_counter()
+    for filename in filenames:
+        verdict = preflight(filename)
+        counts[verdict.status] += 1
+        if args.json:
+            print(json.dumps(verdict.to_json()))
+        else:
+            print(f"{verdict.status:<10} {filename}")
+            for message in verdict.problems + verdict.warnings:
+                print(f"           {message}")
+    seconds = time.perf_counter() - start
+    if not args.json:
+        print(f"{len(filenames)} files in {seconds:.2f} s ({len(filenames) / max(seconds, 1e-9):.0f} files/s): "
+              + ", ".join(f"{count} {status}" for status, count in counts.items()))
@@ -0,0 +1,124 @@
+import hashlib
+import typing
+from typing import Iterator, Optional
+
+from pdf_parser import (PdfObj, PdfDoc, PdfDict, PdfIndirectObj, PdfTrailerDict, PdfEndOfFileMarker, ParseError,
+                        CrossReferences, Revision, parse_reference, read_buffer, resolve_reference, revision_chain,
+                        split_revisions, tokenize, tree_references)
+
+HASH_CHUNK = 1 << 20
+
+
+class PdfRevisions:
+    """
+    The revisions of a parsed PDF and the objects visible in the newest one.
+    Revisions are applied from the oldest to the newest following the /Prev chain from the last trailer, so an
+    object redefined by an update replaces the earlier version and an object freed by an update disappears.
+    Revisions that the chain does not reach (a damaged /Prev) are applied in file order before it.
+    """
+
+    def __init__(self, pdf: PdfDoc):
+        self.pdf = pdf
+        self.revisions = split_revisions(pdf)
+        self._chain = self.chain()
+        # The entries visible in each revision asked for so far, by index
+        self._references: dict[int, CrossReferences] = {}
+        self.objects: dict[tuple[int, int], PdfIndirectObj] = {
+            parse_reference(obj.data["reference"]): obj for obj in self.references().in_use.values()}
+
+    def __len__(self):
+        return len(self.revisions)
+
+    def __getitem__(self, index: int) -> Revision:
+        return self.revisions[index]
+
+    def __iter__(self) -> Iterator[Revision]:
+        return iter(self.revisions)
+
+    def chain(self) -> list[Revision]:
+        """ Revisions from the newest to the oldest by /Prev, then any the chain missed from the last to first """
+        return revision_chain(self.revisions)
+
+    def references(self, revision: Optional[int] = None) -> CrossReferences:
+        """ The cross-reference entries visible in a revision (the newest by default), see CrossReferences """
+        index = len(self.revisions) - 1 if revision is None else self.revisions[revision].index
+        if index not in self._references:
+            self._references[index] = tree_references(older for older in self._chain if older.index <= index)
+        return self._references[index]
+
+    @property
+    def trailer(self) -> Optional[PdfDict]:
+        return self.revisions[-1].trailer if self.revisions else None
+
+    def get(self, reference: str | tuple[int, int] | int, revision: Optional[int] = None) \
+            -> Optional[PdfIndirectObj]:
+        """
+        The latest version of an indirect object, or with revision, the version that was current in that revision
+        (0 is the original document, -1 the newest).
+        """
+        number, generation = parse_reference(reference)
+        obj = self.references(revision).in_use.get(number)
+        if obj is None or parse_reference(obj.data["reference"]) != (number, generation):
+            return None
+        return obj
+
+    def resolve(self, value: Optional[PdfObj], revision: Optional[int] = None) -> Optional[PdfObj]:
+        """ Follow a PdfReference to the latest version of the object it points at (or the version in revision) """
+        return resolve_reference(value, lambda reference: self.get(reference, revision))
+
+    def changed(self, index: int) -> list[tuple[int, int]]:
+        """ The references a revision defines that an earlier revision already defined """
+        return [key for key in self.revisions[index].objects
+                if any(key in older.objects for older in self.revisions[:index])]
+
+
+def prefix_digest(filename, size: int) -> str:
+    """ sha256 of the first size bytes of a file """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as fh:
+        while size > 0:
+            chunk = fh.read(min(HASH_CHUNK, size))
+            if not chunk:
+                break
+            digest.update(chunk)
+            size -= len(chunk)
+    return digest.hexdigest()
+
+
+def parse_update(filename, pdf: PdfDoc, use_mmap=False, keep_raw=True,
+                 progress: bool | typing.Callable[[int, int], None] = True, instrument=None) -> PdfDoc:
+    """
+    Bring a tree parsed from an earlier version of filename up to date by parsing only the bytes appended since
+    its last revision. Incremental updates never change earlier bytes, so the objects of earlier revisions are kept
+    as they are; anything the tree holds after its last %%EOF is dropped and parsed again. Check that the file
+    still starts with the bytes pdf was parsed from (prefix_digest) before calling this.
+    """
+    end = max((obj.b_start + obj.b_size for obj in pdf.data if isinstance(obj, (PdfTrailerDict, PdfEndOfFileMarker))),
+              default=0)
+    buffer, use_mmap = read_buffer(filename, use_mmap)
+    if len(buffer) < end:
+        raise ParseError(f"{filename} is shorter than the {end} bytes of the revisions already parsed")
+    pdf.data = [obj for obj in pdf.data if obj.b_start < end]
+    for _ in tokenize(buffer, pdf, end, filename=filename, offsets=use_mmap, progress=progress,
+                      keep_raw=keep_raw, instrument=instrument):
+        pass
+    return pdf
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from pdf_parser import parse
+
+    parser = ArgumentParser(description="List the revisions (incremental updates) of a PDF")
+    parser.add_argument("pdf_filename")
+    args = parser.parse_args()
+
+    pdf_revisions = PdfRevisions(parse(args.pdf_filename, progress=False))
+    for revision in pdf_revisions:
+        print(revision)
+        changed = pdf_revisions.changed(revision.index)
+        if changed:
+            print(f"  Replaces: {' '.join(f'R {n} {g}' for n, g in changed)}")
+        if revision.freed:
+            print(f"  Frees:    {' '.join(str(n) for n in sorted(revision.freed))}")
+    print(f"{len(pdf_revisions.objects)} objects in the latest revision")
@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, Optional
+
+TEMP_SUFFIX = ".tmp"
+
+
+class StreamStore:
+    """
+    A directory of decoded streams shared between documents, addressed by a hash of the raw stream bytes and the
+    filters (with their parameters) used to decode them. A stream that is already in the store is not decoded again
+    and is hard linked into each document's streams directory instead.
+    Files are evicted least recently used first once the store holds more than max_bytes. The last use of a file is
+    its modification time, so the order survives between runs.
+    """
+
+    def __init__(self, root, max_bytes: Optional[int] = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Key -> size in bytes, least recently used first
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self.size = 0
+        files = []
+        for path in self.root.glob("*/*"):
+            if path.is_file() and not path.name.endswith(TEMP_SUFFIX):
+                stat = path.stat()
+                files.append((stat.st_mtime, path.name, stat.st_size))
+        for _, key, size in sorted(files):
+            self._index[key] = size
+            self.size += size
+
+    def key(self, chunks: Iterable[bytes], filters: list[tuple[str, dict]], suffix: str) -> str:
+        """ The file name in the store for raw stream bytes decoded with filters """
+        digest = hashlib.sha256(json.dumps(filters, sort_keys=True).encode("utf-8"))
+        for chunk in chunks:
+            digest.update(chunk)
+        return digest.hexdigest() + suffix
+
+    def path(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def temp_path(self, key: str) -> Path:
+        """ A unique file to decode into before it is committed, so readers never see a partly written stream """
+        path = self.path(key)
+        path.parent.mkdir(exist_ok=True)
+        return path.with_name(f"{key}.{uuid.uuid4().hex}{TEMP_SUFFIX}")
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """ The stored file for key, marked as most recently used, or None if it is not in the store """
+        if key not in self._index:
+            return None
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Removed by another process sharing the store
+            self.size -= self._index.pop(key)
+            return None
+        self._index.move_to_end(key)
+        return path
+
+    def commit(self, written: Path, key: str) -> Path:
+        """ Move a file written to temp_path(key) into the store and evict old files if it is over its size cap """
+        path = self.path(key)
+        if written != path and written.exists():
+            os.replace(written, path)
+            if key in self._index:
+                self.size -= self._index.pop(key)
+            self._index[key] = path.stat().st_size
+            self.size += self._index[key]
+            self.evict()
+        return path
+
+    def evict(self):
+        """ Remove least recently used files until the store is within max_bytes, always keeping the newest """
+        while self.max_bytes is not None and self.size > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self.path(key).unlink(missing_ok=True)
+            self.size -= size
+
+    def link(self, path: Path, out_fn: Path) -> Path:
+        """
+        Hard link a stored file to out_fn. Documents keep their links when the store evicts a file.
+        Where hard links are not possible (such as across file systems) the stored path itself is returned.
+        """
+        try:
+            out_fn.unlink(missing_ok=True)
+            os.link(path, out_fn)
+        except OSError:
+            return path
+        return out_fn
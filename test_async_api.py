@@ -0,0 +1,18 @@
+import asyncio
+
+from async_api import AsyncParser
+from conftest import table_pdf
+
+
+def test_deep_trees_fall_back_to_a_thread(tmp_path, capsys):
+    path = tmp_path / "deep.pdf"
+    path.write_bytes(table_pdf({1: b"<< /A " * 2000 + b"1" + b" >>" * 2000}))
+
+    async def main():
+        async with AsyncParser(workers=1) as parser:
+            return await parser.parse(path), parser.thread_fallbacks
+
+    pdf, fallbacks = asyncio.run(main())
+    assert pdf.get("R 1 0") is not None
+    assert fallbacks == 1
+    assert "running it again in a thread" in capsys.readouterr().err
@@ -0,0 +1,24 @@
+from chart_content import build_chart
+from lazy_pdf import LazyPdfDoc
+from pdf_parser import parse
+
+
+def test_totals_cover_the_file_once(xs_pdf):
+    size = xs_pdf.stat().st_size
+    full = build_chart(parse(xs_pdf, progress=False))
+    with LazyPdfDoc(xs_pdf) as doc:
+        lazy = build_chart(doc)
+    assert sum(full.totals().values()) == size
+    assert sum(lazy.totals().values()) == size
+    assert lazy.totals() == full.totals()
+    assert lazy.cells() == full.cells()
+    assert "Dict->Type:XRef" not in full.errors
+
+
+def test_table_file(updated_pdf):
+    # Object 4 was replaced by the update: the lazy chart never reads its first version
+    with LazyPdfDoc(updated_pdf) as doc:
+        lazy = build_chart(doc).totals()
+    full = build_chart(parse(updated_pdf, progress=False)).totals()
+    assert sum(lazy.values()) == sum(full.values()) == updated_pdf.stat().st_size
+    assert lazy["Data Index"] == full["Data Index"]
@@ -0,0 +1,13 @@
+import pytest
+
+from filters import DecodeError, ascii_hex_decode
+
+
+def test_ascii_hex_odd_final_digit():
+    assert b"".join(ascii_hex_decode([b"41 4", b"24>"], {})) == b"AB@"
+
+
+@pytest.mark.parametrize("data", [b"414G>", b"41G", b"41\xff", b"4G4>"])
+def test_ascii_hex_invalid_characters(data):
+    with pytest.raises(DecodeError):
+        b"".join(ascii_hex_decode([data], {}))
@@ -0,0 +1,21 @@
+from conftest import table_pdf
+from instrumentation import Instrumentation
+from pdf_parser import parse
+
+
+def test_attempts_are_counted_per_dispatch(xs_pdf):
+    instrument = Instrumentation()
+    parse(xs_pdf, progress=False, instrument=instrument)
+    for context_name in instrument.contexts:
+        attempts = instrument.attempts(context_name)
+        first = next(iter(attempts))
+        for name, tried in attempts.items():
+            assert instrument.hits.get((context_name, name), 0) <= tried <= attempts[first]
+
+
+def test_nested_objects_are_not_counted_twice(tmp_path):
+    path = tmp_path / "deep.pdf"
+    path.write_bytes(table_pdf({1: b"<< /A " * 200 + b"1" + b" >>" * 200}))
+    instrument = Instrumentation()
+    parse(path, progress=False, instrument=instrument)
+    assert instrument.inclusive_time["PdfDict"] <= instrument.seconds
@@ -0,0 +1,15 @@
+import os
+
+import pytest
+
+from parse_cache import ParseCache
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid"), reason="needs file ownership")
+def test_world_writable_trees_are_not_loaded(tmp_path, updated_pdf):
+    cache = ParseCache(tmp_path / "cache")
+    cache.parse(updated_pdf, progress=False)
+    assert cache.load(updated_pdf) is not None
+    os.chmod(cache.lookup(cache.file_key(updated_pdf)), 0o666)
+    assert cache.load(updated_pdf) is None
+    assert cache.entries() == []
@@ -0,0 +1,13 @@
+import parse_daemon
+from stream_store import StreamStore
+
+
+def test_to_json_reuses_the_worker_store(tmp_path, xs_pdf, monkeypatch):
+    opened = []
+    monkeypatch.setattr(parse_daemon, "StreamStore", lambda *args: opened.append(args) or StreamStore(*args))
+    monkeypatch.setattr(parse_daemon, "_stores", {})
+    for name in ["first", "second"]:
+        parse_daemon.op_to_json({"pdf_filename": str(xs_pdf), "output_filename": str(tmp_path / f"{name}.json"),
+                                 "decompress": True, "store": str(tmp_path / "store")})
+        assert any((tmp_path / f"{name}_streams").iterdir())
+    assert len(opened) == 1
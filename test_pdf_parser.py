@@ -0,0 +1,89 @@
+import pytest
+
+from conftest import table_pdf
+from lazy_pdf import LazyPdfDoc
+from pdf_parser import (CrossReferences, ParseError, PdfIndirectObj, PdfList, PdfNumber, parse, parse_at,
+                        parse_legacy)
+
+# Every escape form of 7.3.4.2 with the string it decodes to
+ESCAPES = [
+    (rb"\n\r\t\b\f", "\n\r\t\x08\f"),
+    (rb"\(\)\\ (nested (twice))", "()\\ (nested (twice))"),
+    (rb"\101\60\7", "A0\x07"),
+    (rb"\0008\1010", "\x008A0"),
+    (rb"\8\9\q\ ", "89q "),
+    (b"a\\\nb\\\rc\\\r\nd", "abcd"),
+]
+
+
+def test_cross_references_newest_section_wins():
+    references = CrossReferences()
+    references.add_section({1: "new"}, {2: (9, 0)}, {3})
+    references.add_section({1: "old", 3: "old", 4: "old"}, {}, {2})
+    assert references.in_use == {1: "new", 4: "old"}
+    assert references.compressed == {2: (9, 0)}
+    assert references.freed == {3}
+
+
+def test_hybrid_free_entries_are_ignored():
+    references = CrossReferences()
+    references.add_section({1: "table"}, {2: (9, 0)}, {2, 5})
+    assert references.freed == {5}
+
+
+def test_objects_in_object_streams(xs_pdf):
+    pdf = parse(xs_pdf, progress=False)
+    assert pdf.page_count() == 3
+    assert pdf.page(2).reference == "R 5 0"
+    with LazyPdfDoc(xs_pdf) as lazy:
+        for reference in ["R 1 0", "R 2 0", "R 3 0", "R 4 0", "R 5 0", "R 6 0"]:
+            assert pdf.get(reference).to_json() == lazy.get(reference).to_json()
+
+
+def test_updates_replace_and_free(updated_pdf):
+    pdf = parse(updated_pdf, progress=False)
+    with LazyPdfDoc(updated_pdf) as lazy:
+        for doc in [pdf, lazy]:
+            assert doc.get("R 5 0") is None
+            assert doc.page_count() == 2
+            assert doc.page(1).dict.get("MediaBox").data[2].data == "595"
+
+
+def test_lazy_empty_file(tmp_path):
+    path = tmp_path / "empty.pdf"
+    path.write_bytes(b"")
+    with pytest.raises(ParseError):
+        LazyPdfDoc(path)
+
+
+def test_numbers_are_single_tokens():
+    numbers = parse_at(b"[0 0 612.75 792.5 -1.25 .5 10. +3]", 0, context=PdfList)
+    assert [value.data for value in numbers.data if isinstance(value, PdfNumber)] == \
+        ["0", "0", "612.75", "792.5", "-1.25", ".5", "10.", "+3"]
+
+
+def test_media_box(tmp_path):
+    path = tmp_path / "boxes.pdf"
+    path.write_bytes(table_pdf({1: b"<< /Type /Catalog /Pages 2 0 R >>",
+                                2: b"<< /Type /Pages /Kids [3 0 R 4 0 R 5 0 R] /Count 3 /MediaBox [0 0 612 792] >>",
+                                3: b"<< /Type /Page /Parent 2 0 R >>",
+                                4: b"<< /Type /Page /Parent 2 0 R /MediaBox [-10.5 0 1224.75 6 0 R] >>",
+                                5: b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612] >>",
+                                6: b"1584"}))
+    pdf = parse(path, progress=False)
+    with LazyPdfDoc(path) as lazy:
+        for doc in [pdf, lazy]:
+            assert doc.page(0).media_box == [0.0, 0.0, 612.0, 792.0]
+            assert doc.page(1).media_box == [-10.5, 0.0, 1224.75, 1584.0]
+            assert doc.page(2).media_box is None
+
+
+@pytest.mark.parametrize("escaped, decoded", ESCAPES)
+def test_literal_string_escapes_match_legacy(tmp_path, escaped, decoded):
+    """ fast_finish() and the per-character contexts used by parse_legacy() decode escapes alike """
+    path = tmp_path / "string.pdf"
+    path.write_bytes(table_pdf({1: b"<< /Type /Catalog /Title (" + escaped + b") >>"}))
+    fast = parse(path, progress=False).get("R 1 0").data["object"].get("Title")
+    legacy = next(obj for obj in parse_legacy(path).data if isinstance(obj, PdfIndirectObj))
+    legacy = legacy.data["object"].get("Title")
+    assert fast.data == legacy.data == decoded
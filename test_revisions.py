@@ -0,0 +1,27 @@
+from pdf_parser import parse
+from revisions import PdfRevisions, split_revisions
+
+
+def test_objects_in_object_streams(xs_pdf):
+    pdf = parse(xs_pdf, progress=False)
+    revisions = PdfRevisions(pdf)
+    assert revisions[0].compressed == {2: (6, 0), 3: (6, 1), 4: (6, 2), 5: (6, 3)}
+    for reference in ["R 2 0", "R 3 0", "R 5 0"]:
+        obj = revisions.get(reference)
+        assert obj is not None
+        assert obj.to_json() == pdf.get(reference).to_json()
+        assert revisions.get(reference, revision=0) is obj
+    assert revisions.resolve(revisions.trailer["Root"]).get_name("Type") == "Catalog"
+    assert revisions.resolve(revisions.get("R 2 0").data["object"]["Kids"].data[0]).get_name("Type") == "Page"
+
+
+def test_update_replaces_and_frees(updated_pdf):
+    pdf = parse(updated_pdf, progress=False)
+    revisions = PdfRevisions(pdf)
+    assert len(revisions) == 2
+    assert revisions[1].freed == {5}
+    assert revisions.changed(1) == [(4, 0)]
+    assert revisions.get("R 5 0") is None
+    assert revisions.get("R 5 0", revision=0) is not None
+    assert revisions.get("R 4 0").b_start > revisions.get("R 4 0", revision=0).b_start
+    assert split_revisions(pdf)[-1].end == len(updated_pdf.read_bytes().rstrip())
@@ -1,10 +1,23 @@
-import glob
 import json
+import multiprocessing
+import os
+import time
+from argparse import ArgumentParser
+from collections import deque
+from multiprocessing.connection import wait
 from pathlib import Path
-from pprint import pprint
+from typing import Iterable, Optional
 
 from pdf_parser import parse
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+POLL_INTERVAL = 0.1  # Seconds between checks of the running files' time and memory
+MANIFEST_NAME = "manifest.jsonl"
+
 
 def parse_to_json(pdf_filename: Path, output_filename: Path | None = None):
     if output_filename is None:
@@ -12,7 +25,7 @@ def parse_to_json(pdf_filename: Path, output_filename: Path | None = None):
     pdf = parse(pdf_filename)
     json_pdf = pdf.to_json()
     with open(output_filename, "w") as fh:
-        json.dump(json_pdf, fh, indent=4)   
+        json.dump(json_pdf, fh, indent=4)
 
 
 def get_all_pdfs(input_dir: Path):
@@ -20,42 +33,187 @@ def get_all_pdfs(input_dir: Path):
     return test_inputs
 
 
-def retest_selection(selection_dir: Path, input_dir: Path, success_dir: Path, fail_dir: Path):
+def retest_selection(selection_dir: Path, input_dir: Path, success_dir: Path, fail_dir: Path, **options):
     files_to_test = []
     for old_file in selection_dir.glob("*"):
         old_file.unlink()
         pdf_filename = input_dir / old_file.with_suffix(".pdf").name
         files_to_test.append(pdf_filename)
 
-    test_list(files_to_test, success_dir, fail_dir)
-    
-    for pdf in files_to_test:
-        parse_to_json(pdf, output_successes / pdf.with_suffix(".json").name)
+    # Appended so the manifest keeps the rest of the corpus; the new records supersede the old ones
+    return test_list(files_to_test, success_dir, fail_dir, skip_done=False, append=True, **options)
+
+
+def read_manifest(manifest: Path) -> dict[str, dict]:
+    """ The latest record for each file in a manifest, skipping a line cut short by an interrupted run """
+    records = {}
+    if manifest.exists():
+        with open(manifest) as fh:
+            for line in fh:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                records[record["file"]] = record
+    return records
+
+
+def current_rss(pid: int) -> Optional[int]:
+    """ Resident set size of a process in bytes, where /proc is available """
+    try:
+        with open(f"/proc/{pid}/statm") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss() -> Optional[int]:
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def run_one(pdf: Path, success_dir: Path, fail_dir: Path, conn):
+    """ Worker process: parse one PDF and send its status, time and peak memory back to the runner """
+    start = time.perf_counter()
+    passed = test_and_sort_result(pdf, success_dir, fail_dir, skip_done=False)
+    record = {"status": "pass" if passed else "fail", "seconds": time.perf_counter() - start,
+              "peak_rss": peak_rss()}
+    if not passed:
+        with open(fail_dir / pdf.with_suffix(".txt").name) as fh:
+            record["error"] = fh.readline().rstrip("\n")
+    conn.send(record)
+    conn.close()
 
 
-def test_list(test_inputs, success_dir: Path, fail_dir: Path, skip_done):
+def test_list(test_inputs: Iterable[Path], success_dir: Path, fail_dir: Path, skip_done=False,
+              jobs: Optional[int] = None, timeout: Optional[float] = None, max_rss: Optional[int] = None,
+              manifest: Optional[Path] = None, append: Optional[bool] = None) -> list[dict]:
+    """
+    Test each PDF in its own process, up to jobs at a time (default: one per CPU).
+    A file that runs longer than timeout seconds or grows beyond max_rss bytes is killed and recorded as a
+    timeout or memory failure. Each result is appended to the JSON lines manifest as soon as it is known; with
+    skip_done, files already in the manifest (or with a success file) are skipped so an interrupted run resumes.
+    The manifest is started afresh unless skip_done or append is set.
+    """
+    manifest = manifest or success_dir.parent / MANIFEST_NAME
+    done = read_manifest(manifest) if skip_done else {}
+    queue = deque()
+    skipped = 0
     for pdf in test_inputs:
-        test_and_sort_result(pdf, success_dir, fail_dir, skip_done)
+        if skip_done and (str(pdf) in done or (success_dir / pdf.with_suffix(".json").name).exists()):
+            skipped += 1
+        else:
+            queue.append(pdf)
+    if skipped:
+        print(f"Skipping {skipped} files already done")
+
+    results = []
+    # Process sentinel -> (process, connection, pdf, start time, peak RSS seen)
+    running = {}
+    run_start = time.perf_counter()
+    if append is None:
+        append = skip_done
+    with open(manifest, "a" if append else "w") as manifest_fh:
+        while queue or running:
+            while queue and len(running) < (jobs or os.cpu_count()):
+                pdf = queue.popleft()
+                receiver, sender = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(target=run_one, args=(pdf, success_dir, fail_dir, sender))
+                process.start()
+                sender.close()
+                running[process.sentinel] = [process, receiver, pdf, time.perf_counter(), 0]
+            finished = wait(list(running), timeout=POLL_INTERVAL)
+            now = time.perf_counter()
+            for sentinel in list(running):
+                process, receiver, pdf, start, peak = entry = running[sentinel]
+                rss = current_rss(process.pid)
+                if rss is not None:
+                    entry[4] = peak = max(peak, rss)
+                if sentinel in finished:
+                    if receiver.poll():
+                        record = receiver.recv()
+                    else:
+                        record = {"status": "crash", "error": f"Worker exited with code {process.exitcode}"}
+                elif timeout is not None and now - start > timeout:
+                    record = {"status": "timeout", "error": f"Killed after {timeout} seconds"}
+                elif max_rss is not None and rss is not None and rss > max_rss:
+                    record = {"status": "memory", "error": f"Killed at {rss / 1e6:.0f} MB resident"}
+                else:
+                    continue
+                if process.is_alive():
+                    process.kill()
+                process.join()
+                receiver.close()
+                del running[sentinel]
+                record = finish_record(pdf, record, now - start, peak, success_dir, fail_dir)
+                manifest_fh.write(json.dumps(record) + "\n")
+                manifest_fh.flush()
+                results.append(record)
+    print_summary(results, time.perf_counter() - run_start)
+    return results
+
+
+def finish_record(pdf: Path, record: dict, seconds: float, peak: int, success_dir: Path, fail_dir: Path) -> dict:
+    """ Complete a worker's record, and write the failure file for workers that did not finish """
+    size = pdf.stat().st_size if pdf.exists() else 0
+    finished = "seconds" in record
+    seconds = record.get("seconds", seconds)
+    peak = max(peak, record.get("peak_rss") or 0)
+    record = {"file": str(pdf), "status": record["status"], "seconds": round(seconds, 4), "peak_rss": peak,
+              "bytes": size, "bytes_per_second": round(size / seconds) if finished and seconds else None,
+              "error": record.get("error")}
+    if record["status"] in ("timeout", "memory", "crash"):
+        (success_dir / pdf.with_suffix(".json").name).unlink(missing_ok=True)
+        with open(fail_dir / pdf.with_suffix(".txt").name, "w") as fh:
+            fh.write(f"{record['error']}\n")
+            fh.write(f"Exception type: {record['status']}\n\n")
+    icon = "✅" if record["status"] == "pass" else "❌"
+    print(f"{icon} {record['status'].upper()}: {pdf}")
+    return record
+
 
+def print_summary(results: list[dict], wall_seconds: float):
+    if not results:
+        print("Nothing to test")
+        return
+    counts = {}
+    for record in results:
+        counts[record["status"]] = counts.get(record["status"], 0) + 1
+    # Files that were killed were not parsed to the end so they do not count towards throughput
+    total_bytes = sum(record["bytes"] for record in results if record["status"] in ("pass", "fail"))
+    passed_bytes = sum(record["bytes"] for record in results if record["status"] == "pass")
+    passed_seconds = sum(record["seconds"] for record in results if record["status"] == "pass")
+    print(f"\n{len(results)} files in {wall_seconds:.1f} s: " + ", ".join(f"{n} {s}" for s, n in counts.items()))
+    print(f"Throughput: {len(results) / wall_seconds:.1f} files/s, {total_bytes / wall_seconds / 1e6:.2f} MB/s")
+    if passed_seconds:
+        print(f"Parse speed of passing files: {passed_bytes / passed_seconds / 1e6:.2f} MB/s per worker")
+    print(f"Peak memory: {max(record['peak_rss'] for record in results) / 1e6:.0f} MB")
+    print("Slowest files:")
+    for record in sorted(results, key=lambda r: r["seconds"], reverse=True)[:5]:
+        print(f"  {record['seconds']:8.2f} s  {record['status']:<7} {record['file']}")
 
-def test_and_sort_result(pdf: Path, success_dir: Path, fail_dir: Path, skip_done):
+
+def test_and_sort_result(pdf: Path, success_dir: Path, fail_dir: Path, skip_done) -> bool:
     """
     Attempt to parse the PDF to JSON.
      Place a success json file in the success directory
        or a failure txt file in the failure directory.
+    Returns whether the PDF parsed.
     """
     success_output = success_dir / pdf.with_suffix(".json").name
     fail_output = fail_dir / pdf.with_suffix(".txt").name
     if success_output.exists():
         if skip_done:
-            return
+            return True
         success_output.unlink()
     if fail_output.exists():
         fail_output.unlink()
-    
+
     try:
         parse_to_json(pdf, success_output)
-        print(f"✅ PASS: {pdf}")
+        return True
     except Exception as e:
         with open(fail_output, "w") as fh:
             fh.write(f"{e}\n")
@@ -65,28 +223,36 @@ def test_and_sort_result(pdf: Path, success_dir: Path, fail_dir: Path, skip_done
                 for note in e.__notes__:
                     fh.write(f"{note}\n")
             fh.write("\n")
-        print(f"❌ FAIL: {pdf}")
+        return False
 
 
-def test_all(testing_dir: Path, success_dir: Path, fail_dir: Path, skip_done=False):
+def test_all(testing_dir: Path, success_dir: Path, fail_dir: Path, skip_done=False, **options):
     """
     Test all PDFs in the testing directory.
     """
     if not skip_done:
         # Empty directories
-        for file in output_successes.glob("*"):
+        for file in success_dir.glob("*"):
+            file.unlink()
+        for file in fail_dir.glob("*"):
             file.unlink()
-    for file in output_failures.glob("*"):
-        file.unlink()
-    test_list(get_all_pdfs(testing_dir), success_dir, fail_dir, skip_done)
+    return test_list(get_all_pdfs(testing_dir), success_dir, fail_dir, skip_done, **options)
 
 
 
 if __name__ == '__main__':
-
     testing_resources = Path("testing_resources/")
 
-    input_directory = testing_resources / Path("test_pdfs/")
+    parser = ArgumentParser(description="Parse every PDF in a directory, sorting them into successes and failures")
+    parser.add_argument("input_directory", type=Path, nargs="?", default=testing_resources / Path("test_pdfs/"))
+    parser.add_argument("--jobs", type=int, default=None, help="Files parsed at once (default: one per CPU)")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds allowed per file")
+    parser.add_argument("--max-rss", type=int, default=None, help="Resident memory allowed per file in MB")
+    parser.add_argument("--manifest", type=Path, default=None,
+                        help=f"JSON lines file of results (default: {testing_resources / MANIFEST_NAME})")
+    parser.add_argument("--restart", action="store_true", help="Test every file again instead of resuming")
+    args = parser.parse_args()
+
     output_successes = testing_resources / Path("successes/")
     output_failures = testing_resources / Path("failures/")
 
@@ -94,4 +260,6 @@ if __name__ == '__main__':
     output_successes.mkdir(exist_ok=True, parents=True)
     output_failures.mkdir(exist_ok=True, parents=True)
 
-    test_all(input_directory, output_successes, output_failures, skip_done=True)
+    test_all(args.input_directory, output_successes, output_failures, skip_done=not args.restart, jobs=args.jobs,
+             timeout=args.timeout, max_rss=None if args.max_rss is None else args.max_rss * 1_000_000,
+             manifest=args.manifest)